@@ -19,6 +19,7 @@ setup(
     ],
     extras_require={
         'test': ['pytest'],
+        'numpy': ['numpy'],
     },
     entry_points={
         'console_scripts': [
@@ -1,10 +1,65 @@
-import yaml
-import importlib.resources
+"""
+Localization strings, loaded on first use and cached per language.
+
+`localizations` (the default language) is resolved lazily through the
+module __getattr__, so importing this module, or the modules that import
+it, does not parse any YAML. Parsed translations are also cached as JSON
+in the package's __pycache__ directory, keyed by the modification time
+and size of the YAML file, so later processes skip PyYAML entirely.
+"""
+import functools
+import json
+import os
 from car_simulation.config.config import Config
-def load_translations(language_code=Config.DEFAULT_LOCALIZATION_LANGUAGE):
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '__pycache__')
+
+
+def _parse(language_code: str) -> dict:
+    import importlib.resources
+    import yaml
     with importlib.resources.files('car_simulation.localize').joinpath(f'{language_code}.yaml').open('r') as file:
-        localization = yaml.safe_load(file)
+        return yaml.safe_load(file) or {}
+
+
+def load_translations(language_code=Config.DEFAULT_LOCALIZATION_LANGUAGE):
+    return _load(language_code)
+
+
+@functools.lru_cache(maxsize=None)
+def _load(language_code: str) -> dict:
+    source = os.path.join(os.path.dirname(os.path.abspath(__file__)), f'{language_code}.yaml')
+    try:
+        status = os.stat(source)
+    except OSError:
+        # Not installed as plain files (a zip, say): no cache
+        return _parse(language_code)
+    key = [status.st_mtime_ns, status.st_size]
+    cache = os.path.join(CACHE_DIR, f'{language_code}.yaml.json')
+    try:
+        with open(cache, 'r', encoding='utf-8') as file:
+            cached = json.load(file)
+        if cached['key'] == key:
+            return cached['strings']
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+    localization = _parse(language_code)
+    temporary = f'{cache}.{os.getpid()}.tmp'
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        with open(temporary, 'w', encoding='utf-8') as file:
+            json.dump({'key': key, 'strings': localization}, file)
+        os.replace(temporary, cache)
+    except (OSError, TypeError, ValueError):
+        # Read-only install or strings JSON cannot hold: parse every time
+        try:
+            os.remove(temporary)
+        except OSError:
+            pass
     return localization
 
 
-localizations = load_translations()
+def __getattr__(name):
+    if name == 'localizations':
+        return load_translations()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,20 +1,103 @@
 # main.py
 
+import argparse
+import asyncio
+import contextlib
+import json
+import sys
 from car_simulation.simulation.simulation import Simulation
+from car_simulation.simulation.scenario import Scenario, run_scenario
 from  car_simulation.simulation.field import Field
 from  car_simulation.simulation.car import Car
 from typing import Tuple
-from  car_simulation.localize.localize import localizations
 from car_simulation.utils.logger import Logger
 from car_simulation.config.config import Config
 
 logger = Logger.setup_logger('MAIN')
 
-def main():
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog='run-simulation',
+        description='Auto driving car simulation. Runs interactively unless a scenario is given.')
+    parser.add_argument('--scenario', metavar='FILE',
+                        help="run the scenario file without prompts ('-' reads standard input)")
+    parser.add_argument('--output', metavar='FILE', default='-',
+                        help="write the JSON results to FILE instead of standard output")
+    parser.add_argument('--engine', choices=('python', 'numpy', 'event', 'sharded'), default=None,
+                        help="stepping engine (default: numpy if installed, otherwise python)")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="worker processes for the sharded engine or the service (default: CPU count)")
+    parser.add_argument('--serve', metavar='ADDRESS',
+                        help="serve simulations as JSON lines on HOST:PORT, PORT or a Unix socket path")
+    parser.add_argument('--max-jobs', type=int, default=None,
+                        help="jobs the service runs or queues at once (default: 4 per worker)")
+    return parser.parse_args(argv)
+
+
+def default_engine() -> str:
+    try:
+        import numpy  # noqa: F401
+    except ImportError:
+        return 'python'
+    return 'numpy'
+
+
+def run_batch(args: argparse.Namespace) -> int:
+    """
+    Run a scenario file headless and write the results as JSON.
+    Returns: int
+    The process exit status.
+    """
+    engine = args.engine or default_engine()
+    try:
+        scenario = Scenario.load(args.scenario)
+        # Diagnostics from the cars go to stderr so stdout only carries results
+        with contextlib.redirect_stdout(sys.stderr):
+            result = run_scenario(scenario, engine, args.workers)
+    except Exception as e:
+        # A failed run (a crashed worker, say) must not pass for a result
+        print(f"Error running scenario: {e}", file=sys.stderr)
+        return 2
+    if args.output == '-':
+        json.dump(result, sys.stdout)
+        sys.stdout.write('\n')
+    else:
+        with open(args.output, 'w') as file:
+            json.dump(result, file)
+    return 0
+
+
+def run_service(args: argparse.Namespace) -> int:
+    """
+    Serve simulations until interrupted (see simulation/service.py).
+    Returns: int
+    The process exit status.
+    """
+    from car_simulation.simulation.service import serve
+    try:
+        asyncio.run(serve(args.serve, args.workers, args.max_jobs, args.engine or default_engine()))
+    except KeyboardInterrupt:
+        pass
+    except (OSError, ValueError) as e:
+        print(f"Error running the service: {e}", file=sys.stderr)
+        return 2
+    return 0
+
+
+def main(argv=None):
     """
     Prompts the user to input the dimensions of the field and returns a Field object.
     Field -> The field object with the specified dimensions.
+    With --scenario, runs the scenario headless instead (see run_batch);
+    with --serve, runs the simulation service (see run_service).
     """
+    args = parse_args(argv)
+    if args.serve:
+        return run_service(args)
+    if args.scenario:
+        return run_batch(args)
+    # Only the interactive session needs the localized strings
+    from car_simulation.localize.localize import localizations
     # print("Welcome to Auto Driving Car Simulation!")
     print(localizations.get('start_message', 'Welcome!'))  # Use .get() for safety
     width, height = create_field()
@@ -125,4 +208,4 @@ def post_simulation_menu( simulation: Simulation) -> bool:
 
 if __name__ == '__main__':
     
-    main()
+    sys.exit(main())
@@ -1,10 +1,24 @@
 # simulation/car.py
+import logging
 #from simulation.field import Field  # Using absolute import
 from .field import Field  
+from .headings import HEADINGS, HEADING_INDEX, DELTA_X, DELTA_Y, TURN_LEFT, TURN_RIGHT
+from .events import Event, PrintSink, BLOCKED_MOVE, INACTIVE_CAR
+from .grammar import COMMAND_FILTER, Program
 from car_simulation.config.config import Config
-from car_simulation.localize.localize import localizations
 from car_simulation.utils.logger import Logger
 
+
+def valid_commands(commands) -> bool:
+    """Return True if every command is one of Config.CAR_COMMANDS."""
+    if isinstance(commands, str):
+        return not commands.translate(COMMAND_FILTER)
+    if isinstance(commands, Program):
+        # Only valid commands can be parsed into a Program
+        return True
+    return all(command in Config.CAR_COMMANDS for command in commands)
+
+
 class Car:
     """
         Car Class
@@ -14,10 +28,15 @@ class Car:
             y : int    -> The y-coordinate of the car's position.
             direction : str -> The direction the car is facing ('N', 'E', 'S', 'W').
     
-            commands : list  -> The list of commands for the car to execute.
+            commands : str   -> The commands for the car to execute, or a Program of the
+                                compact syntax (see grammar.py), which is never expanded.
+            events : EventSink -> Receives blocked moves and commands sent to an inactive
+                                  car; Simulation.add_car sets it to the simulation's sink.
     """
     
     DIRECTIONS = Config.CAR_DIRECTIONS
+    logger = Logger.setup_logger('CAR')
+    events = PrintSink()
    
    
     def __init__(self, name: str, x: int, y: int, direction: str, commands: str):
@@ -32,22 +51,35 @@ class Car:
         self.commands: str = commands
         self.command_index: int = 0
         self.active: bool = True  # Set to False if the car stops (collision, etc.)
-        self.logger = Logger.setup_logger('CAR')
 
         # Validate the car name during initialization
         try:
-            existing_names = []  # You can replace this with actual list of existing names
+            # Uniqueness is checked by Simulation.add_car against its name index
+            existing_names = ()
             valid, message = self.validate_car_name(name, existing_names)
             if not valid:
                 raise ValueError(message)
              # Validate commands in constructor
-            if not all(command in Config.CAR_COMMANDS for command in commands):
+            if not valid_commands(commands):
                 raise ValueError("Invalid command found in command string")
         
         except ValueError as e:
             print(f"Error initializing car: {e}")
             self.active = False  # Mark car as inactive if name is invalid
 
+    @classmethod
+    def trusted(cls, name: str, x: int, y: int, direction: str, commands: str) -> 'Car':
+        """Create a car from values that were already validated, skipping __init__."""
+        car = cls.__new__(cls)
+        car.name = name
+        car.x = x
+        car.y = y
+        car.direction = direction
+        car.commands = commands
+        car.command_index = 0
+        car.active = True
+        return car
+
     @staticmethod
     def validate_car_name(name: str, existing_names: list) -> tuple:
 
@@ -70,43 +102,36 @@ class Car:
     
     def set_commands(self, commands: str):
         """Sets the commands for the car, raising ValueError if invalid."""
-        if not all(c in 'LRF' for c in commands):
-            self.logger.debug("Invalid commands: %s", commands)
+        if not valid_commands(commands):
+            if self.logger.isEnabledFor(logging.DEBUG):
+                self.logger.debug("Invalid commands for %s: %s", self.name, commands)
             raise ValueError("Invalid Command")
         self.commands = commands
     
     def turn_left(self) -> None:
         """Turn the car left."""
         try:
-            current_index = Car.DIRECTIONS.index(self.direction)
-            self.direction = Car.DIRECTIONS[(current_index - 1) % 4]
-        except ValueError as e:
-            print(f"Error turning left: {e}")
+            self.direction = HEADINGS[TURN_LEFT[HEADING_INDEX[self.direction]]]
+        except KeyError as e:
+            print(f"Error turning left: invalid direction {e}")
 
     def turn_right(self) -> None:
         """Turn the car right."""
         try:
-            current_index = Car.DIRECTIONS.index(self.direction)
-            self.direction = Car.DIRECTIONS[(current_index + 1) % 4]
-        except ValueError as e:
-            print(f"Error turning right: {e}")
+            self.direction = HEADINGS[TURN_RIGHT[HEADING_INDEX[self.direction]]]
+        except KeyError as e:
+            print(f"Error turning right: invalid direction {e}")
 
     def move_forward(self, field: Field) -> None:
-        """Move forward by one unit in the current direction if within bounds."""
+        """Move forward by one unit in the current direction if the cell can be entered."""
         try:
-            if self.direction == 'N':
-                new_x, new_y = self.x, self.y + 1
-            elif self.direction == 'E':
-                new_x, new_y = self.x + 1, self.y
-            elif self.direction == 'S':
-                new_x, new_y = self.x, self.y - 1
-            elif self.direction == 'W':
-                new_x, new_y = self.x - 1, self.y
+            heading = HEADING_INDEX[self.direction]
+            new_x, new_y = self.x + DELTA_X[heading], self.y + DELTA_Y[heading]
             
-            if field.within_bounds(new_x, new_y):
-                self.x, self.y = new_x, new_y  # Update position only if within bounds
-            else:
-                print("Move out of bounds; position not updated.")
+            if field.can_enter(new_x, new_y):
+                self.x, self.y = new_x, new_y  # Update position only if within bounds and not blocked
+            elif self.events.enabled:
+                self.events.emit(Event(BLOCKED_MOVE, self.name, self.x, self.y, self.command_index))
         except Exception as e:
             print(f"Error moving forward: {e}")
 
@@ -123,7 +148,8 @@ class Car:
     def execute_command(self, field: Field) -> None:
         """Execute the next command for the car."""
         if not self.active:
-            print(f"{self.name} is inactive and cannot execute commands.")
+            if self.events.enabled:
+                self.events.emit(Event(INACTIVE_CAR, self.name, self.x, self.y, self.command_index))
             return
         
         command = self.next_command()
@@ -137,7 +163,8 @@ class Car:
             self.command_index += 1
              # Ensure we are within the bounds of the field
             if not field.within_bounds(self.x, self.y):
-                print(f"Move out of bounds; position not updated.")
+                if self.events.enabled:
+                    self.events.emit(Event(BLOCKED_MOVE, self.name, self.x, self.y, self.command_index))
                 self.x, self.y = self.previous_position()  # Set back to the previous position
 
         except Exception as e:
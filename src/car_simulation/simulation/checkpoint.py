@@ -0,0 +1,302 @@
+# simulation/checkpoint.py
+"""
+Versioned binary checkpoints of a Simulation (see Simulation.checkpoint).
+
+Layout, all little-endian:
+    header      HEADER_SIZE bytes: MAGIC, format version, the live car table
+                slot, field size, next step, car count, the offsets of the
+                sections below and the kind of obstacle store.
+    car tables  two slots of ROW-packed cars (x, y, heading index, active,
+                command_index), one row per car.
+    static      JSON with the names and commands of the cars, Programs in the
+                compact syntax (see grammar.py).
+    obstacles   the blocked cells of the field (see obstacles.py): the bytes
+                of a BitGrid, or the sorted int64 cell keys of a SparseCells.
+    collisions  collision records (see collisions.py), each a RECORD (step,
+                x, y, car count, swap flag) followed by the int64 car ids.
+
+Saving again to the same file only writes what changed: the car rows that
+differ from the idle slot, new collision records (appended) and then the
+header, which switches the live slot. A crash before the header is written
+leaves the previous checkpoint intact. Adding cars, changing names or
+commands or blocking more cells rewrites the whole file (through a
+temporary file).
+"""
+import json
+import os
+import struct
+from typing import List, NamedTuple, Optional
+
+from .collisions import Collision
+from .grammar import Program
+from .headings import HEADINGS, HEADING_INDEX
+from .obstacles import BitGrid, SparseCells
+
+MAGIC = b'CARCKPT\0'
+VERSION = 4
+# magic, version, live slot, width, height, step, car count, table offset,
+# static offset, static length, collisions offset, collision count, collisions end,
+# obstacle kind, obstacles offset, obstacles length
+HEADER = struct.Struct('<8sIB3xqqqqqqqqqqqqq')
+HEADER_SIZE = 128
+ROW = struct.Struct('<qqbBq')
+RECORD = struct.Struct('<qqqIB')
+# Obstacle kind stored in the header: no obstacles, a BitGrid or a SparseCells
+OBSTACLE_KINDS = (None, BitGrid.kind, SparseCells.kind)
+
+
+def _pack(log, start: int = 0) -> bytes:
+    """Serialise the collision records of a log from index start on, with their swap flags."""
+    return b''.join(RECORD.pack(step, x, y, len(car_ids), log.swaps[index])
+                    + struct.pack(f'<{len(car_ids)}q', *car_ids)
+                    for index, (step, x, y, car_ids) in enumerate(log.records(start), start))
+
+
+def _pack_obstacles(obstacles) -> bytes:
+    """Serialise an obstacle store (or None)."""
+    if obstacles is None:
+        return b''
+    if obstacles.kind == BitGrid.kind:
+        return bytes(obstacles.bits)
+    keys = sorted(obstacles.cellset)
+    return struct.pack(f'<{len(keys)}q', *keys)
+
+
+def _unpack_obstacles(kind: int, data: bytes, width: int, height: int):
+    """Rebuild the obstacle store written by _pack_obstacles."""
+    if kind >= len(OBSTACLE_KINDS):
+        raise ValueError(f"Unknown obstacle storage {kind} in checkpoint")
+    if OBSTACLE_KINDS[kind] is None:
+        return None
+    if OBSTACLE_KINDS[kind] == BitGrid.kind:
+        obstacles = BitGrid(width, height)
+        if len(data) != len(obstacles.bits):
+            raise ValueError("Checkpoint obstacles do not match the field size")
+        obstacles.bits[:] = data
+        return obstacles
+    obstacles = SparseCells(width, height)
+    obstacles.add_cells(struct.unpack(f'<{len(data) // 8}q', data))
+    return obstacles
+
+
+def obstacle_keys(obstacles) -> set:
+    """Return the cell keys of every obstacle of a store (or None), without NumPy."""
+    if obstacles is None:
+        return set()
+    if obstacles.kind == SparseCells.kind:
+        return set(obstacles.cellset)
+    return {index * 8 + bit for index, byte in enumerate(obstacles.bits) if byte
+            for bit in range(8) if byte >> bit & 1}
+
+
+class CheckpointData(NamedTuple):
+    """
+        The contents of a checkpoint file.
+
+        Attributes:
+            width, height : int  -> Field size.
+            step : int           -> The next step to run.
+            cars : list          -> (name, x, y, direction, commands, command_index, active).
+            collisions : list    -> Collision records.
+            obstacles            -> The field's BitGrid or SparseCells, or None.
+            swaps : list         -> The swap flag of each collision record.
+    """
+    width: int
+    height: int
+    step: int
+    cars: list
+    collisions: List[Collision]
+    obstacles: object = None
+    swaps: tuple = ()
+
+
+class Checkpoint:
+    """
+        A checkpoint file and what this process knows is written in it.
+
+        Attributes:
+            path : str     -> The checkpoint file.
+            slot : int     -> The car table slot the header points at.
+            tables : list  -> The rows (bytes) held by each slot, or None if unknown.
+            log : CollisionLog -> The log whose first collision_count records are
+                                  written, or None if unknown.
+            generation : int   -> The log's generation when they were written; a
+                                  cleared log is written again in full.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.slot = 0
+        self.tables: List[Optional[List[bytes]]] = [None, None]
+        self.names = None
+        self.commands = None
+        self.layout = None
+        self.offsets = None
+        self.collision_count = 0
+        self.collision_end = 0
+        self.log = None
+        self.generation = None
+
+    @staticmethod
+    def _rows(cars) -> List[bytes]:
+        pack = ROW.pack
+        try:
+            return [pack(car.x, car.y, HEADING_INDEX[car.direction], car.active, car.command_index)
+                    for car in cars]
+        except KeyError as e:
+            raise ValueError(f"Invalid direction {e} cannot be checkpointed") from e
+
+    def save(self, simulation) -> None:
+        """Write the state of the simulation, incrementally when possible."""
+        cars = simulation.cars
+        rows = self._rows(cars)
+        names = [car.name for car in cars]
+        # Programs are stored in the compact syntax
+        commands = [str(car.commands) if isinstance(car.commands, Program) else car.commands for car in cars]
+        obstacles = simulation.field.obstacles
+        # Cells are only ever blocked, never freed: the count tells whether some were added
+        layout = (simulation.field.width, simulation.field.height, len(cars),
+                  None if obstacles is None else (obstacles.kind, len(obstacles)))
+        log = simulation.collision_log
+        incremental = (self.layout == layout and self.names == names and self.commands == commands
+                       and log is self.log and log.generation == self.generation
+                       and self.collision_count <= len(log) and os.path.exists(self.path))
+        if incremental:
+            try:
+                self._update(simulation, rows)
+            except BaseException:
+                # The idle slot may be half written: rewrite everything next time
+                self.layout = None
+                raise
+        else:
+            self._rewrite(simulation, rows, names, commands)
+            self.layout = layout
+
+    def _header(self, simulation, offsets: tuple) -> bytes:
+        table, static, static_length, obstacles, obstacles_length, collisions = offsets
+        kind = OBSTACLE_KINDS.index(getattr(simulation.field.obstacles, 'kind', None))
+        header = HEADER.pack(MAGIC, VERSION, self.slot, simulation.field.width, simulation.field.height,
+                             simulation.step, len(simulation.cars), table, static, static_length,
+                             collisions, self.collision_count, self.collision_end,
+                             kind, obstacles, obstacles_length)
+        return header.ljust(HEADER_SIZE, b'\0')
+
+    def _offsets(self, car_count: int, static_length: int, obstacles_length: int) -> tuple:
+        static = HEADER_SIZE + 2 * car_count * ROW.size
+        obstacles = static + static_length
+        return HEADER_SIZE, static, static_length, obstacles, obstacles_length, obstacles + obstacles_length
+
+    def _rewrite(self, simulation, rows: List[bytes], names: list, commands: list) -> None:
+        static = json.dumps({'names': names, 'commands': commands}).encode('utf-8')
+        obstacles = _pack_obstacles(simulation.field.obstacles)
+        collisions = _pack(simulation.collision_log)
+        self.slot = 0
+        self.offsets = self._offsets(len(rows), len(static), len(obstacles))
+        self.collision_count = len(simulation.collision_log)
+        self.collision_end = self.offsets[5] + len(collisions)
+        table = b''.join(rows)
+        temporary = self.path + '.tmp'
+        with open(temporary, 'wb') as file:
+            file.write(self._header(simulation, self.offsets))
+            file.write(table)
+            file.write(table)
+            file.write(static)
+            file.write(obstacles)
+            file.write(collisions)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary, self.path)
+        self.tables = [rows, list(rows)]
+        self.names = names
+        self.commands = commands
+        self.attach(simulation.collision_log)
+
+    def _update(self, simulation, rows: List[bytes]) -> None:
+        target = 1 - self.slot
+        previous = self.tables[target]
+        base = self.offsets[0] + target * len(rows) * ROW.size
+        with open(self.path, 'r+b') as file:
+            # Rewrite runs of changed rows in the idle slot
+            index = 0
+            count = len(rows)
+            while index < count:
+                if rows[index] == previous[index]:
+                    index += 1
+                    continue
+                end = index + 1
+                while end < count and rows[end] != previous[end]:
+                    end += 1
+                file.seek(base + index * ROW.size)
+                file.write(b''.join(rows[index:end]))
+                index = end
+            log = simulation.collision_log
+            if len(log) > self.collision_count:
+                file.seek(self.collision_end)
+                data = _pack(log, self.collision_count)
+                file.write(data)
+                self.collision_end += len(data)
+                self.collision_count = len(log)
+            file.flush()
+            os.fsync(file.fileno())
+            # The header switches to the new slot only once the rows are written
+            self.slot = target
+            file.seek(0)
+            file.write(self._header(simulation, self.offsets))
+        self.tables[target] = rows
+
+    def attach(self, log) -> None:
+        """Remember that log holds the collision records written in the file."""
+        self.log = log
+        self.generation = log.generation
+
+    def load(self) -> CheckpointData:
+        """Read the checkpoint, remembering its contents for incremental saves."""
+        with open(self.path, 'rb') as file:
+            header = file.read(HEADER_SIZE)
+            if len(header) < HEADER.size or header[:len(MAGIC)] != MAGIC:
+                raise ValueError(f"{self.path} is not a simulation checkpoint")
+            (_, version, slot, width, height, step, count, table, static, static_length,
+             collisions, collision_count, collision_end,
+             kind, obstacles, obstacles_length) = HEADER.unpack_from(header)
+            if version != VERSION:
+                raise ValueError(f"Unsupported checkpoint format version {version}")
+            file.seek(table)
+            tables = file.read(2 * count * ROW.size)
+            file.seek(static)
+            names_commands = json.loads(file.read(static_length).decode('utf-8'))
+            file.seek(obstacles)
+            blocked = file.read(obstacles_length)
+            file.seek(collisions)
+            log = file.read(collision_end - collisions)
+        if (len(tables) != 2 * count * ROW.size or len(blocked) != obstacles_length
+                or len(log) != collision_end - collisions):
+            raise ValueError(f"{self.path} is truncated")
+        field_obstacles = _unpack_obstacles(kind, blocked, width, height)
+
+        size = ROW.size
+        self.tables = [[tables[(s * count + i) * size:(s * count + i + 1) * size] for i in range(count)]
+                       for s in (0, 1)]
+        self.slot = slot
+        self.offsets = (table, static, static_length, obstacles, obstacles_length, collisions)
+        self.names = names_commands['names']
+        self.commands = names_commands['commands']
+        self.layout = (width, height, count,
+                       None if field_obstacles is None else (field_obstacles.kind, len(field_obstacles)))
+        self.collision_count = collision_count
+        self.collision_end = collision_end
+
+        cars = []
+        for name, commands, row in zip(self.names, self.commands, self.tables[slot]):
+            x, y, heading, active, command_index = ROW.unpack(row)
+            cars.append((name, x, y, HEADINGS[heading], commands, command_index, bool(active)))
+        records = []
+        swaps = []
+        position = 0
+        for _ in range(collision_count):
+            collision_step, x, y, car_count, swap = RECORD.unpack_from(log, position)
+            position += RECORD.size
+            car_ids = struct.unpack_from(f'<{car_count}q', log, position)
+            records.append(Collision(collision_step, x, y, car_ids))
+            swaps.append(swap)
+            position += 8 * car_count
+        return CheckpointData(width, height, step, cars, records, field_obstacles, swaps)
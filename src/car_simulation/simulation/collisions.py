@@ -0,0 +1,223 @@
+# simulation/collisions.py
+"""
+Collision records of a simulation.
+
+Every cell where active cars meet during a step gives one record: the
+step, the cell and the ids (indexes in Simulation.cars) of all the cars
+on it, the car that was there first (the lowest id) followed by the
+newcomers in increasing order. A pileup of k cars is a single record of
+k ids, held in flat arrays, so recording collisions allocates no strings.
+
+Messages are only rendered on demand (CollisionMessages, which
+Simulation.collisions returns): each newcomer collides with the first car
+and the first car with it, the two messages the simulation always printed.
+Records are ordered by step, then by their first newcomer, but the
+messages of a step are rendered in the order a scan over all cars finds
+them: by newcomer across every cell of the step, then the swaps.
+"""
+from array import array
+from bisect import bisect_left, bisect_right
+from collections.abc import Sequence
+from typing import Iterator, List, NamedTuple, Tuple
+
+from .events import MESSAGES, COLLISION
+
+
+class Collision(NamedTuple):
+    """
+        One collision record.
+
+        Attributes:
+            step : int       -> The step of the collision.
+            x, y : int       -> The cell.
+            car_ids : tuple  -> The car that held the cell first (lowest id), then the
+                                newcomers in increasing order.
+    """
+    step: int
+    x: int
+    y: int
+    car_ids: Tuple[int, ...]
+
+
+class CollisionLog:
+    """
+        Array-backed log of collision records (see Collision).
+
+        Attributes:
+            steps, xs, ys : array -> Step and cell of each record.
+            ends : array          -> End of each record's ids in car_ids.
+            car_ids : array       -> The ids of every record, concatenated.
+            pair_ends : array     -> Number of (newcomer, first car) pairs up to the
+                                     end of each record.
+            swaps : array         -> 1 for the records of cars that swapped cells (swept
+                                     collisions), which come after the pileups of their
+                                     step.
+            generation : int      -> Bumped by clear(), so a reader that remembers how
+                                     many records it has seen (a Checkpoint) notices
+                                     that the log was rewritten.
+    """
+
+    def __init__(self):
+        self.steps = array('q')
+        self.xs = array('q')
+        self.ys = array('q')
+        self.ends = array('q')
+        self.car_ids = array('q')
+        self.pair_ends = array('q')
+        self.swaps = array('b')
+        self.generation = 0
+
+    def add(self, step: int, x: int, y: int, car_ids, swap: bool = False) -> None:
+        """Record that the given cars (first car first) met on (x, y), in O(len(car_ids))."""
+        self.steps.append(step)
+        self.xs.append(x)
+        self.ys.append(y)
+        self.car_ids.extend(car_ids)
+        self.ends.append(len(self.car_ids))
+        self.pair_ends.append(self.pairs + len(car_ids) - 1)
+        self.swaps.append(swap)
+
+    @property
+    def pairs(self) -> int:
+        """Number of (newcomer, first car) pairs in the log."""
+        return self.pair_ends[-1] if self.pair_ends else 0
+
+    def __len__(self) -> int:
+        return len(self.steps)
+
+    def __getitem__(self, index: int) -> Collision:
+        if index < 0:
+            index += len(self.steps)
+        start = self.ends[index - 1] if index else 0
+        return Collision(self.steps[index], self.xs[index], self.ys[index],
+                         tuple(self.car_ids[start:self.ends[index]]))
+
+    def __iter__(self) -> Iterator[Collision]:
+        return self.records()
+
+    def records(self, start: int = 0) -> Iterator[Collision]:
+        """Iterate over the records from index start on."""
+        car_ids = self.car_ids
+        first = self.ends[start - 1] if start else 0
+        for index in range(start, len(self.steps)):
+            end = self.ends[index]
+            yield Collision(self.steps[index], self.xs[index], self.ys[index], tuple(car_ids[first:end]))
+            first = end
+
+    def step_records(self, start: int = 0) -> Iterator[Tuple[List[Collision], List[int]]]:
+        """Iterate over the records from index start on, grouped by step, with their swap flags."""
+        records = []
+        swaps = []
+        for index, record in enumerate(self.records(start), start):
+            if records and record.step != records[0].step:
+                yield records, swaps
+                records = []
+                swaps = []
+            records.append(record)
+            swaps.append(self.swaps[index])
+        if records:
+            yield records, swaps
+
+    def clear(self) -> None:
+        for column in (self.steps, self.xs, self.ys, self.ends, self.car_ids, self.pair_ends, self.swaps):
+            del column[:]
+        self.generation += 1
+
+
+def render(record: Collision, cars) -> List[str]:
+    """The messages of a record, two per newcomer; cars maps ids to cars."""
+    step, x, y, car_ids = record
+    first = cars[car_ids[0]].name
+    messages = []
+    for car_id in car_ids[1:]:
+        name = cars[car_id].name
+        messages.append(MESSAGES[COLLISION].format(car=name, other=first, x=x, y=y, step=step))
+        messages.append(MESSAGES[COLLISION].format(car=first, other=name, x=x, y=y, step=step))
+    return messages
+
+
+def render_step(records: List[Collision], swaps: List[int], cars) -> List[str]:
+    """
+    The messages of the records of one step, in the order a scan over all
+    cars finds them: every newcomer in increasing id order, whatever its
+    cell, then the swaps.
+    """
+    pairs = []
+    swapped = []
+    for record, swap in zip(records, swaps):
+        step, x, y, car_ids = record
+        if swap:
+            swapped.append(record)
+        else:
+            pairs.extend((car_id, car_ids[0], x, y, step) for car_id in car_ids[1:])
+    if len(records) > 1:
+        pairs.sort()
+    messages = []
+    template = MESSAGES[COLLISION]
+    for car_id, first, x, y, step in pairs:
+        name, other = cars[car_id].name, cars[first].name
+        messages.append(template.format(car=name, other=other, x=x, y=y, step=step))
+        messages.append(template.format(car=other, other=name, x=x, y=y, step=step))
+    for record in swapped:
+        messages.extend(render(record, cars))
+    return messages
+
+
+class CollisionMessages(Sequence):
+    """
+        Read-only list of the collision messages of a log, rendered only for
+        the messages accessed.
+
+        Attributes:
+            log : CollisionLog -> The records.
+            cars : list        -> The cars, for their names.
+    """
+
+    def __init__(self, log: CollisionLog, cars):
+        self.log = log
+        self.cars = cars
+
+    def __len__(self) -> int:
+        return 2 * self.log.pairs
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, stride = index.indices(len(self))
+            if stride != 1:
+                return list(self)[index]
+            return self._range(start, stop)
+        count = len(self)
+        if index < 0:
+            index += count
+        if not 0 <= index < count:
+            raise IndexError("collision message index out of range")
+        return self._range(index, index + 1)[0]
+
+    def _range(self, start: int, stop: int) -> List[str]:
+        if start >= stop:
+            return []
+        log = self.log
+        pair_ends = log.pair_ends
+        record = bisect_right(pair_ends, start // 2)
+        # Messages are ordered within a step: render from its first record
+        record = bisect_left(log.steps, log.steps[record], 0, record)
+        skip = start - 2 * (pair_ends[record - 1] if record else 0)
+        messages = []
+        for records, swaps in log.step_records(record):
+            messages.extend(render_step(records, swaps, self.cars))
+            if len(messages) >= stop - start + skip:
+                break
+        return messages[skip:skip + stop - start]
+
+    def __iter__(self) -> Iterator[str]:
+        cars = self.cars
+        for records, swaps in self.log.step_records():
+            yield from render_step(records, swaps, cars)
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, Sequence) and not isinstance(other, str):
+            return len(self) == len(other) and list(self) == list(other)
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return repr(list(self))
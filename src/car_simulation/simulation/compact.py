@@ -0,0 +1,206 @@
+# simulation/compact.py
+"""
+Compact car representations for very large fleets.
+
+Memory targets (CPython, 64-bit), excluding the name and command strings,
+which are shared when several cars use the same value:
+    CompactCar : a __slots__ object of 8 fields, about 100 bytes per car.
+                 Simulation and every engine accept it in place of a Car.
+    Fleet      : struct-of-arrays columns, BYTES_PER_CAR (30) bytes per car.
+A Car with its __dict__ and string direction costs several hundred bytes, so a Fleet holds millions of cars in tens of megabytes.
+"""
+from array import array
+
+from .events import Event, NullSink, BLOCKED_MOVE, INACTIVE_CAR
+from .field import Field
+from .headings import HEADINGS, HEADING_INDEX, DELTA_X, DELTA_Y, TURN_LEFT, TURN_RIGHT
+
+COMMAND_LEFT = 'L'
+COMMAND_RIGHT = 'R'
+COMMAND_FORWARD = 'F'
+
+# x, y and cursor (4 bytes each), heading and active (1 byte each),
+# plus one reference each into the name and command lists
+BYTES_PER_CAR = 4 + 4 + 4 + 1 + 1 + 8 + 8
+# Shared by the compact cars that are not part of a simulation
+NO_EVENTS = NullSink()
+
+
+class CompactCar:
+    """
+        Slimmed car with an integer heading and table-driven turns and moves.
+
+        Attributes:
+            name : str           -> The name of the car.
+            x : int              -> The x-coordinate of the car's position.
+            y : int              -> The y-coordinate of the car's position.
+            heading : int        -> Index into HEADINGS: 0 'N', 1 'E', 2 'S', 3 'W'.
+            commands : str       -> The commands for the car to execute.
+            command_index : int  -> Index of the next command.
+            active : bool        -> False once the car has stopped.
+            events : EventSink   -> Receives blocked moves and commands sent to an inactive
+                                    car; Simulation.add_car sets it to the simulation's sink.
+    """
+    __slots__ = ('name', 'x', 'y', 'heading', 'commands', 'command_index', 'active', 'events')
+
+    def __init__(self, name: str, x: int, y: int, direction: str, commands: str):
+        self.name = name
+        self.x = x
+        self.y = y
+        self.heading = HEADING_INDEX[direction]
+        self.commands = commands
+        self.command_index = 0
+        self.active = True
+        self.events = NO_EVENTS
+
+    @property
+    def direction(self) -> str:
+        """The heading as a compass letter."""
+        return HEADINGS[self.heading]
+
+    @direction.setter
+    def direction(self, direction: str) -> None:
+        self.heading = HEADING_INDEX[direction]
+
+    def turn_left(self) -> None:
+        self.heading = TURN_LEFT[self.heading]
+
+    def turn_right(self) -> None:
+        self.heading = TURN_RIGHT[self.heading]
+
+    def move_forward(self, field: Field) -> bool:
+        """Move one unit forward if the target can be entered; return whether it moved."""
+        new_x = self.x + DELTA_X[self.heading]
+        new_y = self.y + DELTA_Y[self.heading]
+        if field.can_enter(new_x, new_y):
+            self.x = new_x
+            self.y = new_y
+            return True
+        if self.events.enabled:
+            self.events.emit(Event(BLOCKED_MOVE, self.name, self.x, self.y, self.command_index))
+        return False
+
+    def execute_command(self, field: Field) -> None:
+        """Execute the next command, with the same rules as Car.execute_command."""
+        if not self.active:
+            if self.events.enabled:
+                self.events.emit(Event(INACTIVE_CAR, self.name, self.x, self.y, self.command_index))
+            return
+        if self.command_index < len(self.commands):
+            command = self.commands[self.command_index]
+            if command == COMMAND_FORWARD:
+                self.move_forward(field)
+            elif command == COMMAND_LEFT:
+                self.heading = TURN_LEFT[self.heading]
+            elif command == COMMAND_RIGHT:
+                self.heading = TURN_RIGHT[self.heading]
+        self.command_index += 1
+
+    def __repr__(self) -> str:
+        return f"{self.name}, ({self.x},{self.y}) {self.direction}, {self.commands}"
+
+
+class Fleet:
+    """
+        Container keeping the per-car scalars of many cars in typed buffers.
+
+        Cars are addressed by their integer id (insertion order). Columns are
+        array.array buffers, so they can be shared with NumPy without copying
+        (see as_arrays).
+
+        Attributes:
+            names : list        -> Car names.
+            commands : list     -> Command strings; equal strings are stored once.
+            x, y : array        -> Coordinates (int32).
+            heading : array     -> Heading index (int8).
+            cursor : array      -> Index of the next command (uint32).
+            active : bytearray  -> 1 while the car is active.
+    """
+
+    def __init__(self):
+        self.names = []
+        self.commands = []
+        self.x = array('i')
+        self.y = array('i')
+        self.heading = array('b')
+        self.cursor = array('I')
+        self.active = bytearray()
+        self._shared_commands = {}
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def append(self, name: str, x: int, y: int, direction: str, commands: str) -> int:
+        """Add a car and return its id."""
+        self.names.append(name)
+        self.commands.append(self._shared_commands.setdefault(commands, commands))
+        self.x.append(x)
+        self.y.append(y)
+        self.heading.append(HEADING_INDEX[direction])
+        self.cursor.append(0)
+        self.active.append(1)
+        return len(self.names) - 1
+
+    @classmethod
+    def from_cars(cls, cars) -> 'Fleet':
+        """Build a fleet from Car or CompactCar objects, keeping their current state."""
+        fleet = cls()
+        for car in cars:
+            car_id = fleet.append(car.name, car.x, car.y, car.direction, car.commands)
+            fleet.cursor[car_id] = car.command_index
+            fleet.active[car_id] = 1 if car.active else 0
+        return fleet
+
+    def car(self, car_id: int) -> CompactCar:
+        """Return a CompactCar holding a copy of the car's current state."""
+        car = CompactCar(self.names[car_id], self.x[car_id], self.y[car_id],
+                         HEADINGS[self.heading[car_id]], self.commands[car_id])
+        car.command_index = self.cursor[car_id]
+        car.active = bool(self.active[car_id])
+        return car
+
+    def store(self, car_id: int, car) -> None:
+        """Write the state of a car object back into the fleet."""
+        self.x[car_id] = car.x
+        self.y[car_id] = car.y
+        self.heading[car_id] = HEADING_INDEX[car.direction]
+        self.cursor[car_id] = car.command_index
+        self.active[car_id] = 1 if car.active else 0
+
+    def execute_command(self, car_id: int, field: Field) -> None:
+        """Execute the next command of one car directly on the buffers."""
+        if not self.active[car_id]:
+            return
+        index = self.cursor[car_id]
+        commands = self.commands[car_id]
+        if index < len(commands):
+            heading = self.heading[car_id]
+            command = commands[index]
+            if command == COMMAND_FORWARD:
+                new_x = self.x[car_id] + DELTA_X[heading]
+                new_y = self.y[car_id] + DELTA_Y[heading]
+                if field.can_enter(new_x, new_y):
+                    self.x[car_id] = new_x
+                    self.y[car_id] = new_y
+            elif command == COMMAND_LEFT:
+                self.heading[car_id] = TURN_LEFT[heading]
+            elif command == COMMAND_RIGHT:
+                self.heading[car_id] = TURN_RIGHT[heading]
+        self.cursor[car_id] = index + 1
+
+    def as_arrays(self):
+        """
+        Return zero-copy NumPy views of the columns (requires NumPy).
+
+        Returns:
+            dict: 'x', 'y', 'heading', 'cursor' and 'active' arrays sharing
+            memory with the fleet. Appending to the fleet invalidates them.
+        """
+        import numpy as np
+        return {
+            'x': np.frombuffer(self.x, dtype=np.int32),
+            'y': np.frombuffer(self.y, dtype=np.int32),
+            'heading': np.frombuffer(self.heading, dtype=np.int8),
+            'cursor': np.frombuffer(self.cursor, dtype=np.uint32),
+            'active': np.frombuffer(self.active, dtype=np.uint8),
+        }
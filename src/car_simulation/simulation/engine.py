@@ -0,0 +1,235 @@
+# simulation/engine.py
+
+from .headings import HEADING_INDEX
+from .history import Snapshot, snapshot_cars
+
+class Engine:
+    """
+        Base class for the stepping back-ends used by Simulation.run_simulation.
+
+        An engine is created for a single run. It advances every car of the
+        simulation by one command per step and records collisions on the
+        simulation, then writes the final state back onto the Car objects.
+
+        Subclasses implement execute() and collide(); step() runs both and,
+        when the simulation has stats, times them and samples the active cars.
+        Cars never gain commands, so a run ends as soon as done() reports that
+        no car can change state any more; step 0 always runs, as its collision
+        check also deactivates cars that share a cell without any commands.
+
+        Attributes:
+            simulation : Simulation -> The simulation being stepped.
+            stats : Stats           -> The simulation's instrumentation, or None.
+    """
+    name = None
+
+    def __init__(self, simulation):
+        self.simulation = simulation
+        self.stats = simulation.stats
+
+    def run(self, max_steps: int, start: int = 0) -> None:
+        """Advance the simulation through steps start .. max_steps - 1, or until done()."""
+        for step in range(start, max_steps):
+            if step and self.done():
+                break
+            self.step(step)
+
+    def done(self) -> bool:
+        """True once every active car has run out of commands (so later steps change nothing)."""
+        return False
+
+    def step(self, step: int):
+        """
+        Execute one command for every car and check for collisions.
+
+        Returns:
+            The cars whose cell changed, in a form positions() accepts.
+        """
+        stats = self.stats
+        if stats is None:
+            moved = self.execute(step)
+            self.collide(step, moved)
+            return moved
+        with stats.timer('execute'):
+            moved = self.execute(step)
+        with stats.timer('collisions'):
+            self.collide(step, moved)
+        stats.count('steps')
+        stats.sample_active(step, self.active_count())
+        return moved
+
+    def execute(self, step: int):
+        """Execute one command for every car, returning the cars whose cell changed."""
+        raise NotImplementedError
+
+    def collide(self, step: int, moved) -> None:
+        """Check for collisions after execute() moved the given cars."""
+        raise NotImplementedError
+
+    def positions(self, moved) -> list:
+        """Return (car id, x, y) of the cars returned by step()."""
+        raise NotImplementedError
+
+    def active_count(self) -> int:
+        """Return the number of active cars."""
+        raise NotImplementedError
+
+    def state(self) -> tuple:
+        """Return x, y, heading index and active flag of every car as NumPy arrays."""
+        raise NotImplementedError
+
+    def snapshot(self, step: int) -> Snapshot:
+        """Return the state of every car, at the start of the given step, for a History."""
+        raise NotImplementedError
+
+    def finish(self) -> None:
+        """Write the engine state back to the cars once the run is over."""
+
+
+class PythonEngine(Engine):
+    """
+        The reference engine: calls Car.execute_command on every car that
+        still has work, one car at a time, followed by Simulation.check_collision.
+
+        The first step rebuilds the simulation's occupancy index from all cars;
+        later steps only hand the cars whose cell changed to check_collision.
+        Cars that collided or ran out of commands are dropped from the pending
+        list, so a step costs O(cars still driving) and collided cars are never
+        sent commands.
+
+        Attributes:
+            pending : list  -> Ids of the active cars with commands left, in order.
+            lengths : list  -> Number of commands of each car.
+            recorded : int  -> Collision records seen when pending was last filtered.
+            active : int    -> Number of active cars, lowered as collisions deactivate them.
+    """
+    name = 'python'
+
+    def __init__(self, simulation):
+        super().__init__(simulation)
+        self.indexed = False
+        cars = simulation.cars
+        self.lengths = [len(car.commands) for car in cars]
+        self.pending = [car_id for car_id, car in enumerate(cars)
+                        if car.active and car.command_index < self.lengths[car_id]]
+        self.recorded = len(simulation.collision_log)
+        self.active = sum(1 for car in cars if car.active)
+
+    def execute(self, step: int) -> list:
+        if self.stats is not None:
+            return self._execute_counted()
+        field = self.simulation.field
+        cars = self.simulation.cars
+        lengths = self.lengths
+        moved = []
+        pending = []
+        for car_id in self.pending:
+            car = cars[car_id]
+            x, y = car.x, car.y
+            car.execute_command(field)
+            if car.x != x or car.y != y:
+                moved.append((car_id, (x, y)))
+            if car.command_index < lengths[car_id]:
+                pending.append(car_id)
+        self.pending = pending
+        return moved
+
+    def _execute_counted(self) -> list:
+        """execute() that also counts the commands executed and the blocked moves."""
+        field = self.simulation.field
+        cars = self.simulation.cars
+        lengths = self.lengths
+        moved = []
+        pending = []
+        blocked = 0
+        for car_id in self.pending:
+            car = cars[car_id]
+            x, y = car.x, car.y
+            forward = car.commands[car.command_index] == 'F'
+            car.execute_command(field)
+            if car.x != x or car.y != y:
+                moved.append((car_id, (x, y)))
+            elif forward:
+                blocked += 1
+            if car.command_index < lengths[car_id]:
+                pending.append(car_id)
+        self.stats.count('commands', len(self.pending))
+        self.stats.count('blocked_moves', blocked)
+        self.pending = pending
+        return moved
+
+    def collide(self, step: int, moved: list) -> None:
+        simulation = self.simulation
+        if self.indexed:
+            simulation.check_collision(step, moved)
+        else:
+            simulation.check_collision(step)
+            self.indexed = True
+        if simulation.swept and moved:
+            simulation.check_swaps(step, moved)
+        if len(simulation.collision_log) != self.recorded:
+            # Only steps with collisions deactivate cars
+            log = simulation.collision_log
+            start = log.ends[self.recorded - 1] if self.recorded else 0
+            # A car can be both in a pileup and in a swap of the same step
+            self.active -= len(set(log.car_ids[start:]))
+            self.recorded = len(log)
+            cars = simulation.cars
+            self.pending = [car_id for car_id in self.pending if cars[car_id].active]
+
+    def done(self) -> bool:
+        return not self.pending
+
+    def positions(self, moved: list) -> list:
+        cars = self.simulation.cars
+        return [(car_id, cars[car_id].x, cars[car_id].y) for car_id, _ in moved]
+
+    def active_count(self) -> int:
+        return self.active
+
+    def state(self) -> tuple:
+        import numpy as np
+        cars = self.simulation.cars
+        count = len(cars)
+        return (np.fromiter((car.x for car in cars), dtype=np.int64, count=count),
+                np.fromiter((car.y for car in cars), dtype=np.int64, count=count),
+                np.fromiter((HEADING_INDEX[car.direction] for car in cars), dtype=np.int8, count=count),
+                np.fromiter((car.active for car in cars), dtype=bool, count=count))
+
+    def snapshot(self, step: int) -> Snapshot:
+        return snapshot_cars(step, self.simulation.cars, HEADING_INDEX)
+
+
+def get_engine(name: str):
+    """
+    Return the engine class registered under the given name.
+
+    Args:
+        name (str): 'python' for the reference engine, 'numpy' for the
+            vectorised engine, 'event' for the event-driven engine or
+            'sharded' for the multi-process engine (all three require NumPy).
+
+    Returns:
+        The Engine subclass.
+    """
+    if name == 'python':
+        return PythonEngine
+    if name == 'numpy':
+        try:
+            from .numpy_engine import NumpyEngine
+        except ImportError as e:
+            raise ImportError("The 'numpy' engine requires NumPy: pip install car_simulation[numpy]") from e
+        return NumpyEngine
+    if name == 'event':
+        try:
+            from .event_engine import EventEngine
+        except ImportError as e:
+            raise ImportError("The 'event' engine requires NumPy: pip install car_simulation[numpy]") from e
+        return EventEngine
+    if name == 'sharded':
+        try:
+            from .sharded_engine import ShardedEngine
+        except ImportError as e:
+            raise ImportError("The 'sharded' engine requires NumPy: pip install car_simulation[numpy]") from e
+        return ShardedEngine
+    raise ValueError(f"Unknown simulation engine: {name}")
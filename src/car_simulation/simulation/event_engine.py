@@ -0,0 +1,391 @@
+# simulation/event_engine.py
+
+import numpy as np
+
+from .numpy_engine import NumpyEngine, COMMAND_LEFT, COMMAND_RIGHT, COMMAND_FORWARD
+
+# Plain steps taken after a failed planning attempt, doubled after each
+# failure up to MAX_BACKOFF; a plan that fails costs about as much as these
+MIN_BACKOFF = 16
+MAX_BACKOFF = 256
+# Costs used to weigh plans against plain steps, in units of one car update
+# Fixed cost of stepping a subset of the fleet
+SUBSTEP_OVERHEAD = 512
+# Fixed cost of planning and advancing a window
+WINDOW_OVERHEAD = 16384
+# Cost per active car of planning and advancing a window
+PLAN_FACTOR = 4
+# A window is only taken if it costs at most this fraction of plain steps
+PLAN_MARGIN = 0.5
+# Candidate pairs of boxes per car beyond which a window is not considered
+PAIR_LIMIT = 8
+# Largest number of tiles in the coarse obstacle map
+OBSTACLE_TILES = 1 << 22
+
+
+class EventEngine(NumpyEngine):
+    """
+        Event-driven engine that skips ahead between potential collisions.
+
+        Each command pattern (see programs.py) is turned into prefix tables:
+        the number of turns before every command and, for each of the four
+        headings, the number of forward moves made in that heading. A pattern
+        turns the car by the same amount every period, so the moves of whole
+        periods add up in closed form. With them, the position and heading of
+        a car after any run of commands is computed in O(1), without ticking
+        through the commands or the periods. Programs of several blocks (see
+        grammar.py) add the turns and moves made before the block reached.
+
+        On fields with obstacles, a coarse map of the tiles holding an
+        obstacle (with a summed-area table over it) tells in O(1) whether the
+        box a car can reach during a window is free of obstacles; cars whose
+        box touches a blocked tile are stepped as near a boundary.
+
+        For a window of k steps, the prefix tables give the forward moves of
+        every car towards each heading, and so the box its path stays in. Cars
+        can only meet on a cell of both of their boxes, so the engine sweeps
+        the boxes for overlapping pairs (a car driving straight sweeps a
+        segment, and cars on parallel lanes never overlap), picks a window
+        and advances the cars without an overlap analytically to the end of
+        it. A forward move might be dropped at a field boundary, so the cars
+        whose box reaches one are stepped too: they and the cars of
+        overlapping pairs are stepped one step at a time with collision checks
+        among themselves. When no
+        window pays off, the engine takes ordinary steps of the numpy engine,
+        backing off exponentially before planning again.
+
+        Final positions and the collision list are identical to the
+        step-by-step engines; runtime depends on the number of events rather
+        than on steps times cars.
+
+        Attributes:
+            turns : ndarray -> turns[offset + r]: turns (mod 4) made by the first r
+                               commands of the pattern at offset.
+            moves : ndarray -> moves[h, offset + r]: forward moves made by the first
+                               r commands of that pattern while turned h from its start.
+            block_turns : ndarray -> Turns made by a program before each of its blocks.
+            block_moves : ndarray -> block_moves[g, b]: moves made before block b while
+                               turned g from the program's first command.
+            window : int    -> Length of the last window; the next plan only tries
+                               its neighbours unless planning failed.
+            blocked_tiles : ndarray -> Summed-area table of the coarse obstacle map,
+                               None without obstacles.
+            tile_shift : int -> log2 of the side of a coarse obstacle tile.
+    """
+    name = 'event'
+
+    def __init__(self, simulation):
+        super().__init__(simulation)
+        program = self.program
+        # Each pattern is followed by a 0 byte: the prefix tables restart
+        # from the start of the pattern holding each position
+        start = np.zeros(len(program), dtype=np.int64)
+        start[1:] = np.cumsum(program[:-1] == 0)
+        heads = np.concatenate(([0], np.flatnonzero(program == 0) + 1))[:-1]
+        start = heads[np.minimum(start, len(heads) - 1)]
+
+        turn = np.zeros(len(program), dtype=np.int64)
+        turn[1:][program[:-1] == COMMAND_RIGHT] = 1
+        turn[1:][program[:-1] == COMMAND_LEFT] = 3
+        turns = np.cumsum(turn)
+        self.turns = ((turns - turns[start]) & 3).astype(np.int8)
+
+        count_type = np.int32 if len(program) < np.iinfo(np.int32).max else np.int64
+        self.moves = np.zeros((4, len(program)), dtype=count_type)
+        forward = program[:-1] == COMMAND_FORWARD
+        frame = self.turns[:-1]
+        for heading in range(4):
+            moves = self.moves[heading]
+            np.cumsum(forward & (frame == heading), out=moves[1:])
+            moves -= moves[start]
+
+        self.block_turns = self.block_moves = None
+        if len(self.key):
+            self._block_tables()
+
+        self.blocked_tiles = None
+        self.tile_shift = 0
+        if self.obstacles is not None:
+            self._map_obstacles()
+
+        self.window = 2
+        self.explore = True
+        self.backoff = MIN_BACKOFF
+        self.wait = 0
+
+    def run(self, max_steps: int, start: int = 0) -> None:
+        stats = self.stats
+        step = start
+        while step < max_steps and not (step and self.done()):
+            if self.occupancy is None or self.wait > 0:
+                self.wait -= 1
+                self.step(step)
+                step += 1
+                continue
+            active = np.flatnonzero(self.active)
+            # No window runs past the last command of the pending cars
+            pending = self.pending
+            limit = min(max_steps - step, int((self.length[pending] - self.cursor[pending]).max()))
+            if stats is None:
+                window, crowded = self._plan(active, limit)
+            else:
+                with stats.timer('plan'):
+                    window, crowded = self._plan(active, limit)
+            if not window:
+                self.step(step)
+                step += 1
+                self.wait = self.backoff - 1
+                self.backoff = min(self.backoff * 2, MAX_BACKOFF)
+                continue
+            self.backoff = MIN_BACKOFF
+            if stats is None:
+                self._run_window(step, window, active, crowded)
+            else:
+                with stats.timer('advance'):
+                    self._run_window(step, window, active, crowded)
+                stats.count('steps', window)
+                stats.sample_active(step + window - 1, self.active_count())
+            self.pending = self._pending(active)
+            step += window
+
+    def _map_obstacles(self) -> None:
+        """Build the summed-area table of the tiles holding an obstacle."""
+        cells = self.obstacles.cells()
+        if not len(cells):
+            return
+        shift = 0
+        while ((self.width - 1 >> shift) + 1) * ((self.height - 1 >> shift) + 1) > OBSTACLE_TILES:
+            shift += 1
+        columns = (self.width - 1 >> shift) + 1
+        rows = (self.height - 1 >> shift) + 1
+        table = np.zeros((columns + 1, rows + 1), dtype=np.int32)
+        table[1:, 1:][(cells // self.height) >> shift, (cells % self.height) >> shift] = 1
+        np.cumsum(table, axis=0, out=table)
+        np.cumsum(table, axis=1, out=table)
+        self.blocked_tiles = table
+        self.tile_shift = shift
+
+    def _run_window(self, step: int, window: int, active: np.ndarray, crowded: np.ndarray) -> None:
+        """Advance the isolated cars through the window, then step the crowded ones."""
+        self._advance(np.setdiff1d(active, crowded, assume_unique=True), window)
+        for offset in range(window):
+            crowded = self._pending(crowded)
+            if not len(crowded):
+                break
+            self._substep(step + offset, crowded)
+
+    def _substep(self, step: int, cars: np.ndarray) -> None:
+        """Plain step of a subset of cars that no other car can reach this step."""
+        moved, old_cells = self._execute(cars)
+        self._tick(cars)
+        self._collide_moved(step, moved, old_cells)
+        if self.swept:
+            self._collide_swaps(step, moved)
+
+    def _plan(self, active: np.ndarray, limit: int):
+        """
+        Choose the length of the next window and the cars to step through it.
+
+        Returns:
+            (window, crowded): the number of steps to advance, or 0 to take a
+            plain step instead, and the ids of the cars that have to be stepped
+            one step at a time during the window; every other active car is
+            advanced analytically.
+        """
+        moving = self.cursor[active] < self.length[active]
+        if not moving.any():
+            return limit, active[:0]
+        count = len(active)
+        best_cost = (count + SUBSTEP_OVERHEAD) * PLAN_MARGIN
+        best = None
+        # Shorter windows cannot pay for planning even with no crowded car
+        shortest = max(int((PLAN_FACTOR * count + WINDOW_OVERHEAD) / best_cost) + 1, 2)
+        if self.explore:
+            # Try every window length, doubling up to the limit
+            windows = [2 << shift for shift in range(max(limit.bit_length() - 1, 1))]
+            if limit not in windows:
+                windows.append(limit)
+        else:
+            windows = (self.window // 2, self.window, min(self.window * 2, limit))
+        for window in windows:
+            window = min(window, limit)
+            if window < shortest:
+                continue
+            crowded = self._crowded(active, window)
+            if crowded is None or len(crowded) + (SUBSTEP_OVERHEAD if len(crowded) else 0) >= best_cost:
+                # Longer windows only sweep larger boxes
+                break
+            cost = (PLAN_FACTOR * count + WINDOW_OVERHEAD) / window + len(crowded)
+            if len(crowded):
+                cost += SUBSTEP_OVERHEAD
+            if cost < best_cost:
+                best_cost = cost
+                best = window, crowded
+        self.explore = best is None
+        if best is None:
+            return 0, active[:0]
+        self.window, crowded = best
+        return self.window, crowded
+
+    def _crowded(self, active: np.ndarray, window: int):
+        """
+        Return the cars that might meet another car within the next window steps.
+
+        Every forward move a car makes, dropped or not, is counted by the
+        prefix tables, so the car stays inside the box spanned by its moves
+        towards each heading during the window. Two cars can only share a
+        cell, or swap cells, on a cell of both of their boxes: the pairs of
+        overlapping boxes, found by sweeping the boxes sorted by their left
+        edge, are the only possible events of the window. The other events
+        are forward moves dropped at a boundary or an obstacle, so cars whose
+        box is not inside the field and clear of obstacles are crowded too.
+        Returns None when there are more than PAIR_LIMIT candidate pairs per car.
+        """
+        origin, _, before, after, _ = self._window(active, window)
+        north, east, south, west = self._moves(origin, before, after)
+        x = self.x[active]
+        y = self.y[active]
+        order = np.argsort(x - west, kind='stable')
+        left = (x - west)[order]
+        right = (x + east)[order]
+        bottom = (y - south)[order]
+        top = (y + north)[order]
+        count = len(active)
+        # The boxes after each one in the sweep that overlap it along x
+        overlaps = np.searchsorted(left, right, side='right') - np.arange(1, count + 1)
+        total = int(overlaps.sum())
+        if total > PAIR_LIMIT * count:
+            return None
+        first = np.repeat(np.arange(count), overlaps)
+        second = first + 1 + np.arange(total) - np.repeat(np.cumsum(overlaps) - overlaps, overlaps)
+        meet = (bottom[first] <= top[second]) & (bottom[second] <= top[first])
+        crowded = np.zeros(count, dtype=bool)
+        crowded[first[meet]] = True
+        crowded[second[meet]] = True
+        crowded = crowded[np.argsort(order)]
+        # Cars reaching a boundary or an obstacle are stepped too
+        crowded |= ~self._inside(active, north, east, south, west)
+        return active[crowded]
+
+    def _advance(self, active: np.ndarray, steps: int) -> None:
+        """Advance cars that can neither meet another car nor reach a boundary by the given steps."""
+        old_cells = self.cells(active)
+        self._jump(active, np.full(len(active), steps, dtype=np.int64))
+        new_cells = self.cells(active)
+        changed = new_cells != old_cells
+        self.occupancy.release(old_cells[changed], active[changed])
+        self.occupancy.assign(new_cells[changed], active[changed])
+
+    def _prefix(self, cars: np.ndarray, position: np.ndarray):
+        """
+        Turns and moves made by the first position commands of each car.
+
+        Returns:
+            (turns, moves): the turns (mod 4), and moves[g] the forward moves
+            made while turned g from the car's first command.
+        """
+        block, position = self._locate(cars, position)
+        turns, moves = self._pattern_prefix(block, position)
+        if not len(self.key):
+            return turns, moves
+        # Add the blocks before, the block's moves turned by the turns made before it
+        before = self.block_turns[block]
+        rotated = moves[(np.arange(4)[:, None] - before) & 3, np.arange(len(cars))]
+        return (turns + before) & 3, rotated + self.block_moves[:, block]
+
+    def _block_tables(self) -> None:
+        """Turns and moves made by each program before each of its blocks."""
+        start = self.start
+        count = len(start)
+        blocks = np.arange(count)
+        span = np.zeros(count, dtype=np.int64)
+        # The last block of a program is followed by the first (start 0) of the next
+        span[:-1] = np.maximum(start[1:] - start[:-1], 0)
+        turns, moves = self._pattern_prefix(blocks, span)
+        first = np.maximum.accumulate(np.where(start == 0, blocks, 0))
+        total = np.cumsum(turns) - turns
+        self.block_turns = (total - total[first]) & 3
+        moves = moves[(np.arange(4)[:, None] - self.block_turns) & 3, blocks]
+        total = np.cumsum(moves, axis=1) - moves
+        self.block_moves = total - total[:, first]
+
+    def _pattern_prefix(self, block: np.ndarray, position: np.ndarray):
+        """Turns and moves made by the first position commands of each block, see _prefix."""
+        offset = self.offset[block]
+        period = self.period[block]
+        repeats, rest = np.divmod(position, period)
+        # Turns made by one whole period, and the moves of one period
+        per_period = self.turns[offset + period].astype(np.int64)
+        whole = self.moves[:, offset + period].astype(np.int64)
+        # The k-th period starts turned k * per_period: count the periods
+        # starting at each of the four rotations
+        periods = []
+        for rotation in range(4):
+            first = (rotation * per_period) & 3
+            odd = (repeats - first + 3) // 4
+            periods.append(np.select([per_period == 0, per_period == 2],
+                                     [repeats * (rotation == 0),
+                                      (rotation == 0) * ((repeats + 1) // 2) + (rotation == 2) * (repeats // 2)],
+                                     odd))
+        turned = (repeats * per_period) & 3
+        moves = np.empty((4, len(block)), dtype=np.int64)
+        for heading in range(4):
+            total = self.moves[(heading - turned) & 3, offset + rest].astype(np.int64)
+            for rotation in range(4):
+                total += periods[rotation] * whole[(heading - rotation) & 3]
+            moves[heading] = total
+        return (turned + self.turns[offset + rest]) & 3, moves
+
+    def _window(self, cars: np.ndarray, steps: np.ndarray):
+        """
+        The next steps commands of each car.
+
+        Returns:
+            (origin, turns, before, after, count): the heading of the car before
+            its first command, the turns made up to the end of the window, the
+            _prefix moves at its start and end, and the commands in it.
+        """
+        cursor = self.cursor[cars]
+        length = self.length[cars]
+        start = np.minimum(cursor, length)
+        end = np.minimum(cursor + steps, length)
+        turns, before = self._prefix(cars, start)
+        end_turns, after = self._prefix(cars, end)
+        origin = (self.heading[cars] - turns) & 3
+        return origin, end_turns, before, after, end - start
+
+    @staticmethod
+    def _moves(origin: np.ndarray, before: np.ndarray, after: np.ndarray):
+        """Forward moves towards N, E, S and W during a window."""
+        columns = np.arange(len(origin))
+        return [after[(heading - origin) & 3, columns] - before[(heading - origin) & 3, columns]
+                for heading in range(4)]
+
+    def _inside(self, cars: np.ndarray, north, east, south, west) -> np.ndarray:
+        """True for cars whose box of moves is inside the field and clear of obstacles."""
+        x = self.x[cars]
+        y = self.y[cars]
+        safe = (west <= x) & (east < self.width - x) & (south <= y) & (north < self.height - y)
+        table = self.blocked_tiles
+        if table is not None:
+            # The car stays inside the box of its moves in each direction
+            shift = self.tile_shift
+            x0 = np.clip(x - west, 0, self.width - 1) >> shift
+            x1 = (np.clip(x + east, 0, self.width - 1) >> shift) + 1
+            y0 = np.clip(y - south, 0, self.height - 1) >> shift
+            y1 = (np.clip(y + north, 0, self.height - 1) >> shift) + 1
+            safe &= table[x1, y1] - table[x0, y1] - table[x1, y0] + table[x0, y0] == 0
+        return safe
+
+    def _jump(self, cars: np.ndarray, steps: np.ndarray) -> None:
+        """Apply the next steps commands of each car, known not to hit the boundary."""
+        if not len(cars):
+            return
+        origin, turns, before, after, count = self._window(cars, steps)
+        north, east, south, west = self._moves(origin, before, after)
+        self.x[cars] += east - west
+        self.y[cars] += north - south
+        self.heading[cars] = (origin + turns) & 3
+        self.cursor[cars] = np.minimum(self.cursor[cars] + steps, self.length[cars])
+        if self.stats is not None:
+            self.stats.count('commands', int(count.sum()))
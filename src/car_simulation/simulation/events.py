@@ -0,0 +1,147 @@
+# simulation/events.py
+
+import json
+from typing import Iterable, Iterator, List, NamedTuple, Optional
+
+BLOCKED_MOVE = 'blocked_move'
+INACTIVE_CAR = 'inactive_car'
+COLLISION = 'collision'
+CAR_ADDED = 'car_added'
+
+MESSAGES = {
+    BLOCKED_MOVE: "Move out of bounds; position not updated.",
+    INACTIVE_CAR: "{car} is inactive and cannot execute commands.",
+    COLLISION: "{car} collides with {other} at ({x},{y}) at step {step}",
+    CAR_ADDED: "{car} added to the simulation.",
+}
+
+# Kinds PrintSink shows by default: the messages printed while a simulation
+# runs (collisions are listed by Simulation.print_results instead)
+PRINTED_KINDS = frozenset((BLOCKED_MOVE, INACTIVE_CAR, CAR_ADDED))
+
+
+class Event(NamedTuple):
+    """
+        Something that happened to a car, kept as data until it is rendered.
+
+        Attributes:
+            kind : str   -> One of BLOCKED_MOVE, INACTIVE_CAR, COLLISION, CAR_ADDED.
+            car : str    -> Name of the car.
+            x, y : int   -> Position of the car, if known.
+            step : int   -> Step of the simulation, if known.
+            other : str  -> Name of the other car of a collision.
+    """
+    kind: str
+    car: str
+    x: Optional[int] = None
+    y: Optional[int] = None
+    step: Optional[int] = None
+    other: Optional[str] = None
+
+    def render(self) -> str:
+        """Return the event as the text message the simulation used to print."""
+        return MESSAGES[self.kind].format(**self._asdict())
+
+
+class EventSink:
+    """
+        Receives the events of a simulation.
+
+        Producers check `enabled` before building an event, so a disabled sink
+        costs one attribute lookup per would-be event.
+    """
+    enabled = True
+
+    def emit(self, event: Event) -> None:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        """Release any resources held by the sink."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class NullSink(EventSink):
+    """Discards every event; used by quiet simulations."""
+    enabled = False
+
+    def emit(self, event: Event) -> None:
+        pass
+
+
+class PrintSink(EventSink):
+    """Prints the events of the given kinds as they happen (the interactive default)."""
+
+    def __init__(self, kinds: Iterable[str] = PRINTED_KINDS):
+        self.kinds = frozenset(kinds)
+
+    def emit(self, event: Event) -> None:
+        if event.kind in self.kinds:
+            print(event.render())
+
+
+class BufferedSink(EventSink):
+    """
+        Keeps events in memory; text is only rendered when it is read.
+
+        Attributes:
+            events : list -> The events received so far.
+    """
+
+    def __init__(self):
+        self.events: List[Event] = []
+
+    def emit(self, event: Event) -> None:
+        self.events.append(event)
+
+    def render(self) -> Iterator[str]:
+        """Yield the text message of every buffered event."""
+        for event in self.events:
+            yield event.render()
+
+    def clear(self) -> None:
+        self.events.clear()
+
+
+class BatchedFileSink(EventSink):
+    """
+        Writes events to a file as JSON lines, batch_size events at a time.
+
+        Attributes:
+            path : str        -> The file written to.
+            batch_size : int  -> Events buffered before a write.
+    """
+
+    def __init__(self, path: str, batch_size: int = 4096):
+        self.path = path
+        self.batch_size = batch_size
+        self.pending: List[Event] = []
+        self.file = open(path, 'w')
+
+    def emit(self, event: Event) -> None:
+        self.pending.append(event)
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """Write the buffered events."""
+        if self.pending:
+            self.file.write(''.join(json.dumps(event._asdict()) + '\n' for event in self.pending))
+            self.pending.clear()
+        self.file.flush()
+
+    def close(self) -> None:
+        if not self.file.closed:
+            self.flush()
+            self.file.close()
+
+
+def read_events(path: str) -> Iterator[Event]:
+    """Read the events written by a BatchedFileSink."""
+    with open(path, 'r') as file:
+        for line in file:
+            yield Event(**json.loads(line))
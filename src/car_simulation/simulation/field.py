@@ -1,14 +1,26 @@
 # simulation/field.py
 
+from .obstacles import make_obstacles, parse_obstacles
+
 class Field:
-    def __init__(self, width: int, height: int):
+    def __init__(self, width: int, height: int, obstacles=None, storage: str = 'auto'):
         """
-        A class which represents the field in the simulation with below attributes   
+        A class which represents the field in the simulation with below attributes
         width : int ->The width of the field.
         height : int -> The height of the field.
+        obstacles -> The blocked cells (a BitGrid or SparseCells, see obstacles.py),
+                     None while there are none. Cars cannot start on or move into them.
+                     Pass (x, y) pairs, or the obstacles of a field of the same size.
         """
         self.width = width
         self.height = height
+        self.obstacles = None
+        if hasattr(obstacles, 'is_blocked'):
+            if (obstacles.width, obstacles.height) != (width, height):
+                raise ValueError("Obstacles belong to a field of a different size")
+            self.obstacles = obstacles
+        elif obstacles is not None:
+            self.add_obstacles(obstacles, storage)
 
     def within_bounds(self, x: int, y: int) -> bool:
         """Check if the given position (x, y) is within the field's boundaries.        Parameters:
@@ -20,3 +32,77 @@ class Field:
             bool-> True if the coordinates are within boundaries, otherwise False.
         """
         return 0 <= x < self.width and 0 <= y < self.height
+
+    def is_blocked(self, x: int, y: int) -> bool:
+        """Check if (x, y) is a cell of the field holding an obstacle."""
+        return (self.obstacles is not None and 0 <= x < self.width and 0 <= y < self.height
+                and self.obstacles.is_blocked(x, y))
+
+    def can_enter(self, x: int, y: int) -> bool:
+        """Check if a car may occupy (x, y): within bounds and not blocked."""
+        if not (0 <= x < self.width and 0 <= y < self.height):
+            return False
+        return self.obstacles is None or not self.obstacles.is_blocked(x, y)
+
+    def add_obstacles(self, cells, storage: str = 'auto') -> None:
+        """
+        Block cells of the field.
+
+        Args:
+            cells: (x, y) pairs, or a NumPy array of (x, y) rows.
+            storage (str): 'bits', 'sparse' or 'auto' (see obstacles.make_obstacles);
+                only used when the field has no obstacles yet.
+
+        Raises:
+            ValueError: If a cell is outside the field; nothing is blocked.
+        """
+        if hasattr(cells, 'dtype'):
+            keys = self._array_keys(cells)
+        else:
+            keys = []
+            for x, y in cells:
+                if not self.within_bounds(x, y):
+                    raise ValueError(f"Obstacle ({x},{y}) is out of bounds")
+                keys.append(x * self.height + y)
+        self._block(keys, storage)
+
+    def _array_keys(self, cells):
+        import numpy as np
+        cells = np.asarray(cells, dtype=np.int64).reshape(-1, 2)
+        x, y = cells[:, 0], cells[:, 1]
+        outside = np.flatnonzero((x < 0) | (x >= self.width) | (y < 0) | (y >= self.height))
+        if len(outside):
+            bad = cells[outside[0]]
+            raise ValueError(f"Obstacle ({bad[0]},{bad[1]}) is out of bounds")
+        return x * self.height + y
+
+    def _block(self, keys, storage: str) -> None:
+        if self.obstacles is None:
+            self.obstacles = make_obstacles(self.width, self.height, storage, len(keys))
+        self.obstacles.add_cells(keys)
+
+    def load_obstacles(self, path: str, storage: str = 'auto') -> None:
+        """
+        Block the cells listed in an obstacle file.
+
+        Text files hold one cell 'x y' or inclusive rectangle 'x0 y0 x1 y1'
+        per line ('#' starts a comment); .npy files hold an array of (x, y)
+        rows and are loaded with NumPy.
+
+        Raises:
+            ValueError: If the file is malformed or a cell is outside the field.
+        """
+        if path.endswith('.npy'):
+            import numpy as np
+            self._block(self._array_keys(np.load(path)), storage)
+            return
+        with open(path, 'r') as file:
+            rectangles = parse_obstacles(file)
+        height = self.height
+        keys = []
+        for x0, y0, x1, y1 in rectangles:
+            if not (self.within_bounds(x0, y0) and self.within_bounds(x1, y1)):
+                raise ValueError(f"Obstacle ({x0},{y0})-({x1},{y1}) is out of bounds")
+            for x in range(x0, x1 + 1):
+                keys.extend(range(x * height + y0, x * height + y1 + 1))
+        self._block(keys, storage)
@@ -0,0 +1,308 @@
+# simulation/grammar.py
+"""
+Compact command syntax with repetition and grouping.
+
+    F1000        a command repeated 1000 times
+    (FFR)x500    a group repeated 500 times; the x is optional
+    ((FL)2 R)x9  groups nest
+    FFRFFL       plain commands, as in an ordinary command string
+
+parse_program turns such a string into a Program, a tree of runs and
+repeated groups that is never expanded: len(program) is the number of
+commands it stands for and program[i] the i-th of them, found by walking
+down the tree in O(depth * log(width)). A Program can therefore be used
+wherever a command string is indexed with a command cursor (Car.commands,
+CompactCar.commands), at the memory cost of the tree only. The NumPy
+engines read it as a list of repeated patterns instead (Program.blocks,
+see programs.py).
+"""
+import re
+from bisect import bisect_right
+from operator import index as as_index
+from typing import Iterator, List, Tuple
+
+from car_simulation.config.config import Config
+
+# Deletes every valid command: a command string is valid if nothing is left
+COMMAND_FILTER = str.maketrans('', '', ''.join(Config.CAR_COMMANDS))
+# Marks a string as using the compact syntax
+_COMPACT = re.compile(r'[(\d]').search
+# Relative memory cost of a program block, in expanded commands (see Group.blocks)
+BLOCK_COST = 48
+
+
+class Run:
+    """
+        A literal command string repeated count times.
+
+        Attributes:
+            text : str    -> The commands (at least one).
+            count : int   -> Number of repetitions (at least one).
+            length : int  -> Number of commands in the run.
+    """
+    __slots__ = ('text', 'count', 'length')
+
+    def __init__(self, text: str, count: int = 1):
+        self.text = text
+        self.count = count
+        self.length = len(text) * count
+
+    def command(self, index: int) -> str:
+        return self.text[index % len(self.text)]
+
+    def __iter__(self) -> Iterator[str]:
+        for _ in range(self.count):
+            yield from self.text
+
+    def blocks(self) -> List[Tuple[str, int]]:
+        return [(self.text, self.length)]
+
+    def expand(self) -> str:
+        return self.text * self.count
+
+    def source(self) -> str:
+        if self.count == 1:
+            return self.text
+        if len(self.text) == 1:
+            return f"{self.text}{self.count}"
+        return f"({self.text})x{self.count}"
+
+    def key(self) -> tuple:
+        return self.text, self.count
+
+
+class Group:
+    """
+        A sequence of runs and groups repeated count times.
+
+        Attributes:
+            children : tuple -> The runs and groups of one repetition.
+            count : int      -> Number of repetitions.
+            body : int       -> Number of commands in one repetition.
+            starts : list    -> Index of the first command of each child within a repetition.
+            length : int     -> Number of commands in the group.
+    """
+    __slots__ = ('children', 'count', 'body', 'starts', 'length')
+
+    def __init__(self, children, count: int = 1):
+        self.children = tuple(children)
+        self.count = count
+        self.starts = []
+        body = 0
+        for child in self.children:
+            self.starts.append(body)
+            body += child.length
+        self.body = body
+        self.length = body * count
+
+    def command(self, index: int) -> str:
+        index %= self.body
+        child = bisect_right(self.starts, index) - 1
+        return self.children[child].command(index - self.starts[child])
+
+    def __iter__(self) -> Iterator[str]:
+        for _ in range(self.count):
+            for child in self.children:
+                yield from child
+
+    def blocks(self) -> List[Tuple[str, int]]:
+        """
+        The group as (pattern, length) blocks: length commands repeating pattern.
+
+        A repeated group is one block holding its expanded body, unless the
+        body is long enough that repeating the blocks of its children is cheaper.
+        """
+        inner = [block for child in self.children for block in child.blocks()]
+        if self.count == 1:
+            return inner
+        if self.body <= self.count * len(inner) * BLOCK_COST:
+            return [(self.expand_body(), self.length)]
+        return inner * self.count
+
+    def expand_body(self) -> str:
+        return ''.join(child.expand() for child in self.children)
+
+    def expand(self) -> str:
+        return self.expand_body() * self.count
+
+    def source(self) -> str:
+        body = ''.join(child.source() for child in self.children)
+        return body if self.count == 1 else f"({body})x{self.count}"
+
+    def key(self) -> tuple:
+        return tuple(child.key() for child in self.children), self.count
+
+
+class Program:
+    """
+        A parsed compact command string (see parse_program), used like a
+        command string without being expanded. Programs compare equal when
+        their trees do, so "F3" and "FFF" differ.
+
+        Attributes:
+            root : Group  -> The top level of the program tree.
+    """
+    __slots__ = ('root', '_hash')
+
+    def __init__(self, root: Group):
+        self.root = root
+        self._hash = None
+
+    def __len__(self) -> int:
+        return self.root.length
+
+    def __getitem__(self, index: int) -> str:
+        index = as_index(index)
+        length = self.root.length
+        if index < 0:
+            index += length
+        if not 0 <= index < length:
+            raise IndexError("Program index out of range")
+        return self.root.command(index)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.root)
+
+    def blocks(self) -> List[Tuple[str, int]]:
+        """The program as (pattern, length) blocks, see Group.blocks."""
+        return self.root.blocks()
+
+    def expand(self) -> str:
+        """Return the full command string."""
+        return self.root.expand()
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, Program):
+            return self.root.key() == other.root.key()
+        return NotImplemented
+
+    def __hash__(self) -> int:
+        if self._hash is None:
+            self._hash = hash(self.root.key())
+        return self._hash
+
+    def __str__(self) -> str:
+        return self.root.source()
+
+    def __repr__(self) -> str:
+        return f"Program({str(self)!r})"
+
+
+def _sequence(nodes: list) -> list:
+    """Flatten and merge a list of nodes: neighbouring single runs become one."""
+    merged = []
+    for node in nodes:
+        if not node.length:
+            continue
+        if isinstance(node, Group) and node.count == 1:
+            items = node.children
+        else:
+            items = (node,)
+        for item in items:
+            last = merged[-1] if merged else None
+            if (isinstance(item, Run) and item.count == 1 and isinstance(last, Run)
+                    and last.count == 1):
+                merged[-1] = Run(last.text + item.text)
+            else:
+                merged.append(item)
+    return merged
+
+
+def _repeat(nodes: list, count: int):
+    """A group of nodes repeated count times, as the smallest equivalent node."""
+    nodes = _sequence(nodes)
+    if count == 1 or not nodes:
+        return Group(nodes)
+    if len(nodes) == 1:
+        node = nodes[0]
+        if isinstance(node, Run):
+            return Run(node.text, node.count * count)
+        return Group(node.children, node.count * count)
+    return Group(nodes, count)
+
+
+def _skip_space(text: str, index: int) -> int:
+    """Return the index of the first non-whitespace character from index on."""
+    end = len(text)
+    while index < end and text[index].isspace():
+        index += 1
+    return index
+
+
+def parse_program(text: str) -> Program:
+    """
+    Parse a compact command string into a Program.
+
+    A command or a parenthesised group may be followed by a repeat count,
+    optionally preceded by 'x'. Whitespace is ignored, also between a
+    command or group and its count ("F 3" is "F3").
+
+    Raises:
+        ValueError: With the position of the first error.
+    """
+    commands = Config.CAR_COMMANDS
+    stack: List[list] = [[]]
+    index = 0
+    end = len(text)
+    while index < end:
+        char = text[index]
+        if char.isspace():
+            index += 1
+            continue
+        if char in commands:
+            # A span of plain commands; a count applies to its last command only
+            start = index
+            while index < end and text[index] in commands:
+                index += 1
+            following = _skip_space(text, index)
+            if following < end and (text[following] in 'xX' or text[following].isdigit()):
+                index -= 1
+            if index > start:
+                stack[-1].append(Run(text[start:index]))
+                continue
+            node = Run(char)
+            index += 1
+        elif char == '(':
+            stack.append([])
+            index += 1
+            continue
+        elif char == ')':
+            if len(stack) == 1:
+                raise ValueError(f"Unmatched ')' at position {index}")
+            node = stack.pop()
+            index += 1
+        else:
+            raise ValueError(f"Invalid command {char!r} at position {index}")
+
+        count = 1
+        start = index = _skip_space(text, index)
+        if index < end and text[index] in 'xX':
+            index = _skip_space(text, index + 1)
+        digits = index
+        while index < end and text[index].isdigit():
+            index += 1
+        if index > digits:
+            count = int(text[digits:index])
+        elif index > start:
+            raise ValueError(f"Expected a repeat count at position {index}")
+        if isinstance(node, list):
+            node = _repeat(node, count)
+        elif count != 1:
+            node = Run(node.text, count)
+        stack[-1].append(node)
+    if len(stack) > 1:
+        raise ValueError(f"Unclosed '(' at the end of {text!r}")
+    return Program(_repeat(stack[0], 1))
+
+
+def read_commands(commands):
+    """
+    Return the Program described by a string using repeat counts or groups,
+    and anything else (plain command strings included) unchanged.
+
+    Raises:
+        ValueError: If the compact syntax is malformed.
+    """
+    if isinstance(commands, str) and _COMPACT(commands):
+        return parse_program(commands)
+    return commands
@@ -0,0 +1,20 @@
+# simulation/headings.py
+"""
+Integer heading tables shared by the stepping engines.
+
+Headings are numbered clockwise from north so that a right turn is +1 and a
+left turn is -1 (mod 4):
+    0 -> 'N', 1 -> 'E', 2 -> 'S', 3 -> 'W'
+"""
+from car_simulation.config.config import Config
+
+HEADINGS = tuple(Config.CAR_DIRECTIONS)
+HEADING_INDEX = {direction: index for index, direction in enumerate(HEADINGS)}
+
+# Unit move for each heading
+DELTA_X = (0, 1, 0, -1)
+DELTA_Y = (1, 0, -1, 0)
+
+# Heading reached after a turn, indexed by the current heading
+TURN_LEFT = (3, 0, 1, 2)
+TURN_RIGHT = (1, 2, 3, 0)
@@ -0,0 +1,477 @@
+# simulation/history.py
+"""
+Snapshots of a run, used to bring its results up to date incrementally
+after cars are added or their commands change (Simulation.rerun).
+
+A History keeps the state of every car (cell, heading, command index and
+active flag) every `interval` steps of a run, and at its end. When cars
+change afterwards, only what the changes can affect is recomputed:
+
+1. Each changed car (commands edited with Car.set_commands, or added after
+   the run) is driven on its own from the last snapshot before its commands
+   diverge, one snapshot interval at a time, as long as it provably cannot
+   meet another car: cars move at most one cell per step, so a car that was
+   at cell p at snapshots b0 and b1 stays within b1 - b0 of p in between.
+   The run is restored at the start of the first interval where a meeting
+   is possible (or where an edited car used to collide).
+2. Differences then spread from a changed car at cell o and step t0 only
+   through cars meeting, so by step s they stay within s - t0 cells of o.
+   Cars whose snapshots keep them outside that cone are left as they are;
+   so are the cars that only ever collided with such cars.
+3. The other cars are re-simulated from the restored step on their own,
+   and their collision records merged with the records that still hold.
+
+The result is exactly that of a new run from the first step. Edits late in
+a long run, or cars that stay far from the others, cost a small fraction
+of one.
+"""
+import os
+from array import array
+from bisect import bisect_right
+from collections import deque
+from typing import List, NamedTuple
+
+from .car import Car
+from .collisions import Collision
+from .events import NullSink
+from .headings import HEADINGS, DELTA_X, DELTA_Y, TURN_LEFT, TURN_RIGHT
+
+# Default number of steps between snapshots
+SNAPSHOT_INTERVAL = 64
+# Extra cells allowed around the distance bounds: cars swap with a neighbour
+MARGIN = 2
+
+
+class Snapshot(NamedTuple):
+    """
+        The state of every car at the start of a step.
+
+        Attributes:
+            step : int       -> The step.
+            x, y : array     -> Cell of each car ('q').
+            heading : array  -> Heading index of each car ('b', see headings.py).
+            cursor : array   -> Index of each car's next command ('q').
+            active : array   -> 0 once a car has collided ('b').
+    """
+    step: int
+    x: array
+    y: array
+    heading: array
+    cursor: array
+    active: array
+
+    def car(self, car_id: int) -> tuple:
+        """Return x, y, heading, cursor and active of one car."""
+        return (self.x[car_id], self.y[car_id], self.heading[car_id], self.cursor[car_id],
+                self.active[car_id])
+
+    def copy(self, step: int) -> 'Snapshot':
+        """Return a copy of the snapshot, labelled with the given step."""
+        return Snapshot(step, *(array(column.typecode, column) for column in self[1:]))
+
+    def set(self, car_id: int, state: tuple) -> None:
+        """Set the state of one car, appending it if car_id is the next id."""
+        for column, value in zip(self[1:], state):
+            if car_id == len(column):
+                column.append(value)
+            else:
+                column[car_id] = value
+
+
+class Rerun(NamedTuple):
+    """
+        What Simulation.rerun recomputed.
+
+        Attributes:
+            start : int   -> The step the re-simulation started from.
+            cars : int    -> Cars re-simulated from that step.
+            reused : int  -> Cars whose results were kept.
+    """
+    start: int
+    cars: int
+    reused: int
+
+
+class History:
+    """
+        Periodic snapshots of a simulation's run, fed by Simulation while it
+        steps (see Simulation(history=...)).
+
+        Attributes:
+            interval : int    -> Steps between snapshots.
+            origin : int      -> First step of the run; snapshots are taken at
+                                 origin + k * interval, and at the end of the run.
+            snapshots : list  -> The snapshots, in step order.
+            commands : list   -> The commands of each car the snapshots hold.
+            complete : bool   -> True once the run reached its end.
+    """
+
+    def __init__(self, interval: int = SNAPSHOT_INTERVAL, origin: int = None):
+        if interval < 1:
+            raise ValueError("The snapshot interval must be at least one step")
+        self.interval = interval
+        self.origin = origin
+        self.snapshots: List[Snapshot] = []
+        self.commands = []
+        self.complete = False
+
+    @property
+    def running(self) -> bool:
+        """True while a run is being recorded."""
+        return bool(self.snapshots) and not self.complete
+
+    @property
+    def end(self) -> int:
+        """The step of the last snapshot."""
+        return self.snapshots[-1].step
+
+    def begin(self, snapshot: Snapshot, cars) -> None:
+        """Start recording a run from its first snapshot."""
+        if self.origin is None:
+            self.origin = snapshot.step
+        self.snapshots = [snapshot]
+        self.commands = [car.commands for car in cars]
+        self.complete = False
+
+    def due(self, step: int) -> bool:
+        """True if a snapshot is taken at the start of the given step."""
+        return (step - self.origin) % self.interval == 0
+
+    def add(self, snapshot: Snapshot) -> None:
+        self.snapshots.append(snapshot)
+
+    def finish(self, snapshot: Snapshot) -> None:
+        """Record the end of the run."""
+        if snapshot.step != self.end:
+            self.snapshots.append(snapshot)
+        self.complete = True
+
+    def clear(self) -> None:
+        self.origin = None
+        self.snapshots = []
+        self.commands = []
+        self.complete = False
+
+
+def snapshot_cars(step: int, cars, headings: dict) -> Snapshot:
+    """Take a snapshot of Car objects; headings maps directions to heading indexes."""
+    return Snapshot(step, array('q', [car.x for car in cars]), array('q', [car.y for car in cars]),
+                    array('b', [headings[car.direction] for car in cars]),
+                    array('q', [car.command_index for car in cars]),
+                    array('b', [car.active for car in cars]))
+
+
+class _Solo:
+    """A changed car driven on its own, while it cannot meet any other car."""
+
+    def __init__(self, state: tuple, commands):
+        self.x, self.y, self.heading, self.cursor, self.active = state
+        self.commands = commands
+        self.length = len(commands)
+
+    def state(self) -> tuple:
+        return self.x, self.y, self.heading, self.cursor, self.active
+
+    def drive(self, field, steps: int) -> list:
+        """Run the given number of steps, returning the car's cell after each."""
+        x, y, heading, cursor = self.x, self.y, self.heading, self.cursor
+        commands = self.commands
+        cells = []
+        for _ in range(min(steps, self.length - cursor) if self.active else 0):
+            command = commands[cursor]
+            cursor += 1
+            if command == 'F':
+                new_x, new_y = x + DELTA_X[heading], y + DELTA_Y[heading]
+                if field.can_enter(new_x, new_y):
+                    x, y = new_x, new_y
+            elif command == 'L':
+                heading = TURN_LEFT[heading]
+            elif command == 'R':
+                heading = TURN_RIGHT[heading]
+            cells.append((x, y))
+        cells.extend([(x, y)] * (steps - len(cells)))
+        self.x, self.y, self.heading, self.cursor = x, y, heading, cursor
+        return cells
+
+
+def _divergence(old, new) -> int:
+    """Return the index of the first command that differs between two command lists."""
+    if isinstance(old, str) and isinstance(new, str):
+        return len(os.path.commonprefix((old, new)))
+    for index, (before, after) in enumerate(zip(old, new)):
+        if before != after:
+            return index
+    return min(len(old), len(new))
+
+
+def _meet(paths: list) -> bool:
+    """True if two cars, given their cell at each step, meet or swap cells."""
+    for step in range(len(paths[0])):
+        seen = {}
+        for car, path in enumerate(paths):
+            if seen.setdefault(path[step], car) != car:
+                return True
+        if step:
+            moves = {(path[step - 1], path[step]) for path in paths if path[step - 1] != path[step]}
+            if any((after, before) in moves for before, after in moves):
+                return True
+    return False
+
+
+def _reachable(path: list, before: Snapshot, after: Snapshot, moving: int, car_ids) -> bool:
+    """
+    True if one of the given cars could meet a car following path (its cell
+    at the snapshot before, then after each step up to the snapshot after):
+    the other cars move at most one cell a step, and only during the first
+    `moving` steps.
+    """
+    x0, x1, y0, y1 = _bounds(path)
+    reach = moving + MARGIN
+    for car_id in car_ids:
+        xa, ya, xb, yb = before.x[car_id], before.y[car_id], after.x[car_id], after.y[car_id]
+        if (max(x0 - xa, 0, xa - x1) + max(y0 - ya, 0, ya - y1) > reach
+                or max(x0 - xb, 0, xb - x1) + max(y0 - yb, 0, yb - y1) > reach):
+            continue
+        for step, (x, y) in enumerate(path):
+            if (abs(x - xa) + abs(y - ya) <= min(step, moving) + MARGIN
+                    and abs(x - xb) + abs(y - yb) <= max(moving - step, 0) + MARGIN):
+                return True
+    return False
+
+
+def _bounds(cells: list) -> tuple:
+    xs = [x for x, _ in cells]
+    ys = [y for _, y in cells]
+    return min(xs), max(xs), min(ys), max(ys)
+
+
+def rerun(simulation) -> Rerun:
+    """Bring the results of a simulation up to date after its cars changed; see Simulation.rerun."""
+    history = simulation.history
+    if history is None or not history.complete:
+        raise ValueError("rerun needs a completed run with a history: create the Simulation with history=...")
+    cars = simulation.cars
+    log = simulation.collision_log
+    snapshots = history.snapshots
+    first, last = snapshots[0], snapshots[-1]
+    known = len(history.commands)
+    died = {}
+    for record in log.records():
+        for car_id in record.car_ids:
+            died[car_id] = record
+
+    # The changed cars, with the step from which their commands differ
+    diverges = {}
+    for car_id in range(known):
+        old, new = history.commands[car_id], cars[car_id].commands
+        if new is old or not first.active[car_id]:
+            continue
+        index = _divergence(old, new)
+        if index == len(old) == len(new):
+            continue
+        step = first.step + max(index - first.cursor[car_id], 0)
+        if car_id in died and died[car_id].step < step:
+            # It collided before its new commands
+            continue
+        diverges[car_id] = step
+    for car_id in range(known, len(cars)):
+        diverges[car_id] = first.step
+    history.commands = [car.commands for car in cars]
+    if not diverges:
+        return Rerun(last.step, 0, len(cars))
+
+    horizon = first.step + max(len(car.commands) - (first.cursor[car_id] if car_id < known else car.command_index)
+                               for car_id, car in enumerate(cars))
+    # Snapshot steps, then further intervals where the cars that ran out of
+    # commands by the end of the run stand still
+    boundaries = [snapshot.step for snapshot in snapshots]
+    while boundaries[-1] < horizon:
+        boundaries.append(boundaries[-1] + history.interval)
+
+    def at(index: int) -> Snapshot:
+        return snapshots[min(index, len(snapshots) - 1)]
+
+    states, start = _drive_alone(simulation, diverges, boundaries, at, died)
+    restored = boundaries[start]
+    base = at(start)
+    driven = states[restored]
+
+    # Cones of the differences: from every changed car at the restored step,
+    # and from the collisions edited cars no longer have
+    sources = []
+    for car_id in diverges:
+        state = driven[car_id] if car_id in driven else base.car(car_id)
+        sources.append((state[0], state[1], restored))
+        record = died.get(car_id)
+        if record is not None and car_id < known:
+            sources.append((record.x, record.y, record.step))
+    resimulated = set(diverges)
+    later = [snapshot for snapshot in snapshots if snapshot.step >= restored] or [last]
+    end = max(horizon, last.step)
+    for car_id in range(known):
+        if car_id not in resimulated and base.active[car_id] and _in_cones(car_id, sources, later, end):
+            resimulated.add(car_id)
+    _close(resimulated, log, restored)
+
+    rows = sorted(resimulated)
+    sub = _resimulate(simulation, rows, restored, driven, base)
+    _merge_snapshots(history, sub.history, states, rows, restored, len(cars))
+    _merge_records(log, sub.collision_log, rows, restored)
+    return Rerun(restored, len(rows), len(cars) - len(rows))
+
+
+def _drive_alone(simulation, diverges: dict, boundaries: list, at, died: dict):
+    """
+    Drive the changed cars alone from the snapshot before their divergence
+    until an interval where one of them could meet another car.
+
+    Returns the state of the driven cars at each boundary they were driven
+    through (step -> {id: state}) and the index of the boundary to restore
+    the run at.
+    """
+    cars = simulation.cars
+    field = simulation.field
+    known = len(at(0).x)
+    end = at(len(boundaries)).step
+    starts = {car_id: bisect_right(boundaries, step) - 1 for car_id, step in diverges.items()}
+    solo = {}
+    states = {}
+    for index in range(min(starts.values()), len(boundaries)):
+        for car_id, start in starts.items():
+            if start != index:
+                continue
+            if car_id < known:
+                state = at(index).car(car_id)
+            else:
+                car = cars[car_id]
+                state = (car.x, car.y, HEADINGS.index(car.direction), car.command_index, car.active)
+            solo[car_id] = _Solo(state, cars[car_id].commands)
+        states[boundaries[index]] = {car_id: car.state() for car_id, car in solo.items()}
+        if index == len(boundaries) - 1:
+            break
+        step, following = boundaries[index], boundaries[index + 1]
+        # The cell of each driven car at the boundary, then after each step
+        paths = {car_id: [states[step][car_id][:2]] + car.drive(field, following - step)
+                 for car_id, car in solo.items()}
+        if len(paths) > 1 and _meet(list(paths.values())):
+            return states, index
+        # Other cars move at most one cell per step, and not at all after
+        # the end of the run
+        before, after = at(index), at(index + 1)
+        moving = max(0, min(following, end) - step)
+        others = [car_id for car_id in range(known) if car_id not in solo and before.active[car_id]]
+        for car_id, path in paths.items():
+            record = died.get(car_id)
+            if car_id < known and record is not None and record.step < following:
+                return states, index
+            if _reachable(path, before, after, moving, others):
+                return states, index
+    return states, len(boundaries) - 1
+
+
+def _in_cones(car_id: int, sources: list, snapshots: list, end: int) -> bool:
+    """
+    True unless the snapshots keep the car outside the cone of every source
+    (x, y, start): the cells within s - start (plus MARGIN) of (x, y) at each
+    step s. A car is within b - s of its cell at snapshot b at any step s
+    before it, and stands still after the last snapshot until step end.
+    """
+    last = snapshots[-1]
+    for x, y, start in sources:
+        for snapshot in snapshots:
+            limit = max(snapshot.step, end) if snapshot is last else snapshot.step
+            distance = abs(snapshot.x[car_id] - x) + abs(snapshot.y[car_id] - y)
+            if limit >= start and distance <= limit - start + MARGIN:
+                return True
+            if not snapshot.active[car_id]:
+                break
+    return False
+
+
+def _close(car_ids: set, log, start: int) -> None:
+    """Add to car_ids every car that collided, from step start on, with one of them."""
+    records = {}
+    for record in log.records():
+        if record.step >= start:
+            for car_id in record.car_ids:
+                records.setdefault(car_id, []).append(record.car_ids)
+    queue = deque(car_ids)
+    while queue:
+        for others in records.pop(queue.popleft(), ()):
+            for other in others:
+                if other not in car_ids:
+                    car_ids.add(other)
+                    queue.append(other)
+
+
+def _resimulate(simulation, car_ids: list, start: int, driven: dict, base: Snapshot):
+    """Run the given cars from their state at step start in a quiet simulation of their own."""
+    history = simulation.history
+    sub = type(simulation)(simulation.field, engine=simulation.engine.name, verbose=False,
+                           workers=simulation.workers, swept=simulation.swept,
+                           history=History(history.interval, history.origin))
+    events = NullSink()
+    for car_id in car_ids:
+        original = simulation.cars[car_id]
+        x, y, heading, cursor, active = driven[car_id] if car_id in driven else base.car(car_id)
+        car = Car.trusted(original.name, x, y, HEADINGS[heading], original.commands)
+        car.command_index = cursor
+        car.active = bool(active)
+        car.events = events
+        sub.car_ids[car.name] = len(sub.cars)
+        sub.cars.append(car)
+    sub.step = start
+    sub._run()
+    for car_id, car in zip(car_ids, sub.cars):
+        original = simulation.cars[car_id]
+        original.x, original.y, original.direction = car.x, car.y, car.direction
+        original.command_index, original.active = car.command_index, car.active
+    return sub
+
+
+def _merge_snapshots(history: History, sub: History, states: dict, car_ids: list, start: int,
+                     count: int) -> None:
+    """Rebuild the snapshots of the run from the kept cars and the re-simulated ones."""
+    old = history.snapshots
+    merged = [snapshot for snapshot in old if snapshot.step < start]
+    # The changed cars driven alone before the restored step
+    for snapshot in merged:
+        driven = states.get(snapshot.step, {})
+        for car_id in sorted(driven):
+            snapshot.set(car_id, driven[car_id])
+    old_steps = {snapshot.step: snapshot for snapshot in old if snapshot.step >= start}
+    new_steps = {snapshot.step: snapshot for snapshot in sub.snapshots}
+    old_end, new_end = old[-1].step, sub.end
+    # Steps where both the kept and the re-simulated cars' states are known
+    for step in sorted(set(old_steps) | set(new_steps)):
+        if not ((step in old_steps or step >= old_end) and (step in new_steps or step >= new_end)):
+            continue
+        snapshot = old_steps.get(step, old[-1]).copy(step)
+        for column in snapshot[1:]:
+            column.extend([0] * (count - len(column)))
+        resimulated = new_steps.get(step, sub.snapshots[-1])
+        for row, car_id in enumerate(car_ids):
+            snapshot.set(car_id, resimulated.car(row))
+        merged.append(snapshot)
+    history.snapshots = merged
+
+
+def _merge_records(log, sub, car_ids: list, start: int) -> None:
+    """
+    Replace the collision records of the re-simulated cars, from step start
+    on, with those of the re-simulation (whose car ids are rows of car_ids).
+    """
+    resimulated = set(car_ids)
+    before, later = [], []
+    for index, record in enumerate(log.records()):
+        if record.step < start:
+            before.append((record, log.swaps[index]))
+        elif resimulated.isdisjoint(record.car_ids):
+            later.append((record, log.swaps[index]))
+    for index, (step, x, y, rows) in enumerate(sub.records()):
+        later.append((Collision(step, x, y, tuple(car_ids[row] for row in rows)), sub.swaps[index]))
+    # In the order of one run: by step, pileups by their first newcomer, then swaps
+    later.sort(key=lambda item: (item[0].step, item[1], item[0].car_ids[0 if item[1] else 1]))
+    log.clear()
+    for record, swap in before + later:
+        log.add(*record, swap)
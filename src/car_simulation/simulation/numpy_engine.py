@@ -0,0 +1,388 @@
+# simulation/numpy_engine.py
+
+from array import array
+from typing import NamedTuple
+
+import numpy as np
+
+from .engine import Engine
+from .headings import HEADINGS, HEADING_INDEX, DELTA_X, DELTA_Y
+from .history import Snapshot
+from .occupancy import OccupancyIndex
+from .grammar import Program
+from .programs import compile_programs
+
+COMMAND_LEFT = ord('L')
+COMMAND_RIGHT = ord('R')
+COMMAND_FORWARD = ord('F')
+
+# Fields with more cells than this use a hash index instead of a dense grid
+DENSE_GRID_LIMIT = 1 << 24
+
+
+class Moves(NamedTuple):
+    """
+        The result of NumpyEngine.execute.
+
+        Attributes:
+            car_ids : ndarray    -> Ids of the cars that changed cell.
+            old_cells : ndarray  -> The cells they left.
+            stepped : ndarray    -> Ids of the cars that executed a command during the step.
+    """
+    car_ids: np.ndarray
+    old_cells: np.ndarray
+    stepped: np.ndarray
+
+
+class DenseOccupancy:
+    """Occupancy index over a bounded field: one car id (or -1) per cell."""
+
+    def __init__(self, cell_count: int):
+        self.grid = np.full(cell_count, -1, dtype=np.int64)
+
+    def lookup(self, cells: np.ndarray) -> np.ndarray:
+        return self.grid[cells]
+
+    def assign(self, cells: np.ndarray, car_ids: np.ndarray) -> None:
+        self.grid[cells] = car_ids
+
+    def release(self, cells: np.ndarray, car_ids: np.ndarray) -> None:
+        held = self.grid[cells] == car_ids
+        self.grid[cells[held]] = -1
+
+
+class HashOccupancy:
+    """Occupancy index for fields too large for a dense grid."""
+
+    def __init__(self):
+        self.index = OccupancyIndex()
+
+    def lookup(self, cells: np.ndarray) -> np.ndarray:
+        get = self.index.cells.get
+        return np.fromiter((get(cell, -1) for cell in cells.tolist()), dtype=np.int64, count=len(cells))
+
+    def assign(self, cells: np.ndarray, car_ids: np.ndarray) -> None:
+        self.index.cells.update(zip(cells.tolist(), car_ids.tolist()))
+
+    def release(self, cells: np.ndarray, car_ids: np.ndarray) -> None:
+        release = self.index.release
+        for cell, car_id in zip(cells.tolist(), car_ids.tolist()):
+            release(cell, car_id)
+
+
+class NumpyEngine(Engine):
+    """
+        Vectorised engine that steps the whole fleet with batched array operations.
+
+        Car state is held as struct-of-arrays columns indexed by the car's
+        position in Simulation.cars. Commands are stored once per distinct
+        command string, as the pattern it repeats (see programs.py), in one
+        byte buffer addressed through per-block offsets and periods, so
+        fetching the command of every car for a step is a single gather.
+        Compact programs (see grammar.py) are several blocks, found with one
+        searchsorted over the block keys; they are never expanded.
+
+        Boundary handling matches Field.can_enter: a forward move leaving the
+        field or into an obstacle is dropped and the car keeps its heading and
+        position.
+        Collision handling matches Simulation.check_collision: after each step
+        active cars sharing a cell are deactivated, every newcomer being paired
+        with the first car (in list order) of that cell. After the first step
+        the engine keeps a persistent occupancy index (a dense grid, or a hash
+        for very large fields) and only checks the cells of the cars that moved.
+        With Simulation.swept, cars that swapped cells are found by sorting
+        the edges the movers crossed. Only the pending cars (active, with
+        commands left) are stepped; a cursor never passes the end of its
+        car's commands.
+
+        Attributes:
+            x, y : ndarray      -> Car coordinates.
+            heading : ndarray   -> Heading index into HEADINGS.
+            cursor : ndarray    -> Index of the next command of each car, at most length.
+            active : ndarray    -> False once a car has collided.
+            pending : ndarray   -> Ids of the active cars with commands left.
+            program : ndarray   -> All command patterns, concatenated.
+            offset, period, start, key : ndarray -> Pattern start and length, first
+                                   command and search key of each block (see programs.Programs).
+            block : ndarray     -> First block of each car's program.
+            length : ndarray    -> Number of commands of each car.
+            occupancy           -> Cell -> car id index, built on the first step.
+            obstacles           -> The field's obstacles (keyed by x * height + y), or None.
+    """
+    name = 'numpy'
+
+    DELTA_X = np.array(DELTA_X, dtype=np.int64)
+    DELTA_Y = np.array(DELTA_Y, dtype=np.int64)
+
+    def __init__(self, simulation):
+        super().__init__(simulation)
+        cars = simulation.cars
+        field = simulation.field
+        self.width = field.width
+        self.height = field.height
+        self.obstacles = field.obstacles
+        self.swept = getattr(simulation, 'swept', False)
+        count = len(cars)
+
+        self.x = np.fromiter((car.x for car in cars), dtype=np.int64, count=count)
+        self.y = np.fromiter((car.y for car in cars), dtype=np.int64, count=count)
+        try:
+            self.heading = np.fromiter((HEADING_INDEX[car.direction] for car in cars),
+                                       dtype=np.int8, count=count)
+        except KeyError as e:
+            raise ValueError(f"Invalid direction {e} for the numpy engine") from e
+        self.active = np.fromiter((car.active for car in cars), dtype=bool, count=count)
+
+        commands = [car.commands if isinstance(car.commands, (str, Program)) else ''.join(car.commands)
+                    for car in cars]
+        (self.program, self.offset, self.period, self.start, self.key,
+         self.block, self.length) = compile_programs(commands)
+        cursor = np.fromiter((car.command_index for car in cars), dtype=np.int64, count=count)
+        self.cursor = np.minimum(cursor, self.length)
+        self.pending = self._pending(np.arange(count))
+        self.occupancy = None
+
+    def execute(self, step: int) -> Moves:
+        pending = self.pending
+        moved, old_cells = self._execute(pending)
+        self.cursor[pending] += 1
+        return Moves(moved, old_cells, pending)
+
+    def collide(self, step: int, moves: Moves) -> None:
+        if self.occupancy is None:
+            self._collide_all(step, np.flatnonzero(self.active))
+        else:
+            self._collide_moved(step, moves.car_ids, moves.old_cells)
+        if self.swept:
+            self._collide_swaps(step, moves.car_ids)
+        self.pending = self._pending(self.pending)
+
+    def done(self) -> bool:
+        return not len(self.pending)
+
+    def positions(self, moves: Moves) -> list:
+        moved = moves.car_ids
+        return list(zip(moved.tolist(), self.x[moved].tolist(), self.y[moved].tolist()))
+
+    def active_count(self) -> int:
+        return int(np.count_nonzero(self.active))
+
+    def state(self) -> tuple:
+        return self.x, self.y, self.heading, self.active
+
+    def snapshot(self, step: int) -> Snapshot:
+        columns = []
+        for column, dtype in ((self.x, np.int64), (self.y, np.int64), (self.heading, np.int8),
+                              (self.cursor, np.int64), (self.active, np.int8)):
+            values = array('q' if dtype is np.int64 else 'b')
+            values.frombytes(column.astype(dtype).tobytes())
+            columns.append(values)
+        return Snapshot(step, *columns)
+
+    def cells(self, car_ids: np.ndarray) -> np.ndarray:
+        """Return the cell key of each car."""
+        return self.x[car_ids] * self.height + self.y[car_ids]
+
+    def _pending(self, car_ids: np.ndarray) -> np.ndarray:
+        """Return the given cars that are active and have commands left."""
+        return car_ids[self.active[car_ids] & (self.cursor[car_ids] < self.length[car_ids])]
+
+    def _tick(self, car_ids: np.ndarray) -> None:
+        """Move the cursor of the given cars that have commands left to their next command."""
+        car_ids = car_ids[self.cursor[car_ids] < self.length[car_ids]]
+        self.cursor[car_ids] += 1
+
+    def _execute(self, active: np.ndarray):
+        """Execute the next command of the given cars.
+
+        Returns:
+            The ids of the cars that changed cell and the cells they left.
+        """
+        cursor = self.cursor[active]
+        pending = active[cursor < self.length[active]]
+        if not len(pending):
+            return pending, pending
+        block, position = self._locate(pending, self.cursor[pending])
+        command = self.program[self.offset[block] + position % self.period[block]]
+        heading = self.heading
+
+        left = pending[command == COMMAND_LEFT]
+        heading[left] = (heading[left] + 3) & 3
+        right = pending[command == COMMAND_RIGHT]
+        heading[right] = (heading[right] + 1) & 3
+
+        forward = pending[command == COMMAND_FORWARD]
+        new_x = self.x[forward] + self.DELTA_X[heading[forward]]
+        new_y = self.y[forward] + self.DELTA_Y[heading[forward]]
+        inside = (new_x >= 0) & (new_x < self.width) & (new_y >= 0) & (new_y < self.height)
+        if self.obstacles is not None:
+            inside[inside] = ~self.obstacles.blocked(new_x[inside] * self.height + new_y[inside])
+        moved = forward[inside]
+        if self.stats is not None:
+            self.stats.count('commands', len(pending))
+            self.stats.count('blocked_moves', len(forward) - len(moved))
+        old_cells = self.cells(moved)
+        self.x[moved] = new_x[inside]
+        self.y[moved] = new_y[inside]
+        return moved, old_cells
+
+    def _locate(self, cars: np.ndarray, position: np.ndarray):
+        """Return the block holding command position of each car, and the position within it."""
+        block = self.block[cars]
+        if not len(self.key):
+            return block, position
+        block = np.searchsorted(self.key, self.key[block] + position, side='right') - 1
+        return block, position - self.start[block]
+
+    def _collide_all(self, step: int, active: np.ndarray) -> None:
+        """Check every active car and build the occupancy index."""
+        self._resolve(step, active, self.cells(active))
+        self.occupancy = self._new_occupancy()
+        active = active[self.active[active]]
+        self.occupancy.assign(self.cells(active), active)
+
+    def _new_occupancy(self):
+        """Dense grid for bounded fields, hash index for very large ones."""
+        cell_count = self.width * self.height
+        if cell_count <= DENSE_GRID_LIMIT:
+            return DenseOccupancy(cell_count)
+        return HashOccupancy()
+
+    def _collide_moved(self, step: int, moved: np.ndarray, old_cells: np.ndarray) -> None:
+        """Check only the cells entered this step, updating the occupancy index."""
+        if not len(moved):
+            return
+        self.occupancy.release(old_cells, moved)
+        self._arrive(step, moved, self.cells(moved))
+
+    def _arrive(self, step: int, moved: np.ndarray, new_cells: np.ndarray) -> None:
+        """Enter cars into the cells they moved to, resolving contested cells."""
+        occupancy = self.occupancy
+        cells, first_index, inverse, counts = np.unique(
+            new_cells, return_index=True, return_inverse=True, return_counts=True)
+        resident = occupancy.lookup(cells)
+        contested = (counts > 1) | (resident >= 0)
+        free = ~contested
+        occupancy.assign(cells[free], moved[first_index[free]])
+        if free.all():
+            return
+        arrivals = contested[inverse.reshape(-1)]
+        stayed = contested & (resident >= 0)
+        car_ids = np.concatenate((moved[arrivals], resident[stayed]))
+        car_cells = np.concatenate((new_cells[arrivals], cells[stayed]))
+        occupancy.release(cells[stayed], resident[stayed])
+        self._resolve(step, car_ids, car_cells)
+
+    def _resolve(self, step: int, car_ids: np.ndarray, cells: np.ndarray) -> None:
+        """Deactivate the given cars that share a cell and record one collision per cell."""
+        if len(car_ids) < 2:
+            return
+        order = np.lexsort((car_ids, cells))
+        sorted_cells = cells[order]
+        sorted_ids = car_ids[order]
+        first = np.empty(len(order), dtype=bool)
+        first[0] = True
+        np.not_equal(sorted_cells[1:], sorted_cells[:-1], out=first[1:])
+        if first.all():
+            return
+        # Cells holding several cars: the first car of each (lowest id), then its newcomers
+        starts = np.flatnonzero(first)
+        sizes = np.diff(np.append(starts, len(order)))
+        self.active[sorted_ids[(sizes > 1)[np.cumsum(first) - 1]]] = False
+        shared = sizes > 1
+        starts = starts[shared]
+        ends = starts + sizes[shared]
+        # Reported in the order of their first newcomer
+        report = np.argsort(sorted_ids[starts + 1], kind='stable').tolist()
+        ids = sorted_ids.tolist()
+        x = self.x[sorted_ids[starts]].tolist()
+        y = self.y[sorted_ids[starts]].tolist()
+        starts = starts.tolist()
+        ends = ends.tolist()
+        for index in report:
+            self._record(step, x[index], y[index], ids[starts[index]:ends[index]])
+
+    def _edges(self, movers: np.ndarray):
+        """
+        The directed edge each mover crossed this step, as its (old, new) cell keys.
+
+        A mover came from the cell behind it, so the edge follows from its
+        position and heading.
+        """
+        x = self.x[movers]
+        y = self.y[movers]
+        heading = self.heading[movers]
+        new_cells = x * self.height + y
+        old_cells = (x - self.DELTA_X[heading]) * self.height + (y - self.DELTA_Y[heading])
+        return old_cells, new_cells
+
+    @staticmethod
+    def _swapped(old_cells: np.ndarray, new_cells: np.ndarray, car_ids: np.ndarray):
+        """
+        Find the movers that swapped cells: one crossed the reverse of the
+        other's edge. Cars that crossed the same edge the same way went
+        together, not through each other; as in Simulation.check_swaps,
+        only the highest id of them is matched.
+
+        Returns:
+            (first, second): positions in the edge arrays of the two movers of
+            each swap.
+        """
+        forward = old_cells < new_cells
+        low = np.where(forward, old_cells, new_cells)
+        high = np.where(forward, new_cells, old_cells)
+        order = np.lexsort((car_ids, forward, high, low))
+        low = low[order]
+        high = high[order]
+        forward = forward[order]
+        # The last (highest id) mover of each directed edge
+        last = np.ones(len(order), dtype=bool)
+        last[:-1] = (low[1:] != low[:-1]) | (high[1:] != high[:-1]) | (forward[1:] != forward[:-1])
+        order = order[last]
+        low = low[last]
+        high = high[last]
+        # An edge and its reverse are now neighbours
+        same = np.flatnonzero((low[1:] == low[:-1]) & (high[1:] == high[:-1]))
+        return order[same], order[same + 1]
+
+    def _collide_swaps(self, step: int, movers: np.ndarray) -> None:
+        """Deactivate and record the cars that swapped cells (Simulation.swept)."""
+        if len(movers) < 2:
+            return
+        first, second = self._swapped(*self._edges(movers), movers)
+        if not len(first):
+            return
+        first, second = movers[first], movers[second]
+        swapped = np.concatenate((first, second))
+        self.active[swapped] = False
+        self.occupancy.release(self.cells(swapped), swapped)
+        self._record_swaps(step, np.minimum(first, second), np.maximum(first, second))
+
+    def _record_swaps(self, step: int, first: np.ndarray, second: np.ndarray) -> None:
+        """Record swaps, given by the lower and higher car id, at the cell of the lower one."""
+        report = np.argsort(first)
+        first = first[report]
+        second = second[report]
+        for car_id, other, x, y in zip(first.tolist(), second.tolist(),
+                                       self.x[first].tolist(), self.y[first].tolist()):
+            self._record(step, x, y, [car_id, other], swap=True)
+
+    def _record(self, step: int, x: int, y: int, car_ids: list, swap: bool = False) -> None:
+        """Report a collision of the given cars (first car first) to the simulation.
+
+        Swaps (see _swaps) come after the pileups of their step.
+        """
+        self.simulation.record_pileup(step, x, y, car_ids, swap)
+
+    def finish(self) -> None:
+        x = self.x.tolist()
+        y = self.y.tolist()
+        heading = self.heading.tolist()
+        cursor = self.cursor.tolist()
+        active = self.active.tolist()
+        for i, car in enumerate(self.simulation.cars):
+            car.x = x[i]
+            car.y = y[i]
+            car.direction = HEADINGS[heading[i]]
+            car.command_index = cursor[i]
+            car.active = active[i]
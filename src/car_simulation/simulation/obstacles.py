@@ -0,0 +1,167 @@
+# simulation/obstacles.py
+"""
+Blocked cells of a Field.
+
+Two interchangeable stores, both keyed by cell = x * height + y (the cell
+key of the numpy engines):
+    BitGrid      one bit per cell in a bytearray, width * height / 8 bytes
+                 whatever the number of obstacles; for dense maps.
+    SparseCells  a set of cell keys, about 60 bytes per obstacle; for sparse
+                 maps on fields too large for a bit grid.
+Both answer is_blocked(x, y) in O(1) and blocked(cells) for a NumPy array
+of cell keys; make_obstacles picks one from the field size and the number
+of obstacles.
+
+Obstacle files are text, one blocked cell 'x y' or an inclusive rectangle
+'x0 y0 x1 y1' per line, '#' starting a comment, or .npy files holding an
+array of (x, y) rows.
+"""
+from typing import Iterable, List, Tuple
+
+# Bit grids up to this size (16 MiB, 2**27 cells) are always acceptable
+BIT_GRID_BYTES = 1 << 24
+# Approximate memory per obstacle of a SparseCells store
+SPARSE_BYTES_PER_CELL = 64
+STORAGES = ('auto', 'bits', 'sparse')
+
+
+class BitGrid:
+    """
+        Packed bit grid of blocked cells: bit (cell & 7) of byte cell >> 3.
+
+        Attributes:
+            width, height : int  -> Field size.
+            bits : bytearray     -> One bit per cell, set when the cell is blocked.
+    """
+    kind = 'bits'
+
+    def __init__(self, width: int, height: int):
+        self.width = width
+        self.height = height
+        self.bits = bytearray((width * height + 7) // 8)
+
+    def is_blocked(self, x: int, y: int) -> bool:
+        cell = x * self.height + y
+        return self.bits[cell >> 3] & (1 << (cell & 7)) != 0
+
+    def add_cells(self, cells) -> None:
+        """Block the given cell keys (an iterable of int or a NumPy array)."""
+        if hasattr(cells, 'dtype'):
+            import numpy as np
+            cells = np.asarray(cells, dtype=np.int64)
+            np.bitwise_or.at(np.frombuffer(self.bits, dtype=np.uint8), cells >> 3,
+                             (1 << (cells & 7)).astype(np.uint8))
+            return
+        bits = self.bits
+        for cell in cells:
+            bits[cell >> 3] |= 1 << (cell & 7)
+
+    def blocked(self, cells):
+        """Vectorised is_blocked for a NumPy array of cell keys."""
+        import numpy as np
+        grid = np.frombuffer(self.bits, dtype=np.uint8)
+        return (grid[cells >> 3] >> (cells & 7).astype(np.uint8)) & 1 == 1
+
+    def cells(self):
+        """Return the sorted cell keys of every obstacle as a NumPy array."""
+        import numpy as np
+        grid = np.frombuffer(self.bits, dtype=np.uint8)
+        used = np.flatnonzero(grid)
+        rows, bits = np.nonzero(np.unpackbits(grid[used][:, None], axis=1, bitorder='little'))
+        return used[rows] * 8 + bits
+
+    def __len__(self) -> int:
+        return bin(int.from_bytes(self.bits, 'little')).count('1')
+
+
+class SparseCells:
+    """
+        Hash set of blocked cell keys, with a sorted NumPy copy built on
+        demand for vectorised checks.
+
+        Attributes:
+            width, height : int  -> Field size.
+            cellset : set        -> Keys of the blocked cells.
+    """
+    kind = 'sparse'
+
+    def __init__(self, width: int, height: int):
+        self.width = width
+        self.height = height
+        self.cellset = set()
+        self._sorted = None
+
+    def is_blocked(self, x: int, y: int) -> bool:
+        return x * self.height + y in self.cellset
+
+    def add_cells(self, cells) -> None:
+        """Block the given cell keys (an iterable of int or a NumPy array)."""
+        if hasattr(cells, 'tolist'):
+            cells = cells.tolist()
+        self.cellset.update(cells)
+        self._sorted = None
+
+    def cells(self):
+        """Return the sorted cell keys of every obstacle as a NumPy array."""
+        import numpy as np
+        if self._sorted is None:
+            self._sorted = np.sort(np.fromiter(self.cellset, dtype=np.int64, count=len(self.cellset)))
+        return self._sorted
+
+    def blocked(self, cells):
+        """Vectorised is_blocked for a NumPy array of cell keys."""
+        import numpy as np
+        keys = self.cells()
+        if not len(keys):
+            return np.zeros(len(cells), dtype=bool)
+        found = np.searchsorted(keys, cells)
+        found[found == len(keys)] = 0
+        return keys[found] == cells
+
+    def __len__(self) -> int:
+        return len(self.cellset)
+
+
+def make_obstacles(width: int, height: int, storage: str = 'auto', count: int = 0):
+    """
+    Create an empty obstacle store for a field.
+
+    Args:
+        width, height (int): Field size.
+        storage (str): 'bits', 'sparse' or 'auto', which picks a bit grid
+            unless it would take more than BIT_GRID_BYTES and more than the
+            sparse store would for count obstacles.
+        count (int): Expected number of obstacles, used by 'auto'.
+
+    Returns:
+        A BitGrid or a SparseCells.
+    """
+    if storage not in STORAGES:
+        raise ValueError(f"Unknown obstacle storage: {storage}")
+    if storage == 'auto':
+        grid_bytes = (width * height + 7) // 8
+        dense = grid_bytes <= max(BIT_GRID_BYTES, count * SPARSE_BYTES_PER_CELL)
+        storage = 'bits' if dense else 'sparse'
+    return BitGrid(width, height) if storage == 'bits' else SparseCells(width, height)
+
+
+def parse_obstacles(lines: Iterable[str]) -> List[Tuple[int, int, int, int]]:
+    """Parse obstacle file lines into inclusive (x0, y0, x1, y1) rectangles."""
+    rectangles = []
+    for number, line in enumerate(lines, 1):
+        line = line.split('#', 1)[0]
+        values = line.split()
+        if not values:
+            continue
+        try:
+            values = [int(value) for value in values]
+        except ValueError:
+            raise ValueError(f"Line {number}: expected integers, got {line.strip()!r}") from None
+        if len(values) == 2:
+            rectangles.append((values[0], values[1], values[0], values[1]))
+        elif len(values) == 4:
+            x0, y0, x1, y1 = values
+            rectangles.append((min(x0, x1), min(y0, y1), max(x0, x1), max(y0, y1)))
+        else:
+            raise ValueError(f"Line {number}: expected 'x y' or 'x0 y0 x1 y1', got {line.strip()!r}")
+    return rectangles
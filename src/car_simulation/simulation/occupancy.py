@@ -0,0 +1,66 @@
+# simulation/occupancy.py
+
+class OccupancyIndex:
+    """
+        Persistent cell -> car id index of the active cars on the field.
+
+        Between steps every cell holds at most one active car, so the index
+        only has to be updated for the cars that moved, instead of being
+        rebuilt from the whole fleet every step.
+
+        Attributes:
+            cells : dict -> Maps a cell key to the id (index in Simulation.cars)
+                            of the car standing on it.
+    """
+
+    def __init__(self):
+        self.cells = {}
+
+    def __len__(self) -> int:
+        return len(self.cells)
+
+    def __contains__(self, cell) -> bool:
+        return cell in self.cells
+
+    def get(self, cell):
+        """Return the id of the car on the cell, or None if it is free."""
+        return self.cells.get(cell)
+
+    def place(self, cell, car_id: int) -> None:
+        """Record that the car now occupies the cell."""
+        self.cells[cell] = car_id
+
+    def release(self, cell, car_id: int) -> None:
+        """Remove the car from the cell if it is the one recorded there."""
+        if self.cells.get(cell) == car_id:
+            del self.cells[cell]
+
+    def clear(self) -> None:
+        self.cells.clear()
+
+    def move(self, moved) -> dict:
+        """
+        Apply a batch of moves and return the cells claimed by several cars.
+
+        Args:
+            moved (iterable): (car id, old cell, new cell) for each car whose
+                cell changed this step.
+
+        Returns:
+            dict: cell -> list of the ids of all cars on it, for every cell that
+            now holds more than one car. Those cells are left out of the index;
+            the caller resolves them as collisions.
+        """
+        cells = self.cells
+        moved = list(moved)
+        for car_id, old_cell, _ in moved:
+            if cells.get(old_cell) == car_id:
+                del cells[old_cell]
+        contested = {}
+        for car_id, _, new_cell in moved:
+            occupant = cells.setdefault(new_cell, car_id)
+            if occupant != car_id:
+                contested.setdefault(new_cell, [occupant]).append(car_id)
+        for cell in contested:
+            del cells[cell]
+        return contested
@@ -0,0 +1,124 @@
+# simulation/programs.py
+"""
+Command program analysis and compact storage for the NumPy engines.
+
+Many command strings are a short pattern repeated many times, such as
+"FFRFFL" * 5000. command_period finds the shortest pattern a string
+repeats (a final partial repetition is allowed), and compile_programs
+stores every distinct command string once, as that pattern only: command
+c of a car is pattern[c % period]. The event engine builds its prefix
+tables over the patterns and fast-forwards cars across whole periods in
+closed form, so memory and setup grow with the distinct patterns rather
+than with the total length of all commands.
+
+A Program of the compact syntax (see grammar.py) is stored the same way,
+as a sequence of such blocks, each a pattern repeated over a span of the
+program: "F1000 (FFR)x500" is the blocks "F" over commands 0-999 and
+"FFR" over the next 1500. Plain command strings are a single block.
+"""
+from typing import List, NamedTuple, Union
+
+import numpy as np
+
+from .grammar import Program
+
+# Shorter strings are stored as they are
+MIN_PERIODIC_LENGTH = 64
+# Longest pattern looked for when the string does not end on a whole period
+MAX_PARTIAL_PERIOD = 64
+
+
+class Programs(NamedTuple):
+    """
+        The command patterns of a fleet, as blocks of repeated patterns.
+
+        Attributes:
+            program : ndarray  -> Every distinct pattern followed by a 0 byte, concatenated,
+                                  with a final 0 byte.
+            offset : ndarray   -> Start of each block's pattern in program.
+            period : ndarray   -> Length of each block's pattern (at least 1).
+            start : ndarray    -> Index of the first command of each block in its program.
+            key : ndarray      -> Position of each block in the concatenation of all
+                                  programs (each followed by a gap of one), for
+                                  searchsorted; empty when every program is one block.
+            block : ndarray    -> First block of each car's program.
+            length : ndarray   -> Number of commands of each car.
+    """
+    program: np.ndarray
+    offset: np.ndarray
+    period: np.ndarray
+    start: np.ndarray
+    key: np.ndarray
+    block: np.ndarray
+    length: np.ndarray
+
+
+def command_period(commands: str) -> int:
+    """
+    Return the length of the shortest pattern that commands repeats.
+
+    commands[i] == commands[i - period] holds for every i >= period; the
+    last repetition may be partial. Strings shorter than
+    MIN_PERIODIC_LENGTH, or without such a pattern, are their own period.
+    """
+    length = len(commands)
+    if length < MIN_PERIODIC_LENGTH:
+        return length
+    # Whole repetitions: the first rotation of the string equal to itself
+    period = (commands + commands).find(commands, 1)
+    if period < length:
+        return period
+    for period in range(1, min(MAX_PARTIAL_PERIOD, length // 2) + 1):
+        if commands[period:] == commands[:length - period]:
+            return period
+    return length
+
+
+def _blocks(commands: Union[str, Program]) -> list:
+    """(pattern, length) blocks of a command string or Program, at least one."""
+    if isinstance(commands, Program):
+        blocks = commands.blocks()
+    else:
+        blocks = [(commands, len(commands))]
+    # A pattern spanning its block exactly may itself repeat a shorter one
+    blocks = [(pattern[:command_period(pattern)], length) if len(pattern) == length else (pattern, length)
+              for pattern, length in blocks]
+    return blocks or [('', 0)]
+
+
+def compile_programs(commands: List[Union[str, Program]]) -> Programs:
+    """Store the commands of every car as blocks of patterns, sharing equal programs and patterns."""
+    count = len(commands)
+    block = np.empty(count, dtype=np.int64)
+    length = np.empty(count, dtype=np.int64)
+    programs = {}
+    patterns = {}
+    parts = []
+    size = 0
+    offsets, periods, starts, keys = [], [], [], []
+    position = 0
+    for car_id, string in enumerate(commands):
+        found = programs.get(string)
+        if found is None:
+            found = programs[string] = len(offsets)
+            start = 0
+            for pattern, span in _blocks(string):
+                offset = patterns.get(pattern)
+                if offset is None:
+                    offset = patterns[pattern] = size
+                    parts.append(pattern)
+                    size += len(pattern) + 1
+                offsets.append(offset)
+                periods.append(max(len(pattern), 1))
+                starts.append(start)
+                keys.append(position + start)
+                start += span
+            position += start + 1
+        block[car_id] = found
+        length[car_id] = len(string)
+    program = np.frombuffer(('\0'.join(parts) + '\0\0').encode('ascii'), dtype=np.uint8) if parts \
+        else np.zeros(1, dtype=np.uint8)
+    single = len(offsets) == len(programs)
+    return Programs(program, np.array(offsets, dtype=np.int64), np.array(periods, dtype=np.int64),
+                    np.array(starts, dtype=np.int64),
+                    np.array([] if single else keys, dtype=np.int64), block, length)
@@ -0,0 +1,219 @@
+# simulation/recorder.py
+"""
+Binary trajectory recording and random-access replay (requires NumPy).
+
+A recording is two files. The data file starts with a header (MAGIC, a
+uint32 format version, a uint32 length and that many bytes of JSON with
+the car names, field size and keyframe interval) followed by fixed-width
+ROW records. The index file (path + '.idx') holds two int64 per frame:
+the first row of the frame and its row count.
+
+Frame 0 is the state before the first recorded step, frame f the state
+after f steps. Every keyframe_interval-th frame is a keyframe holding a row
+for every car; the frames in between only hold the rows of the cars whose
+position, heading or active flag changed. Both files are appended to while
+recording and memory-mapped for replay, so neither side holds more than a
+few frames in memory.
+"""
+import json
+import struct
+from typing import Iterator, List, NamedTuple
+
+import numpy as np
+
+MAGIC = b'CARTRAJ\0'
+VERSION = 1
+ROW = np.dtype([('car', '<u4'), ('x', '<i4'), ('y', '<i4'), ('heading', 'i1'), ('active', 'u1')])
+INDEX = np.dtype('<i8')
+DEFAULT_KEYFRAME_INTERVAL = 1024
+
+
+class Frame(NamedTuple):
+    """
+        The state of every car at one frame, indexed by car id.
+
+        Attributes:
+            x, y : ndarray     -> Car coordinates.
+            heading : ndarray  -> Heading index into HEADINGS.
+            active : ndarray   -> Active flags.
+    """
+    x: np.ndarray
+    y: np.ndarray
+    heading: np.ndarray
+    active: np.ndarray
+
+
+class Recorder:
+    """
+        Appends the state of a simulation to a trajectory file after every step.
+
+        Pass it to Simulation(recorder=...); the simulation calls begin() once
+        and record() after each step. Close it (or use it as a context
+        manager) when done.
+
+        Attributes:
+            path : str                -> The data file; the index is path + '.idx'.
+            keyframe_interval : int   -> Frames between keyframes.
+            frames : int              -> Frames recorded so far.
+    """
+
+    def __init__(self, path: str, keyframe_interval: int = DEFAULT_KEYFRAME_INTERVAL):
+        if keyframe_interval < 1:
+            raise ValueError("keyframe_interval must be at least 1")
+        self.path = path
+        self.keyframe_interval = keyframe_interval
+        self.frames = 0
+        self.rows = 0
+        self.data = None
+        self.index = None
+        self.previous = None
+
+    @property
+    def started(self) -> bool:
+        return self.data is not None
+
+    def begin(self, simulation, state: tuple) -> None:
+        """Write the header and frame 0 for the simulation's cars, given Engine.state()."""
+        header = json.dumps({
+            'cars': [car.name for car in simulation.cars],
+            'width': simulation.field.width,
+            'height': simulation.field.height,
+            'keyframe_interval': self.keyframe_interval,
+            'start': simulation.step,
+        }).encode('utf-8')
+        self.data = open(self.path, 'wb')
+        self.index = open(self.path + '.idx', 'wb')
+        self.data.write(MAGIC + struct.pack('<II', VERSION, len(header)) + header)
+        self.previous = Frame(*(np.array(column) for column in state))
+        self._write_rows(np.arange(len(self.previous.x)), self.previous)
+
+    def record(self, state: tuple) -> None:
+        """Append the frame after a step, given Engine.state()."""
+        state = Frame(*state)
+        previous = self.previous
+        if self.frames % self.keyframe_interval == 0:
+            changed = np.arange(len(state.x))
+        else:
+            changed = np.flatnonzero((state.x != previous.x) | (state.y != previous.y)
+                                     | (state.heading != previous.heading)
+                                     | (state.active != previous.active))
+        for column, values in zip(previous, state):
+            column[changed] = values[changed]
+        self._write_rows(changed, previous)
+
+    def _write_rows(self, car_ids: np.ndarray, state: Frame) -> None:
+        rows = np.empty(len(car_ids), dtype=ROW)
+        rows['car'] = car_ids
+        rows['x'] = state.x[car_ids]
+        rows['y'] = state.y[car_ids]
+        rows['heading'] = state.heading[car_ids]
+        rows['active'] = state.active[car_ids]
+        rows.tofile(self.data)
+        np.array([self.rows, len(rows)], dtype=INDEX).tofile(self.index)
+        self.rows += len(rows)
+        self.frames += 1
+
+    def flush(self) -> None:
+        if self.started:
+            self.data.flush()
+            self.index.flush()
+
+    def close(self) -> None:
+        if self.started and not self.data.closed:
+            self.data.close()
+            self.index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class Replay:
+    """
+        Random access to a recorded trajectory through memory maps.
+
+        frame(f) loads the nearest keyframe at or before f and applies the
+        deltas after it, so a seek costs at most keyframe_interval frames of
+        changes whatever the length of the run.
+
+        Attributes:
+            names : list              -> Car names, indexed by car id.
+            width, height : int       -> Field size.
+            keyframe_interval : int   -> Frames between keyframes.
+            start : int               -> Simulation step at which recording began.
+    """
+
+    def __init__(self, path: str):
+        with open(path, 'rb') as file:
+            prefix = file.read(len(MAGIC) + 8)
+            if len(prefix) < len(MAGIC) + 8 or prefix[:len(MAGIC)] != MAGIC:
+                raise ValueError(f"{path} is not a trajectory recording")
+            version, length = struct.unpack('<II', prefix[len(MAGIC):])
+            if version != VERSION:
+                raise ValueError(f"Unsupported trajectory format version {version}")
+            header = json.loads(file.read(length).decode('utf-8'))
+        self.names: List[str] = header['cars']
+        self.width = header['width']
+        self.height = header['height']
+        self.keyframe_interval = header['keyframe_interval']
+        self.start = header['start']
+        self.rows = self._map(path, ROW, len(MAGIC) + 8 + length)
+        self.index = self._map(path + '.idx', INDEX, 0).reshape(-1, 2)
+
+    @staticmethod
+    def _map(path: str, dtype: np.dtype, offset: int) -> np.ndarray:
+        with open(path, 'rb') as file:
+            size = file.seek(0, 2)
+        if size <= offset:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(path, dtype=dtype, mode='r', offset=offset)
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def _apply(self, state: Frame, frame: int) -> None:
+        first, count = self.index[frame]
+        rows = self.rows[first:first + count]
+        car_ids = rows['car']
+        state.x[car_ids] = rows['x']
+        state.y[car_ids] = rows['y']
+        state.heading[car_ids] = rows['heading']
+        state.active[car_ids] = rows['active']
+
+    def _blank(self) -> Frame:
+        count = len(self.names)
+        return Frame(np.zeros(count, dtype=np.int32), np.zeros(count, dtype=np.int32),
+                     np.zeros(count, dtype=np.int8), np.zeros(count, dtype=bool))
+
+    def frame(self, frame: int) -> Frame:
+        """Return the state of every car at the given frame (negative counts from the end)."""
+        if frame < 0:
+            frame += len(self)
+        if not 0 <= frame < len(self):
+            raise IndexError(f"Frame {frame} out of range for {len(self)} frames")
+        state = self._blank()
+        keyframe = frame - frame % self.keyframe_interval
+        for delta in range(keyframe, frame + 1):
+            self._apply(state, delta)
+        return state
+
+    def frames(self, start: int = 0, stop: int = None) -> Iterator[Frame]:
+        """
+        Iterate over frames start .. stop - 1, applying one frame of changes at a time.
+
+        The same Frame arrays are updated in place and yielded each time;
+        copy them to keep a frame.
+        """
+        stop = len(self) if stop is None else min(stop, len(self))
+        if start >= stop:
+            return
+        state = self.frame(start)
+        yield state
+        for frame in range(start + 1, stop):
+            self._apply(state, frame)
+            yield state
+
+    def __iter__(self) -> Iterator[Frame]:
+        return self.frames()
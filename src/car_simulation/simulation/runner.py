@@ -0,0 +1,127 @@
+# simulation/runner.py
+
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Iterator, List, Sequence, Tuple
+
+from .scenario import Scenario, run_scenario
+
+# Chunks per worker when packing scenarios; more chunks balance load better,
+# fewer amortise inter-process communication better
+CHUNKS_PER_WORKER = 4
+
+
+class BatchReport:
+    """
+        Results of running many scenarios, with aggregate throughput.
+
+        Attributes:
+            results : list   -> One result dict per scenario (see scenario.results),
+                                each with an 'index' into the input sequence.
+            elapsed : float  -> Wall-clock seconds for the whole batch.
+            workers : int    -> Number of worker processes used.
+    """
+
+    def __init__(self, results: List[dict], elapsed: float, workers: int):
+        self.results = results
+        self.elapsed = elapsed
+        self.workers = workers
+
+    @property
+    def throughput(self) -> float:
+        """Scenarios completed per second."""
+        return len(self.results) / self.elapsed if self.elapsed > 0 else float('inf')
+
+    def __repr__(self) -> str:
+        return (f"BatchReport({len(self.results)} scenarios in {self.elapsed:.3f}s on "
+                f"{self.workers} workers, {self.throughput:.1f} scenarios/s)")
+
+
+def scenario_weight(scenario: Scenario) -> int:
+    """Rough cost of a scenario: cars times the longest command string."""
+    longest = max((len(car[4]) for car in scenario.cars), default=0)
+    return max(len(scenario.cars) * max(longest, 1), 1)
+
+
+def make_chunks(scenarios: Sequence[Scenario], chunk_count: int) -> List[List[Tuple[int, Scenario]]]:
+    """Pack consecutive scenarios into about chunk_count chunks of similar weight."""
+    weights = [scenario_weight(scenario) for scenario in scenarios]
+    target = sum(weights) / max(chunk_count, 1)
+    chunks = []
+    chunk = []
+    load = 0
+    for index, scenario in enumerate(scenarios):
+        chunk.append((index, scenario))
+        load += weights[index]
+        if load >= target:
+            chunks.append(chunk)
+            chunk = []
+            load = 0
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+
+def _run_chunk(chunk: List[Tuple[int, Scenario]], engine: str) -> List[dict]:
+    """Worker entry point: run every scenario of a chunk."""
+    results = []
+    for index, scenario in chunk:
+        result = run_scenario(scenario, engine)
+        result['index'] = index
+        results.append(result)
+    return results
+
+
+def iter_many(scenarios: Sequence[Scenario], workers: int = None, engine: str = 'python',
+              chunks_per_worker: int = CHUNKS_PER_WORKER) -> Iterator[dict]:
+    """
+    Run independent scenarios on a process pool, yielding results as they complete.
+
+    Args:
+        scenarios: The scenarios to run.
+        workers (int): Worker processes; defaults to the number of CPUs. With
+            one worker the scenarios run in this process.
+        engine (str): Stepping engine used for every scenario.
+        chunks_per_worker (int): Scenarios are packed into about this many
+            chunks per worker, each sent to a worker as a single task.
+
+    Yields:
+        dict: The results of one scenario, with its 'index' in scenarios.
+    """
+    scenarios = list(scenarios)
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(scenarios) <= 1:
+        for index, scenario in enumerate(scenarios):
+            yield from _run_chunk([(index, scenario)], engine)
+        return
+    chunks = make_chunks(scenarios, workers * chunks_per_worker)
+    with ProcessPoolExecutor(max_workers=min(workers, len(chunks))) as executor:
+        futures = [executor.submit(_run_chunk, chunk, engine) for chunk in chunks]
+        for future in as_completed(futures):
+            yield from future.result()
+
+
+def run_many(scenarios: Sequence[Scenario], workers: int = None, engine: str = 'python',
+             ordered: bool = True, chunks_per_worker: int = CHUNKS_PER_WORKER) -> BatchReport:
+    """
+    Run independent scenarios on a process pool.
+
+    Args:
+        scenarios: The scenarios to run.
+        workers (int): Worker processes; defaults to the number of CPUs.
+        engine (str): Stepping engine used for every scenario.
+        ordered (bool): Return results in input order; otherwise in the order
+            they completed.
+        chunks_per_worker (int): See iter_many.
+
+    Returns:
+        BatchReport: The results and the aggregate throughput.
+    """
+    workers = workers or os.cpu_count() or 1
+    started = time.perf_counter()
+    results = list(iter_many(scenarios, workers, engine, chunks_per_worker))
+    elapsed = time.perf_counter() - started
+    if ordered:
+        results.sort(key=lambda result: result['index'])
+    return BatchReport(results, elapsed, workers)
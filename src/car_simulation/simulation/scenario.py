@@ -0,0 +1,122 @@
+# simulation/scenario.py
+
+import sys
+from typing import Iterable, List, Tuple
+
+from .field import Field
+from .grammar import Program, read_commands
+from .simulation import InvalidCarsError, Simulation
+from car_simulation.config.config import Config
+
+CarRow = Tuple[str, int, int, str, str]
+
+
+class Scenario:
+    """
+        A field and the cars to place on it, read without any prompts.
+
+        Scenario files are plain text. Blank lines and lines starting with '#'
+        are ignored. The first line holds the field size, every other line one
+        car, with its commands last (they may be left out):
+
+            10 10
+            A 1 2 N FFRFFFFRRL
+            B 7 8 W FFLFFFFFFF
+            C 0 0 E (FFR)x500F1000
+
+        Commands may use the compact syntax of grammar.py.
+
+        Attributes:
+            width : int  -> The width of the field.
+            height : int -> The height of the field.
+            cars : list  -> (name, x, y, direction, commands) for each car.
+            line_numbers : list -> The line of each car in the parsed text, used to
+                                   report invalid cars; empty if not parsed.
+    """
+
+    def __init__(self, width: int, height: int, cars: List[CarRow] = None, line_numbers: List[int] = None):
+        self.width = width
+        self.height = height
+        self.cars = cars if cars is not None else []
+        self.line_numbers = line_numbers if line_numbers is not None else []
+
+    @classmethod
+    def parse(cls, lines: Iterable[str]) -> 'Scenario':
+        """Parse a scenario from lines of text, raising ValueError on malformed input."""
+        scenario = None
+        for number, line in enumerate(lines, start=1):
+            parts = line.split()
+            if not parts or parts[0].startswith('#'):
+                continue
+            try:
+                if scenario is None:
+                    width, height = map(int, parts)
+                    scenario = cls(width, height)
+                    continue
+                if len(parts) not in (4, 5):
+                    raise ValueError("expected 'name x y direction [commands]'")
+                direction = parts[3].upper()
+                if direction not in Config.CAR_DIRECTIONS:
+                    raise ValueError(Config.INVALID_DIRECTION_MESSAGE)
+                commands = read_commands(parts[4].upper()) if len(parts) == 5 else ''
+                scenario.cars.append((parts[0], int(parts[1]), int(parts[2]), direction, commands))
+                scenario.line_numbers.append(number)
+            except ValueError as e:
+                raise ValueError(f"Line {number}: {e}") from e
+        if scenario is None:
+            raise ValueError("Scenario is empty: expected the field size 'width height'")
+        return scenario
+
+    @classmethod
+    def load(cls, path: str) -> 'Scenario':
+        """Read a scenario file, or standard input if path is '-'."""
+        if path == '-':
+            return cls.parse(sys.stdin)
+        with open(path, 'r') as file:
+            return cls.parse(file)
+
+    def lines(self) -> List[str]:
+        """Return the scenario as the lines of a scenario file (see parse)."""
+        lines = [f"{self.width} {self.height}"]
+        for name, x, y, direction, commands in self.cars:
+            if not isinstance(commands, (str, Program)):
+                commands = ''.join(commands)
+            lines.append(f"{name} {x} {y} {direction} {commands}".rstrip())
+        return lines
+
+    def build(self, engine: str = 'python', workers: int = None) -> Simulation:
+        """
+        Create a quiet Simulation holding the scenario's cars.
+
+        Raises:
+            ValueError: If any car is invalid (see Simulation.add_cars); every
+                invalid car is listed, by its line when the scenario was parsed.
+        """
+        simulation = Simulation(Field(self.width, self.height), engine=engine, verbose=False, workers=workers)
+        try:
+            simulation.add_cars(self.cars)
+        except InvalidCarsError as e:
+            if len(self.line_numbers) != len(self.cars):
+                raise
+            raise ValueError('\n'.join(f"Line {self.line_numbers[row]}: {message}"
+                                       for row, message in e.errors)) from e
+        return simulation
+
+
+def results(simulation: Simulation) -> dict:
+    """Return the final state of a simulation as plain, JSON-serialisable data."""
+    return {
+        'field': {'width': simulation.field.width, 'height': simulation.field.height},
+        'cars': [
+            {'name': car.name, 'x': car.x, 'y': car.y, 'direction': car.direction, 'active': car.active}
+            for car in simulation.cars
+        ],
+        'collisions': list(simulation.collisions),
+    }
+
+
+def run_scenario(scenario: Scenario, engine: str = 'python', workers: int = None) -> dict:
+    """Build and run a scenario, returning its results. Errors during the run propagate."""
+    simulation = scenario.build(engine, workers)
+    simulation.run()
+    return results(simulation)
@@ -0,0 +1,466 @@
+# simulation/service.py
+"""
+Long-running simulation service speaking JSON lines over TCP or a Unix socket.
+
+Every line a client sends is one request, a new job or the cancellation of
+one of its jobs:
+
+    {"id": 1, "scenario": "10 10\\nA 1 2 N FFRFFFFRRL", "engine": "numpy", "progress": 100}
+    {"cancel": 1}
+
+The scenario is the text of a scenario file (see Scenario.parse) or the
+list of its lines; engine and progress are optional. Every line the
+service sends is a message about one job, tagged with the job's id:
+
+    {"id": 1, "event": "progress", "step": 99, "active": 2, "collisions": 0}
+    {"id": 1, "event": "result", "result": {...}, "elapsed": 0.012}
+    {"id": 1, "event": "cancelled", "step": 41}
+    {"id": 1, "event": "error", "error": "Line 2: expected 'name x y direction [commands]'"}
+
+A job ends with exactly one result, cancelled or error message, after its
+progress messages (one every progress steps, none by default). The result
+is what the batch mode writes (see scenario.results).
+
+Jobs run on a pool of worker processes that are started, with the engines
+imported, before the service accepts connections. At most max_jobs jobs
+run or wait at once over all connections; once they are all taken the
+service stops reading requests, so clients block in their own writes
+instead of queueing unbounded work. Progress is sent with credits: a
+worker posts at most PROGRESS_WINDOW messages its client has not yet been
+sent, then waits (still checking for cancellation) until the client reads
+them. Closing the connection, or only its write side, cancels the
+client's unfinished jobs.
+"""
+import asyncio
+import contextlib
+import itertools
+import json
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import AsyncIterator, Optional, Tuple
+
+from .engine import get_engine
+from .scenario import Scenario, results
+
+PROGRESS = 'progress'
+RESULT = 'result'
+CANCELLED = 'cancelled'
+ERROR = 'error'
+
+# Progress messages of a job that may be on their way to the client
+PROGRESS_WINDOW = 8
+# Seconds between the cancellation checks of a worker waiting for credits
+CREDIT_POLL = 0.05
+# Longest line (request or message) read, in bytes
+LINE_LIMIT = 1 << 26
+# Engines imported by the workers when they start
+WARM_ENGINES = ('python', 'numpy', 'event')
+
+# Set in each worker process by _warm
+_messages = None
+_cancelled = None
+_credits = None
+
+
+def _warm(messages, cancelled, credits, engines) -> None:
+    """Worker initializer: keep the shared channels and import the engines."""
+    global _messages, _cancelled, _credits
+    _messages, _cancelled, _credits = messages, cancelled, credits
+    # Diagnostics from the cars must not end up in the service's output
+    sys.stdout = sys.stderr
+    for engine in engines:
+        with contextlib.suppress(ImportError):
+            get_engine(engine)
+
+
+def _ready() -> int:
+    return os.getpid()
+
+
+def _run_job(ticket: int, slot: int, scenario, engine: str, progress: int) -> None:
+    """Worker entry point: run one job, posting its messages tagged with its ticket."""
+    if _cancelled[slot]:
+        # Cancelled while queued in the pool
+        _messages.put((ticket, CANCELLED, {}))
+        return
+    try:
+        started = time.perf_counter()
+        lines = scenario.splitlines() if isinstance(scenario, str) else scenario
+        simulation = Scenario.parse(lines).build(engine)
+        steps = simulation.iter_steps()
+        for snapshot in steps:
+            if _cancelled[slot] or (progress and (snapshot.step + 1) % progress == 0
+                                    and not _post_progress(ticket, slot, snapshot, simulation)):
+                steps.close()
+                _messages.put((ticket, CANCELLED, {'step': snapshot.step}))
+                return
+        _messages.put((ticket, RESULT, {'result': results(simulation),
+                                        'elapsed': time.perf_counter() - started}))
+    except Exception as e:
+        _messages.put((ticket, ERROR, {'error': str(e) or type(e).__name__}))
+
+
+def _post_progress(ticket: int, slot: int, snapshot, simulation) -> bool:
+    """Post a progress message once the client has credit for it; False if cancelled meanwhile."""
+    credit = _credits[slot]
+    while not credit.acquire(timeout=CREDIT_POLL):
+        if _cancelled[slot]:
+            return False
+    _messages.put((ticket, PROGRESS, {'step': snapshot.step, 'active': snapshot.active_count,
+                                      'collisions': len(simulation.collision_log)}))
+    return True
+
+
+def encode(message: dict) -> bytes:
+    """One JSON line."""
+    return json.dumps(message, separators=(',', ':')).encode() + b'\n'
+
+
+def parse_address(address: str) -> Tuple[Optional[str], Optional[int], Optional[str]]:
+    """
+    Split a service address into (host, port, path).
+
+    'HOST:PORT' and 'PORT' are TCP addresses (the host defaults to
+    127.0.0.1); anything containing a '/' is the path of a Unix socket.
+    """
+    if '/' in address:
+        return None, None, address
+    host, _, port = address.rpartition(':')
+    try:
+        return host or '127.0.0.1', int(port), None
+    except ValueError:
+        raise ValueError(f"Invalid service address {address!r}: expected HOST:PORT, PORT or a socket path")
+
+
+class Job:
+    """
+        A job submitted over a connection.
+
+        Attributes:
+            id               -> The id the client gave the job.
+            ticket : int     -> Unique number tagging the job's messages.
+            slot : int       -> Index of the job's cancellation flag and progress credits.
+            messages : asyncio.Queue -> (kind, payload) messages posted for the job.
+            future : Future  -> The job's task on the worker pool.
+    """
+    __slots__ = ('id', 'ticket', 'slot', 'messages', 'future')
+
+    def __init__(self, job_id, ticket: int, slot: int):
+        self.id = job_id
+        self.ticket = ticket
+        self.slot = slot
+        self.messages = asyncio.Queue()
+        self.future = None
+
+
+class Connection:
+    """
+        Writes the messages of one client, waiting for the client to read them.
+
+        Attributes:
+            writer : StreamWriter -> The client's stream.
+            lock : asyncio.Lock   -> Serialises drains (see StreamWriter.drain).
+            lost : bool           -> True once a write failed.
+    """
+
+    def __init__(self, writer: asyncio.StreamWriter):
+        self.writer = writer
+        self.lock = asyncio.Lock()
+        self.lost = False
+
+    async def send(self, message: dict) -> bool:
+        """Send a message, returning False if the client is gone."""
+        if self.lost:
+            return False
+        async with self.lock:
+            try:
+                self.writer.write(encode(message))
+                await self.writer.drain()
+            except ConnectionError:
+                self.lost = True
+        return not self.lost
+
+
+class SimulationService:
+    """
+        Runs the jobs of any number of clients on a warm pool of worker processes.
+
+        Attributes:
+            workers : int   -> Worker processes (by default the number of CPUs).
+            max_jobs : int  -> Jobs running or waiting at once, over all connections
+                               (by default four per worker).
+            engine : str    -> Engine of the jobs that do not name one.
+            server          -> The asyncio server, once started.
+            jobs : dict     -> Ticket -> Job of every job in flight.
+    """
+
+    def __init__(self, workers: int = None, max_jobs: int = None, engine: str = 'python'):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_jobs = max_jobs or 4 * self.workers
+        self.engine = engine
+        self.server = None
+        self.executor = None
+        self.jobs = {}
+        self.tickets = itertools.count()
+        self.loop = None
+        self.slots = None
+        self.messages = None
+        self.cancelled = None
+        self.credits = None
+        self.reader = None
+
+    async def start(self, host: str = '127.0.0.1', port: int = 0, path: str = None):
+        """Start the workers, then listen on host:port, or on the Unix socket at path."""
+        self.loop = asyncio.get_running_loop()
+        context = multiprocessing.get_context()
+        self.messages = context.Queue()
+        self.cancelled = context.RawArray('b', self.max_jobs)
+        self.credits = [context.Semaphore(PROGRESS_WINDOW) for _ in range(self.max_jobs)]
+        self.executor = ProcessPoolExecutor(self.workers, mp_context=context, initializer=_warm,
+                                            initargs=(self.messages, self.cancelled, self.credits,
+                                                      WARM_ENGINES))
+        await asyncio.gather(*(self.loop.run_in_executor(self.executor, _ready)
+                               for _ in range(self.workers)))
+        self.slots = asyncio.Queue()
+        for slot in range(self.max_jobs):
+            self.slots.put_nowait(slot)
+        self.reader = threading.Thread(target=self._read_messages, name='service-messages', daemon=True)
+        self.reader.start()
+        if path is None:
+            self.server = await asyncio.start_server(self._serve, host, port, limit=LINE_LIMIT)
+        else:
+            self.server = await asyncio.start_unix_server(self._serve, path, limit=LINE_LIMIT)
+        return self.server
+
+    @property
+    def address(self):
+        """The (host, port) or socket path the service listens on."""
+        return self.server.sockets[0].getsockname()
+
+    async def close(self) -> None:
+        """Stop listening, cancel every job and stop the workers."""
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        for job in list(self.jobs.values()):
+            self._cancel(job)
+        if self.executor is not None:
+            await self.loop.run_in_executor(None, self.executor.shutdown)
+            self.messages.put(None)
+            await self.loop.run_in_executor(None, self.reader.join)
+            self.executor = None
+
+    def _read_messages(self) -> None:
+        """Thread handing the messages posted by the workers to the event loop."""
+        while True:
+            message = self.messages.get()
+            if message is None:
+                return
+            self.loop.call_soon_threadsafe(self._deliver, *message)
+
+    def _deliver(self, ticket: int, kind: str, payload: dict) -> None:
+        job = self.jobs.get(ticket)
+        if job is not None:
+            job.messages.put_nowait((kind, payload))
+
+    def _cancel(self, job: Job) -> None:
+        """Cancel a job: drop it if it has not started, otherwise flag its worker."""
+        self.cancelled[job.slot] = 1
+        job.future.cancel()
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Read the requests of one client until it disconnects, then cancel its jobs."""
+        connection = Connection(writer)
+        jobs = {}
+        followers = set()
+        try:
+            while not connection.lost:
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    await connection.send({'id': None, 'event': ERROR, 'error': "Request too long"})
+                    break
+                except ConnectionError:
+                    break
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                job = await self._submit(line, connection, jobs)
+                if job is not None:
+                    follower = asyncio.ensure_future(self._follow(job, connection, jobs))
+                    followers.add(follower)
+                    follower.add_done_callback(followers.discard)
+            for job in list(jobs.values()):
+                self._cancel(job)
+            if followers:
+                await asyncio.gather(*followers)
+        finally:
+            for job in list(jobs.values()):
+                self._cancel(job)
+            writer.close()
+            with contextlib.suppress(ConnectionError):
+                await writer.wait_closed()
+
+    async def _submit(self, line: bytes, connection: Connection, jobs: dict) -> Optional[Job]:
+        """Handle one request line, returning the job it submitted, if any."""
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError("expected a JSON object")
+        except ValueError as e:
+            await connection.send({'id': None, 'event': ERROR, 'error': f"Invalid request: {e}"})
+            return None
+        if 'cancel' in request:
+            job = jobs.get(request['cancel'])
+            if job is not None:
+                self._cancel(job)
+            return None
+        job_id = request.get('id')
+        scenario = request.get('scenario')
+        progress = request.get('progress', 0)
+        error = None
+        if job_id in jobs:
+            error = f"Job {job_id!r} is already running"
+        elif not isinstance(scenario, (str, list)):
+            error = "'scenario' must be the text of a scenario file or a list of its lines"
+        elif not isinstance(progress, int) or progress < 0:
+            error = "'progress' must be a number of steps"
+        if error is not None:
+            await connection.send({'id': job_id, 'event': ERROR, 'error': error})
+            return None
+        # Waiting for a slot stops reading requests: the backpressure on clients
+        slot = await self.slots.get()
+        job = Job(job_id, next(self.tickets), slot)
+        jobs[job_id] = job
+        self.jobs[job.ticket] = job
+        self.cancelled[slot] = 0
+        job.future = self.executor.submit(_run_job, job.ticket, slot, scenario,
+                                          request.get('engine') or self.engine, progress)
+        asyncio.wrap_future(job.future).add_done_callback(lambda future: self._finished(job, future))
+        return job
+
+    def _finished(self, job: Job, future: asyncio.Future) -> None:
+        """Post the end of a job that never ran or whose worker failed."""
+        if future.cancelled():
+            job.messages.put_nowait((CANCELLED, {}))
+        elif future.exception() is not None:
+            job.messages.put_nowait((ERROR, {'error': f"Worker failed: {future.exception()!r}"}))
+
+    async def _follow(self, job: Job, connection: Connection, jobs: dict) -> None:
+        """Forward the messages of a job to its client until the job ends."""
+        try:
+            while True:
+                kind, payload = await job.messages.get()
+                sent = await connection.send({'id': job.id, 'event': kind, **payload})
+                if kind != PROGRESS:
+                    return
+                self.credits[job.slot].release()
+                if not sent:
+                    self._cancel(job)
+        finally:
+            del self.jobs[job.ticket]
+            del jobs[job.id]
+            self.slots.put_nowait(job.slot)
+
+
+async def serve(address: str, workers: int = None, max_jobs: int = None, engine: str = 'python') -> None:
+    """Run a SimulationService on the given address (see parse_address) until cancelled."""
+    host, port, path = parse_address(address)
+    service = SimulationService(workers, max_jobs, engine)
+    server = await service.start(host, port, path)
+    print(f"Serving simulations on {service.address} with {service.workers} workers", file=sys.stderr)
+    try:
+        await server.serve_forever()
+    finally:
+        await service.close()
+
+
+class ServiceClient:
+    """
+        Client of a SimulationService running any number of jobs over one connection.
+
+        Attributes:
+            reader, writer -> The connection.
+            jobs : dict    -> Job id -> queue of the job's messages not read yet.
+    """
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+        self.jobs = {}
+        self.ids = itertools.count()
+        self.listener = asyncio.ensure_future(self._listen())
+
+    @classmethod
+    async def connect(cls, host: str = '127.0.0.1', port: int = None, path: str = None) -> 'ServiceClient':
+        """Connect to a service on host:port, or on the Unix socket at path."""
+        if path is None:
+            reader, writer = await asyncio.open_connection(host, port, limit=LINE_LIMIT)
+        else:
+            reader, writer = await asyncio.open_unix_connection(path, limit=LINE_LIMIT)
+        return cls(reader, writer)
+
+    async def _listen(self) -> None:
+        try:
+            async for line in self.reader:
+                message = json.loads(line)
+                queue = self.jobs.get(message.get('id'))
+                if queue is not None:
+                    queue.put_nowait(message)
+        finally:
+            for queue in self.jobs.values():
+                queue.put_nowait(None)
+
+    async def send(self, request: dict) -> None:
+        """Send a raw request."""
+        self.writer.write(encode(request))
+        await self.writer.drain()
+
+    async def submit(self, scenario, engine: str = None, progress: int = 0) -> int:
+        """Submit a Scenario (or scenario text), returning the job id; see messages()."""
+        job_id = next(self.ids)
+        self.jobs[job_id] = asyncio.Queue()
+        if isinstance(scenario, Scenario):
+            scenario = '\n'.join(scenario.lines())
+        request = {'id': job_id, 'scenario': scenario, 'progress': progress}
+        if engine is not None:
+            request['engine'] = engine
+        await self.send(request)
+        return job_id
+
+    async def messages(self, job_id: int) -> AsyncIterator[dict]:
+        """Yield the messages of a job, up to its result, cancelled or error message."""
+        queue = self.jobs[job_id]
+        try:
+            while True:
+                message = await queue.get()
+                if message is None:
+                    raise ConnectionError("Connection to the simulation service closed")
+                yield message
+                if message['event'] != PROGRESS:
+                    return
+        finally:
+            self.jobs.pop(job_id, None)
+
+    async def run(self, scenario, engine: str = None, progress: int = 0) -> dict:
+        """Run a job and return its last message (ignoring its progress)."""
+        job_id = await self.submit(scenario, engine, progress)
+        async for message in self.messages(job_id):
+            pass
+        return message
+
+    async def cancel(self, job_id: int) -> None:
+        await self.send({'cancel': job_id})
+
+    async def close(self) -> None:
+        self.writer.close()
+        with contextlib.suppress(ConnectionError):
+            await self.writer.wait_closed()
+        self.listener.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await self.listener
@@ -0,0 +1,363 @@
+# simulation/sharded_engine.py
+
+import math
+import multiprocessing
+import os
+import traceback
+from multiprocessing import shared_memory
+from multiprocessing.connection import wait
+from threading import BrokenBarrierError
+from typing import List, Tuple
+
+import numpy as np
+
+from .numpy_engine import NumpyEngine, DenseOccupancy, HashOccupancy, DENSE_GRID_LIMIT
+
+# Per-car state shared with the workers; the first five are written by them
+STATE = ('x', 'y', 'heading', 'cursor', 'active')
+PROGRAM = ('length', 'block', 'offset', 'period', 'start', 'key', 'program')
+
+
+class SharedArrays:
+    """
+        NumPy arrays backed by named shared memory blocks.
+
+        The creating process owns the blocks and unlinks them in release();
+        worker processes attach to them by name with attach().
+
+        Attributes:
+            arrays : dict -> Name -> ndarray view of its block.
+    """
+
+    def __init__(self):
+        self.blocks = []
+        self.arrays = {}
+        self.spec = {}
+
+    def create(self, name: str, array: np.ndarray) -> np.ndarray:
+        """Copy an array into a new shared block and return the shared view."""
+        block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        self.blocks.append(block)
+        view = np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)
+        view[...] = array
+        self.arrays[name] = view
+        self.spec[name] = (block.name, array.shape, array.dtype.str)
+        return view
+
+    @classmethod
+    def attach(cls, spec: dict) -> 'SharedArrays':
+        """Map the blocks described by another instance's spec."""
+        shared = cls()
+        for name, (block_name, shape, dtype) in spec.items():
+            block = shared_memory.SharedMemory(name=block_name)
+            shared.blocks.append(block)
+            shared.arrays[name] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+        shared.spec = dict(spec)
+        return shared
+
+    def close(self) -> None:
+        """Drop the views and unmap the blocks."""
+        self.arrays.clear()
+        for block in self.blocks:
+            block.close()
+
+    def release(self) -> None:
+        """Unmap and destroy the blocks (creating process only)."""
+        self.close()
+        for block in self.blocks:
+            block.unlink()
+        self.blocks = []
+
+
+def tile_grid(width: int, height: int, workers: int) -> Tuple[int, int]:
+    """
+    Split a field into columns x rows tiles, one per worker.
+
+    Picks the factorisation of the worker count giving the squarest tiles
+    (the shortest borders), using fewer workers if the field is too small.
+
+    Returns:
+        (columns, rows)
+    """
+    for count in range(max(workers, 1), 0, -1):
+        best = None
+        for columns in range(1, count + 1):
+            rows, remainder = divmod(count, columns)
+            if remainder or columns > width or rows > height:
+                continue
+            skew = abs(math.log((width / columns) / (height / rows)))
+            if best is None or skew < best[0]:
+                best = (skew, columns, rows)
+        if best is not None:
+            return best[1], best[2]
+    return 1, 1
+
+
+def tile_bounds(width: int, height: int, columns: int, rows: int) -> List[Tuple[int, int, int, int]]:
+    """Return (x0, x1, y0, y1) of every tile, column-major; x1 and y1 are exclusive."""
+    xs = [width * column // columns for column in range(columns + 1)]
+    ys = [height * row // rows for row in range(rows + 1)]
+    return [(xs[column], xs[column + 1], ys[row], ys[row + 1])
+            for column in range(columns) for row in range(rows)]
+
+
+def tile_neighbours(columns: int, rows: int) -> List[List[int]]:
+    """Indexes of the tiles sharing an edge with each tile."""
+    neighbours = []
+    for column in range(columns):
+        for row in range(rows):
+            near = []
+            for dc, dr in ((-1, 0), (1, 0), (0, -1), (0, 1)):
+                if 0 <= column + dc < columns and 0 <= row + dr < rows:
+                    near.append((column + dc) * rows + row + dr)
+            neighbours.append(near)
+    return neighbours
+
+
+class TileEngine(NumpyEngine):
+    """
+        Steps the cars inside one tile of a sharded run, in a worker process.
+
+        The tile owns the active cars whose position lies inside it. Each step
+        it executes their commands on the shared state arrays, posts the ids
+        of the cars that left the tile to its outbox, waits for the other
+        tiles, then adopts the cars its neighbours posted that landed inside
+        it. Cars move at most one cell per step, so these hand-offs are the
+        whole one-cell halo: after them every car in the tile's cells is
+        owned by the tile, and collisions are resolved locally exactly as the
+        NumpyEngine does, against an occupancy index of the tile's cells.
+
+        Outboxes are double-buffered by step parity, so a single barrier per
+        step keeps the tiles in lock step.
+
+        Attributes:
+            bounds : tuple      -> (x0, x1, y0, y1) of the tile.
+            owned : ndarray     -> Ids of the active cars inside the tile.
+            records : list      -> (step, first newcomer, x, y, car ids) of each collision.
+    """
+    name = 'tile'
+
+    def __init__(self, arrays: dict, width: int, height: int, index: int,
+                 bounds: Tuple[int, int, int, int], neighbours: List[int], barrier, obstacles=None,
+                 swept: bool = False):
+        self.simulation = None
+        self.stats = None
+        self.obstacles = obstacles
+        self.swept = swept
+        for name in STATE + PROGRAM:
+            setattr(self, name, arrays[name])
+        self.outbox = arrays['outbox']
+        self.outbox_count = arrays['outbox_count']
+        self.width = width
+        self.height = height
+        self.index = index
+        self.bounds = bounds
+        self.neighbours = neighbours
+        self.barrier = barrier
+        self.occupancy = None
+        self.records = []
+        everyone = np.flatnonzero(self.active)
+        self.owned = everyone[self._inside(everyone)]
+        # No tile may move a car before every tile has claimed its cars
+        barrier.wait()
+
+    def _inside(self, car_ids: np.ndarray) -> np.ndarray:
+        x0, x1, y0, y1 = self.bounds
+        x = self.x[car_ids]
+        y = self.y[car_ids]
+        return (x >= x0) & (x < x1) & (y >= y0) & (y < y1)
+
+    def cells(self, car_ids: np.ndarray) -> np.ndarray:
+        """Return the cell key of each car, relative to the tile."""
+        x0, _, y0, y1 = self.bounds
+        return (self.x[car_ids] - x0) * (y1 - y0) + (self.y[car_ids] - y0)
+
+    def _new_occupancy(self):
+        x0, x1, y0, y1 = self.bounds
+        cell_count = (x1 - x0) * (y1 - y0)
+        if cell_count <= DENSE_GRID_LIMIT:
+            return DenseOccupancy(cell_count)
+        return HashOccupancy()
+
+    def _record(self, step: int, x: int, y: int, car_ids: list, swap: bool = False) -> None:
+        # Merged in the order one process reports them (see NumpyEngine._record)
+        self.records.append((step, swap, car_ids[0] if swap else car_ids[1], x, y, car_ids))
+
+    def done(self) -> bool:
+        # The tiles step in lock step to the end of the run (see ShardedEngine.run)
+        return False
+
+    def step(self, step: int) -> None:
+        owned = self.owned
+        moved, old_cells = self._execute(owned)
+        self._tick(owned)
+        leaving = ~self._inside(moved)
+        emigrants = moved[leaving]
+        parity = step & 1
+        self.outbox[parity, self.index, :len(emigrants)] = emigrants
+        self.outbox_count[parity, self.index] = len(emigrants)
+        # The emigrants belong to another tile once the barrier is passed
+        edges = self._edges(moved) if self.swept else None
+
+        self.barrier.wait()
+
+        posted = [self.outbox[parity, tile, :self.outbox_count[parity, tile]] for tile in self.neighbours]
+        immigrants = np.concatenate(posted) if posted else moved[:0]
+        immigrants = immigrants[self._inside(immigrants)]
+        if len(emigrants):
+            owned = owned[self._inside(owned)]
+        owned = np.concatenate((owned, immigrants))
+        collisions = len(self.records)
+        if self.occupancy is None:
+            self._collide_all(step, owned)
+        else:
+            self.occupancy.release(old_cells, moved)
+            arrivals = np.concatenate((moved[~leaving], immigrants))
+            self._arrive(step, arrivals, self.cells(arrivals))
+        swapped = self._tile_swaps(step, moved, ~leaving, immigrants, edges) if self.swept else 0
+        if len(self.records) > collisions or swapped:
+            owned = owned[self.active[owned]]
+        self.owned = owned
+
+    def _tile_swaps(self, step: int, moved: np.ndarray, stayed: np.ndarray, immigrants: np.ndarray,
+                    edges) -> int:
+        """
+        Find the swaps among the cars that moved in or out of the tile.
+
+        A swap across a border is seen by both tiles: each deactivates the
+        swapped cars it owns now, and the tile owning the lower-id car records
+        it. Returns the number of cars deactivated.
+        """
+        movers = np.concatenate((moved, immigrants))
+        if len(movers) < 2:
+            return 0
+        immigrant_edges = self._edges(immigrants)
+        first, second = self._swapped(np.concatenate((edges[0], immigrant_edges[0])),
+                                      np.concatenate((edges[1], immigrant_edges[1])), movers)
+        if not len(first):
+            return 0
+        ours = np.concatenate((stayed, np.ones(len(immigrants), dtype=bool)))
+        swapped = np.concatenate((first, second))
+        mine = movers[swapped[ours[swapped]]]
+        self.active[mine] = False
+        self.occupancy.release(self.cells(mine), mine)
+        lower = np.where(movers[first] < movers[second], first, second)
+        higher = first + second - lower
+        recorded = ours[lower]
+        self._record_swaps(step, movers[lower[recorded]], movers[higher[recorded]])
+        return len(mine)
+
+
+def _run_tile(spec: dict, width: int, height: int, index: int, bounds, neighbours,
+              start: int, steps: int, barrier, conn, obstacles=None, swept: bool = False) -> None:
+    """Worker process entry point: step one tile and send back its collisions."""
+    shared = SharedArrays.attach(spec)
+    try:
+        tile = TileEngine(shared.arrays, width, height, index, bounds, neighbours, barrier, obstacles, swept)
+        tile.run(steps, start)
+        conn.send((None, tile.records))
+    except BrokenBarrierError:
+        conn.send(("aborted by another shard", None))
+    except BaseException:
+        barrier.abort()
+        conn.send((traceback.format_exc(), None))
+    finally:
+        tile = None
+        shared.close()
+        conn.close()
+
+
+class ShardedEngine(NumpyEngine):
+    """
+        Multi-process engine for single simulations with very large fleets.
+
+        The field is split into rectangular tiles (see tile_grid), each stepped
+        by its own worker process (see TileEngine) over state arrays held in
+        shared memory. Cars are handed over between tiles as they cross a
+        border, before collisions are checked, so cross-tile collisions are
+        found in the step they happen. The collisions of all tiles are merged
+        in the order a single process reports them: by step, then by car.
+        Results are identical to the NumpyEngine. Stepping one step at a time
+        (Simulation.iter_steps) runs in this process, as the NumpyEngine does.
+
+        Attributes:
+            workers : int -> Worker processes (Simulation.workers, by default
+                             the number of CPUs). Small fields get fewer tiles.
+    """
+    name = 'sharded'
+
+    def __init__(self, simulation):
+        super().__init__(simulation)
+        self.workers = getattr(simulation, 'workers', None) or os.cpu_count() or 1
+
+    def run(self, max_steps: int, start: int = 0) -> None:
+        # The tiles cannot stop on their own, so the run ends once the pending
+        # cars would have run out of commands even without collisions
+        pending = self.pending
+        if len(pending):
+            max_steps = min(max_steps, start + int((self.length[pending] - self.cursor[pending]).max()))
+        if max_steps <= start or not len(self.x):
+            return
+        columns, rows = tile_grid(self.width, self.height, self.workers)
+        bounds = tile_bounds(self.width, self.height, columns, rows)
+        neighbours = tile_neighbours(columns, rows)
+        tiles = len(bounds)
+
+        shared = SharedArrays()
+        context = multiprocessing.get_context()
+        processes = []
+        try:
+            for name in STATE + PROGRAM:
+                shared.create(name, getattr(self, name))
+            shared.create('outbox', np.zeros((2, tiles, len(self.x)), dtype=np.int64))
+            shared.create('outbox_count', np.zeros((2, tiles), dtype=np.int64))
+            barrier = context.Barrier(tiles)
+            connections = []
+            for index in range(tiles):
+                receiver, sender = context.Pipe(duplex=False)
+                process = context.Process(
+                    target=_run_tile, name=f"shard-{index}", daemon=True,
+                    args=(shared.spec, self.width, self.height, index, bounds[index],
+                          neighbours[index], start, max_steps, barrier, sender, self.obstacles,
+                          self.swept))
+                process.start()
+                sender.close()
+                processes.append(process)
+                connections.append(receiver)
+            records = self._collect(connections, barrier)
+            for name in STATE:
+                setattr(self, name, shared.arrays[name].copy())
+        finally:
+            for process in processes:
+                process.join(timeout=5)
+                if process.is_alive():
+                    process.terminate()
+            shared.release()
+        records.sort()
+        for step, swap, _, x, y, car_ids in records:
+            self._record(step, x, y, car_ids, swap)
+
+    @staticmethod
+    def _collect(connections: list, barrier) -> list:
+        """Gather the collision records of every shard, raising if one failed."""
+        records = []
+        errors = []
+        pending = list(connections)
+        while pending:
+            for connection in wait(pending):
+                pending.remove(connection)
+                try:
+                    error, shard_records = connection.recv()
+                except EOFError:
+                    error, shard_records = "shard process exited unexpectedly", None
+                    barrier.abort()
+                connection.close()
+                if error is None:
+                    records.extend(shard_records)
+                else:
+                    errors.append(error)
+        if errors:
+            # Report the failure that aborted the other shards
+            errors.sort(key=lambda error: error == "aborted by another shard")
+            raise RuntimeError(f"Sharded run failed: {errors[0]}")
+        return records
@@ -1,9 +1,61 @@
 # simulation/simulation.py
 
-from typing import List
-from .car import Car  # Correct relative import
+import contextlib
+import gc
+import sys
+from collections.abc import Mapping
+from numbers import Integral
+from typing import Dict, Iterator, List, NamedTuple, Tuple
+from .car import Car, COMMAND_FILTER, valid_commands  # Correct relative import
 from .field import Field  # Correct relative import
+from .checkpoint import Checkpoint, obstacle_keys
+from .collisions import CollisionLog, CollisionMessages, render_step
+from .engine import get_engine
+from .grammar import Program, read_commands
+from .history import History, Rerun, rerun
+from .events import Event, EventSink, NullSink, PrintSink, CAR_ADDED, COLLISION
+from .occupancy import OccupancyIndex
+from .stats import Stats, NO_TIMER
 from car_simulation.utils.logger import Logger
+
+
+class StepSnapshot(NamedTuple):
+    """
+        What changed during one step, as yielded by Simulation.iter_steps.
+
+        Attributes:
+            step : int          -> The step.
+            moved : list        -> (car id, x, y) of every car whose cell changed.
+            collisions : list   -> Collision messages recorded during the step.
+            active_count : int  -> Active cars after the step.
+    """
+    step: int
+    moved: List[Tuple[int, int, int]]
+    collisions: List[str]
+    active_count: int
+
+
+# Columns accepted by Simulation.add_cars, in row order
+CAR_COLUMNS = ('name', 'x', 'y', 'direction', 'commands')
+# Invalid rows quoted in an InvalidCarsError message
+QUOTED_ERRORS = 10
+
+
+class InvalidCarsError(ValueError):
+    """
+        Raised by Simulation.add_cars when rows fail validation.
+
+        Attributes:
+            errors : list -> (row index, message) of every invalid row.
+    """
+
+    def __init__(self, errors: List[Tuple[int, str]]):
+        self.errors = errors
+        quoted = '; '.join(f"row {row}: {message}" for row, message in errors[:QUOTED_ERRORS])
+        more = f" (and {len(errors) - QUOTED_ERRORS} more)" if len(errors) > QUOTED_ERRORS else ''
+        super().__init__(f"{len(errors)} invalid cars: {quoted}{more}")
+
+
 class Simulation:
 
     """
@@ -13,13 +65,58 @@ class Simulation:
             field : Field -> The field on which the simulation runs.
             cars : list   -> The list of cars in the simulation.
             stopped_cars : set  -> The set of cars that have stopped.
-            collisions : List The collisions messages 
-            
+            collision_log : CollisionLog -> One record (step, cell, car ids) per cell where
+                                 cars collided; see collisions.py.
+            collisions : CollisionMessages -> The collision messages, rendered from
+                                 collision_log when they are read.
+            engine : type -> The stepping engine class ('python', 'numpy', 'event' or 'sharded').
+            verbose : bool -> Print progress messages and the results of a run.
+            events : EventSink -> Receives car, move and collision events; a PrintSink
+                                  by default, a NullSink when not verbose.
+            workers : int -> Worker processes for the 'sharded' engine (default: CPU count).
+            occupancy : OccupancyIndex -> Cell -> car id index of the active cars,
+                                          updated incrementally by check_collision.
+            recorder : Recorder -> Optional trajectory recorder, fed after every step.
+            step : int -> The next step to run; a run stopped early through iter_steps
+                          resumes from it, a completed run resets it to 0.
+            car_ids : dict -> Car name -> index in cars, for O(1) duplicate checks and
+                              get_car; maintained by add_car and add_cars.
+            stats : Stats -> Per-phase timers and counters, accumulated over runs; None
+                             (the default) disables instrumentation. Pass stats=True or
+                             a Stats, which may also profile runs with cProfile and
+                             tracemalloc.
+            swept : bool -> Also detect cars that swap cells during a step (passing
+                            through each other), which end-position checks miss.
+            history : History -> Snapshots of the last run, kept every history.interval
+                                 steps so that rerun() only recomputes what changes to
+                                 the cars affect; None (the default) keeps none. Pass
+                                 history=True, a number of steps or a History.
     """
-    def __init__(self, field: Field):
+    def __init__(self, field: Field, engine: str = 'python', verbose: bool = True, workers: int = None,
+                 events: EventSink = None, recorder=None, stats=None, swept: bool = False, history=None):
         self.field: Field = field
+        self.engine = get_engine(engine)
+        self.verbose = verbose
+        if events is None:
+            events = PrintSink() if verbose else NullSink()
+        self.events = events
+        self.recorder = recorder
+        if stats is True:
+            stats = Stats()
+        self.stats = stats or None
+        self.workers = workers
+        self.swept = swept
+        if history is True:
+            history = History()
+        elif history and not isinstance(history, History):
+            history = History(history)
+        self.history = history or None
         self.cars: List[Car] = []
-        self.collisions: List[str] = []  # Store collision messages
+        self.car_ids: Dict[str, int] = {}
+        self.collision_log = CollisionLog()
+        self.occupancy = OccupancyIndex()
+        self.step = 0
+        self._checkpoint = None
         self.stopped_cars = set()     
         self.boundary_collisions = set()
         self.logger = Logger.setup_logger('Simulation')
@@ -32,11 +129,166 @@ class Simulation:
         except Exception as e:
             print(f"Error adding car {car.name}: {e}")
             """
-        """Add a car to the simulation with bounds checking."""
+        """Add a car to the simulation with bounds and duplicate name checking."""
         if not self.field.within_bounds(car.x, car.y):
             raise ValueError("Car position is out of bounds")
+        if not self.field.can_enter(car.x, car.y):
+            raise ValueError("Car position is blocked by an obstacle")
+        if car.name in self.car_ids:
+            raise ValueError("Car name must be unique; it already exists.")
+        if type(car.name) is str:
+            car.name = sys.intern(car.name)
+        car.events = self.events
+        self.car_ids[car.name] = len(self.cars)
         self.cars.append(car)
-        print(f"{car.name} added to the simulation.")
+        if self.events.enabled:
+            self.events.emit(Event(CAR_ADDED, car.name, car.x, car.y))
+
+    def add_cars(self, cars) -> int:
+        """
+        Add many cars at once, validating them in batch.
+
+        Names, directions, command strings and positions are checked for
+        the whole batch before any car is created, and the cars are then
+        built without the per-car validation of Car.__init__.
+
+        Args:
+            cars: Rows of (name, x, y, direction, commands), or a mapping of
+                those five columns (see CAR_COLUMNS) holding lists or NumPy
+                arrays.
+
+        Returns:
+            int: The number of cars added.
+
+        Raises:
+            InvalidCarsError: Listing every invalid row; no car is added.
+        """
+        if isinstance(cars, Mapping):
+            columns = [cars[column] for column in CAR_COLUMNS]
+            count = len(columns[0])
+            if any(len(column) != count for column in columns):
+                raise ValueError("add_cars columns must all have the same length")
+            errors = {}
+        else:
+            rows = cars if isinstance(cars, list) else list(cars)
+            count = len(rows)
+            errors = {row: f"expected {len(CAR_COLUMNS)} values, got {len(values)}"
+                      for row, values in enumerate(rows) if len(values) != len(CAR_COLUMNS)}
+            if errors:
+                raise InvalidCarsError(sorted(errors.items()))
+            columns = list(zip(*rows)) if rows else [()] * len(CAR_COLUMNS)
+        outside = self._outside(*columns[1:3])
+        names, xs, ys, directions, commands = (
+            column.tolist() if hasattr(column, 'tolist') else column for column in columns)
+
+        for row in outside:
+            errors[row] = "Car position is out of bounds"
+        if self.field.obstacles is not None:
+            for row in self._blocked(*columns[1:3], outside):
+                errors[row] = "Car position is blocked by an obstacle"
+        self._validate_rows(errors, names, directions, commands)
+        car_ids = self.car_ids
+        start = len(self.cars)
+        try:
+            names = list(map(sys.intern, names))
+            index = dict(zip(names, range(start, start + count)))
+        except TypeError:
+            # Invalid names, already reported
+            index = {}
+        if len(index) != count or not car_ids.keys().isdisjoint(index):
+            seen = set(car_ids)
+            for row, name in enumerate(names):
+                if not isinstance(name, str):
+                    continue
+                if name in seen:
+                    errors.setdefault(row, "Car name must be unique; it already exists.")
+                seen.add(name)
+        if errors:
+            raise InvalidCarsError(sorted(errors.items()))
+
+        trusted = Car.trusted
+        events = self.events
+        collecting = gc.isenabled()
+        # A million new objects would trigger many pointless full collections
+        gc.disable()
+        try:
+            added = [trusted(*row) for row in zip(names, xs, ys, directions, commands)]
+            car_ids.update(index)
+            for car in added:
+                car.events = events
+        finally:
+            if collecting:
+                gc.enable()
+        self.cars.extend(added)
+        if events.enabled:
+            for car in added:
+                events.emit(Event(CAR_ADDED, car.name, car.x, car.y))
+        return count
+
+    def _outside(self, xs, ys) -> list:
+        """Return the rows whose position is not an integer cell of the field."""
+        width, height = self.field.width, self.field.height
+        if hasattr(xs, 'dtype') and hasattr(ys, 'dtype') and xs.dtype.kind in 'iu' and ys.dtype.kind in 'iu':
+            # NumPy columns: one vectorised comparison
+            import numpy as np
+            return np.flatnonzero((xs < 0) | (xs >= width) | (ys < 0) | (ys >= height)).tolist()
+        if xs and set(map(type, xs)) == {int} and set(map(type, ys)) == {int}:
+            if min(xs) >= 0 and max(xs) < width and min(ys) >= 0 and max(ys) < height:
+                return []
+        return [row for row, (x, y) in enumerate(zip(xs, ys))
+                if not (isinstance(x, Integral) and isinstance(y, Integral)
+                        and 0 <= x < width and 0 <= y < height)]
+
+    def _blocked(self, xs, ys, outside: list) -> list:
+        """Return the rows, among those inside the field, whose cell is blocked."""
+        obstacles = self.field.obstacles
+        if hasattr(xs, 'dtype') and hasattr(ys, 'dtype') and not outside:
+            import numpy as np
+            return np.flatnonzero(obstacles.blocked(xs.astype(np.int64) * self.field.height + ys)).tolist()
+        skip = set(outside)
+        is_blocked = obstacles.is_blocked
+        return [row for row, (x, y) in enumerate(zip(xs, ys)) if row not in skip and is_blocked(x, y)]
+
+    def _validate_rows(self, errors: dict, names, directions, commands) -> None:
+        """Record the first problem of every invalid row in errors.
+
+        Each column is first checked as a whole; rows are only scanned one
+        by one when the column holds an invalid value.
+        """
+        if not (set(map(type, names)) <= {str} and all(map(str.isalnum, names))):
+            for row, name in enumerate(names):
+                if not (isinstance(name, str) and name.isalnum()):
+                    errors.setdefault(row, Car.validate_car_name(name, [])[1])
+        if not (set(map(type, directions)) <= {str} and set(directions) <= set(Car.DIRECTIONS)):
+            for row, direction in enumerate(directions):
+                if direction not in Car.DIRECTIONS:
+                    errors.setdefault(row, f"Invalid direction {direction!r}.")
+        # Command strings are usually shared between many cars: check each once.
+        # Programs only hold valid commands
+        programs = set(commands) if set(map(type, commands)) <= {str, Program} else None
+        if programs is None or any(type(program) is str and program.translate(COMMAND_FILTER)
+                                   for program in programs):
+            for row, program in enumerate(commands):
+                # Lists of commands are checked as add_car checks them
+                try:
+                    valid = valid_commands(program)
+                except TypeError:
+                    valid = False
+                if not valid:
+                    errors.setdefault(row, "Invalid command found in command string")
+
+    def get_car(self, name: str) -> Car:
+        """Return the car with the given name, raising KeyError if there is none."""
+        try:
+            return self.cars[self.car_ids[name]]
+        except KeyError:
+            raise KeyError(f"No car named {name!r}") from None
+
+    @staticmethod
+    def run_many(scenarios, workers: int = None, engine: str = 'python', ordered: bool = True):
+        """Run independent scenarios on a process pool; see runner.run_many."""
+        from .runner import run_many
+        return run_many(scenarios, workers=workers, engine=engine, ordered=ordered)
 
     def print_car_list(self) -> None:
         """Print the list of cars in the simulation."""
@@ -45,39 +297,302 @@ class Simulation:
             print(f"- {car}")
 
 
-    def check_collision(self, step: int) -> None:
-        """Check if any cars have collided and deactivate them."""
+    def check_collision(self, step: int, moved: list = None) -> None:
+        """Check if any cars have collided and deactivate them.
+
+        Args:
+            step (int): The step being checked, used in the collision messages.
+            moved (list): Optional (car id, old cell) pairs of the cars whose cell
+                changed this step. When given, only those cells are checked against
+                the occupancy index; otherwise the index is rebuilt from all cars.
+        """
         try:
-            positions = {}
-            for car in self.cars:
-                if car.active:
-                    pos = (car.x, car.y)
-                    if pos in positions:
-                        # Collision detected
-                        collision_msg_a = f"{car.name} collides with {positions[pos].name} at ({pos[0]},{pos[1]}) at step {step}"
-                        collision_msg_b = f"{positions[pos].name} collides with {car.name} at ({pos[0]},{pos[1]}) at step {step}"
-                        self.collisions.append(collision_msg_a)
-                        self.collisions.append(collision_msg_b)
-                        car.active = False
-                        positions[pos].active = False
-                    else:
-                        positions[pos] = car
+            if moved is None:
+                self._check_all_cars(step)
+            else:
+                self._check_moved_cars(step, moved)
         except Exception as e:
             print(f"Error checking collisions at step {step}: {e}")
 
+    def _check_all_cars(self, step: int) -> None:
+        positions = {}
+        pileups = {}
+        for car_id, car in enumerate(self.cars):
+            if car.active:
+                pos = (car.x, car.y)
+                first = positions.setdefault(pos, car_id)
+                if first != car_id:
+                    # Collision detected
+                    pileups.setdefault(pos, [first]).append(car_id)
+        # Cells are found in the order of their first newcomer
+        for (x, y), car_ids in pileups.items():
+            self._collide(step, x, y, car_ids)
+        self.occupancy.clear()
+        for pos, car_id in positions.items():
+            if pos not in pileups:
+                self.occupancy.place(pos, car_id)
+
+    def _check_moved_cars(self, step: int, moved: list) -> None:
+        cars = self.cars
+        contested = self.occupancy.move(
+            (car_id, old_cell, (cars[car_id].x, cars[car_id].y)) for car_id, old_cell in moved)
+        if not contested:
+            return
+        # The first car (in list order) of each cell, then its newcomers,
+        # reported in the order a scan over all cars would find them
+        pileups = []
+        for cell, car_ids in contested.items():
+            car_ids.sort()
+            pileups.append((car_ids[1], cell, car_ids))
+        pileups.sort()
+        for _, (x, y), car_ids in pileups:
+            self._collide(step, x, y, car_ids)
+
+    def _collide(self, step: int, x: int, y: int, car_ids: list) -> None:
+        cars = self.cars
+        for car_id in car_ids:
+            cars[car_id].active = False
+        self.record_pileup(step, x, y, car_ids)
+
+    def check_swaps(self, step: int, moved: list) -> None:
+        """
+        Deactivate the cars that swapped cells during the step (swept collisions).
+
+        Each move is hashed as its directed edge (old cell, new cell); two cars
+        swapped if one crossed the reverse edge of the other, so the check is
+        O(len(moved)). A swap is recorded after the pileups of the step, at the
+        cell the lower-id car moved to, ordered by that car.
+
+        Args:
+            step (int): The step being checked.
+            moved (list): (car id, old cell) of every car whose cell changed.
+        """
+        cars = self.cars
+        edges = {}
+        for car_id, old_cell in moved:
+            car = cars[car_id]
+            edges[(old_cell, (car.x, car.y))] = car_id
+        swaps = []
+        for (old_cell, new_cell), car_id in edges.items():
+            other = edges.get((new_cell, old_cell))
+            if other is not None and car_id < other:
+                swaps.append((car_id, other, new_cell))
+        swaps.sort()
+        for car_id, other, (x, y) in swaps:
+            for swapped in (car_id, other):
+                car = cars[swapped]
+                car.active = False
+                self.occupancy.release((car.x, car.y), swapped)
+            self.record_pileup(step, x, y, (car_id, other), swap=True)
+
+    def record_pileup(self, step: int, x: int, y: int, car_ids, swap: bool = False) -> None:
+        """
+        Record that the given cars collided on (x, y).
+
+        Args:
+            car_ids: Ids (indexes in cars) of the car that held the cell first
+                and of the newcomers, in increasing order.
+            swap: True if the two cars swapped cells (see check_swaps).
+        """
+        cars = self.cars
+        self.collision_log.add(step, x, y, car_ids, swap)
+        if self.events.enabled:
+            first = cars[car_ids[0]].name
+            for car_id in car_ids[1:]:
+                self.events.emit(Event(COLLISION, cars[car_id].name, x, y, step, first))
+        if self.stats is not None:
+            self.stats.counters['collisions'] += len(car_ids) - 1
+
+    def record_collision(self, step: int, car: Car, other: Car, x: int, y: int) -> None:
+        """Record that car ran into other, which already occupied (x, y)."""
+        self.record_pileup(step, x, y, (self.car_ids[other.name], self.car_ids[car.name]))
+
+    @property
+    def collisions(self) -> CollisionMessages:
+        """The collision messages, two per colliding pair, rendered on access."""
+        return CollisionMessages(self.collision_log, self.cars)
+
+    def max_steps(self) -> int:
+        """Number of steps needed for every car to run out of commands."""
+        return max(len(car.commands) for car in self.cars) if self.cars else 0
+
+    def iter_steps(self) -> Iterator[StepSnapshot]:
+        """
+        Run the simulation lazily, one step per iteration.
+
+        The car objects are updated when the generator finishes or is closed,
+        so a consumer may stop early (on the first collision, say) and
+        inspect the cars; iter_steps or run_simulation then resume from the
+        next step. Only the current step's changes are held in memory. It
+        stops once no car can change state, which may be before max_steps().
+
+        Yields:
+            StepSnapshot: The cars that moved, the new collisions and the
+            number of active cars after each step.
+        """
+        with contextlib.closing(self._steps()) as steps:
+            for engine, step, moved, recorded in steps:
+                collisions = [message for records, swaps in self.collision_log.step_records(recorded)
+                              for message in render_step(records, swaps, self.cars)]
+                yield StepSnapshot(step, engine.positions(moved), collisions, engine.active_count())
+
+    def _steps(self):
+        """Step a new engine one step at a time from self.step, feeding the
+        recorder and the history.
+
+        Yields the engine, the step, the cars that moved and the number of
+        collision records before the step.
+        """
+        max_steps = self.max_steps()
+        with self._phase('setup'):
+            engine = self.engine(self)
+        recorder = self.recorder
+        if recorder is not None and not recorder.started:
+            recorder.begin(self, engine.state())
+        history = self.history
+        if history is not None and not history.running:
+            # A completed history is only brought up to date by rerun()
+            history = None if history.complete else history
+            if history is not None:
+                history.begin(engine.snapshot(self.step), self.cars)
+        try:
+            end = max(self.step, max_steps)
+            for step in range(self.step, max_steps):
+                # Step 0 also catches cars sharing a cell that have no commands
+                if step and engine.done():
+                    end = step
+                    break
+                recorded = len(self.collision_log)
+                moved = engine.step(step)
+                self.step = step + 1
+                if recorder is not None:
+                    recorder.record(engine.state())
+                if history is not None and history.due(step + 1):
+                    history.add(engine.snapshot(step + 1))
+                yield engine, step, moved, recorded
+            self.step = 0
+            if history is not None:
+                history.finish(engine.snapshot(end))
+        finally:
+            with self._phase('finish'):
+                engine.finish()
+            if recorder is not None:
+                recorder.flush()
+
+    def _phase(self, phase: str):
+        """Context manager timing a phase of a run when stats are enabled."""
+        return NO_TIMER if self.stats is None else self.stats.timer(phase)
+
     def run_simulation(self) -> None:
         """Run the simulation step-by-step, executing each car's commands."""
         try:
-            max_steps = max(len(car.commands) for car in self.cars) if self.cars else 0
-            for step in range(max_steps):
-                for car in self.cars:
-                    car.execute_command(self.field)
-                self.check_collision(step)
-            self.print_results()
+            self.run()
             
         except Exception as e:
             print(f"Error during simulation: {e}")
 
+    def run(self) -> None:
+        """Run the simulation like run_simulation, but let errors propagate."""
+        with (NO_TIMER if self.stats is None else self.stats.capture()):
+            self._run()
+        if self.verbose:
+            with self._phase('output'):
+                self.print_results()
+
+    def _run(self) -> None:
+        if self.recorder is None and self.history is None:
+            with self._phase('setup'):
+                engine = self.engine(self)
+            with self._phase('run'):
+                engine.run(self.max_steps(), self.step)
+            with self._phase('finish'):
+                engine.finish()
+            self.step = 0
+        else:
+            # Recording and snapshots need the state after every step
+            with self._phase('run'):
+                for _ in self._steps():
+                    pass
+
+    def rerun(self) -> Rerun:
+        """
+        Bring the results of the last run up to date after cars were added
+        or their commands changed (Car.set_commands), as if the simulation
+        had been run again from its first step.
+
+        Only the steps from the earliest one where a changed car could meet
+        another car are recomputed, and only for the cars the changes can
+        reach; see history.py. No events are emitted and stats are not
+        updated.
+
+        Returns:
+            Rerun: The step the re-simulation started from and the number
+            of cars re-simulated and kept.
+
+        Raises:
+            ValueError: If the simulation has no history of a completed run.
+        """
+        return rerun(self)
+
+    def checkpoint(self, path: str) -> None:
+        """
+        Save the field, the cars, the collisions and the next step to a file.
+
+        Saving to the same file again only rewrites the cars that changed and
+        appends the new collisions. Call it between runs: after run_simulation
+        or once an iter_steps generator has been closed.
+
+        Args:
+            path (str): The checkpoint file.
+        """
+        if self._checkpoint is None or self._checkpoint.path != path:
+            self._checkpoint = Checkpoint(path)
+        self._checkpoint.save(self)
+
+    @classmethod
+    def restore(cls, path: str, engine: str = 'python', verbose: bool = True, obstacles=None,
+                **options) -> 'Simulation':
+        """
+        Create a simulation from a checkpoint file; running it carries on
+        exactly where the checkpointed simulation left off.
+
+        Args:
+            path (str): The checkpoint file.
+            engine, verbose, options: As for Simulation().
+            obstacles: Optional; the obstacles the checkpointed field is expected to
+                have (field.obstacles, or anything Field accepts). The field gets
+                the obstacles stored in the checkpoint either way.
+
+        Returns:
+            Simulation: The restored simulation. Later checkpoints to the same
+            path are incremental.
+
+        Raises:
+            ValueError: If obstacles are given and differ from the stored ones.
+        """
+        checkpoint = Checkpoint(path)
+        data = checkpoint.load()
+        if obstacles is not None:
+            expected = Field(data.width, data.height, obstacles).obstacles
+            if obstacle_keys(expected) != obstacle_keys(data.obstacles):
+                raise ValueError("The obstacles differ from those stored in the checkpoint")
+        simulation = cls(Field(data.width, data.height, data.obstacles), engine=engine, verbose=verbose,
+                         **options)
+        events = simulation.events
+        for name, x, y, direction, commands, command_index, active in data.cars:
+            car = Car(name, x, y, direction, read_commands(commands))
+            car.command_index = command_index
+            car.active = active
+            car.events = events
+            simulation.car_ids[car.name] = len(simulation.cars)
+            simulation.cars.append(car)
+        for record, swap in zip(data.collisions, data.swaps):
+            simulation.collision_log.add(*record, swap)
+        simulation.step = data.step
+        checkpoint.attach(simulation.collision_log)
+        simulation._checkpoint = checkpoint
+        return simulation
+
     def print_results(self) -> None:
         """Print the final positions of all cars after simulation."""
         print("\nAfter simulation, the result is:")
@@ -98,6 +613,13 @@ class Simulation:
     
     def reset(self):
         self.cars = []
+        self.car_ids = {}
         self.boundary_collisions.clear()
         self.stopped_cars.clear()
-        self.collisions.clear()
+        self.collision_log.clear()
+        self.occupancy.clear()
+        self.step = 0
+        # The next checkpoint starts a new file
+        self._checkpoint = None
+        if self.history is not None:
+            self.history.clear()
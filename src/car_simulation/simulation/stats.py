@@ -0,0 +1,110 @@
+# simulation/stats.py
+
+import contextlib
+import cProfile
+import time
+import tracemalloc
+from array import array
+from collections import defaultdict
+
+# Context manager used for phases when instrumentation is off
+NO_TIMER = contextlib.nullcontext()
+
+
+class Stats:
+    """
+        Opt-in instrumentation of a simulation run (Simulation(stats=True)).
+
+        Timers (cumulative seconds):
+            setup       creating the engine
+            run         the whole stepping loop, including the phases below
+            execute     executing commands, boundary checks included
+            collisions  collision detection
+            plan        choosing windows (event engine)
+            advance     advancing cars through a window (event engine)
+            finish      writing the engine state back to the cars
+            output      printing the results
+        Counters:
+            steps, commands (commands executed), blocked_moves, collisions.
+        The number of active cars is sampled after every step an engine runs
+        on its own; the event engine samples once per window, the sharded
+        engine only reports the run timer and collisions.
+
+        Attributes:
+            timers : dict         -> Phase -> cumulative seconds.
+            counters : dict       -> Counter -> total.
+            active_steps : array  -> Steps at which active cars were sampled.
+            active_cars : array   -> Active cars after each of those steps.
+            profile : str         -> If set, a cProfile of each run is dumped here.
+            memory : str          -> If set, a tracemalloc snapshot of each run is
+                                     dumped here and peak_memory is recorded.
+            peak_memory : int     -> Peak traced memory of the last run, in bytes.
+    """
+
+    def __init__(self, profile: str = None, memory: str = None):
+        self.profile = profile
+        self.memory = memory
+        self.timers = defaultdict(float)
+        self.counters = defaultdict(int)
+        self.active_steps = array('q')
+        self.active_cars = array('q')
+        self.peak_memory = None
+
+    @contextlib.contextmanager
+    def timer(self, phase: str):
+        """Add the time spent in the with block to the phase's timer."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timers[phase] += time.perf_counter() - started
+
+    def count(self, counter: str, amount: int = 1) -> None:
+        self.counters[counter] += amount
+
+    def sample_active(self, step: int, count: int) -> None:
+        self.active_steps.append(step)
+        self.active_cars.append(count)
+
+    @contextlib.contextmanager
+    def capture(self):
+        """Run the with block under cProfile and tracemalloc, as configured."""
+        profiler = cProfile.Profile() if self.profile else None
+        tracing = self.memory and not tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.start()
+            tracemalloc.reset_peak()
+        if profiler is not None:
+            profiler.enable()
+        try:
+            yield
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                profiler.dump_stats(self.profile)
+            if self.memory and tracemalloc.is_tracing():
+                self.peak_memory = tracemalloc.get_traced_memory()[1]
+                tracemalloc.take_snapshot().dump(self.memory)
+                if tracing:
+                    tracemalloc.stop()
+
+    def reset(self) -> None:
+        self.timers.clear()
+        self.counters.clear()
+        self.active_steps = array('q')
+        self.active_cars = array('q')
+        self.peak_memory = None
+
+    def as_dict(self) -> dict:
+        """Return the timers, counters and samples as plain data."""
+        return {
+            'timers': dict(self.timers),
+            'counters': dict(self.counters),
+            'active_cars': list(zip(self.active_steps, self.active_cars)),
+            'peak_memory': self.peak_memory,
+        }
+
+    def __repr__(self) -> str:
+        timers = ', '.join(f"{phase}={seconds:.4f}s" for phase, seconds in self.timers.items())
+        counters = ', '.join(f"{name}={value}" for name, value in self.counters.items())
+        return f"Stats({timers}; {counters})"
@@ -1,11 +1,26 @@
+import atexit
 import logging
-from config.config import Config
+import logging.handlers
+import queue
+from car_simulation.config.config import Config
+
+# Set once Logger.stop_queue is registered to run at exit
+_stop_registered = False
 
 
 class Logger:
     """
     Class to handle logging setup and configuration.
+
+    Loggers are configured once and cached: every logger shares a single
+    handler, attached the first time its name is set up. With
+    Config.LOGGING_QUEUE (or after use_queue) that handler is a QueueHandler
+    and a QueueListener thread does the formatting and terminal or disk I/O,
+    so code logging from the stepping loop never blocks on it.
     """
+    _loggers = {}
+    _handler = None
+    _listener = None
 
     @staticmethod
     def setup_logger(name: str):
@@ -18,10 +33,69 @@ class Logger:
         Returns:
             logger (logging.Logger): Configured logger instance.
         """
-        logger = logging.getLogger(name)
-        handler = logging.StreamHandler()
-        formatter = Config.LOGGING_FORMAT
-        handler.setFormatter(formatter)
-        logger.addHandler(handler)
-        logger.setLevel(Config.LOGGING_LEVEL)
+        logger = Logger._loggers.get(name)
+        if logger is None:
+            logger = logging.getLogger(name)
+            logger.addHandler(Logger._shared_handler())
+            logger.setLevel(Config.LOGGING_LEVEL)
+            Logger._loggers[name] = logger
         return logger
+
+    @staticmethod
+    def _shared_handler() -> logging.Handler:
+        """Return the handler shared by all configured loggers, creating it once."""
+        if Logger._handler is None:
+            if Config.LOGGING_QUEUE:
+                Logger.use_queue()
+            else:
+                Logger._handler = Logger._stream_handler()
+        return Logger._handler
+
+    @staticmethod
+    def _stream_handler() -> logging.Handler:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter(Config.LOGGING_FORMAT))
+        return handler
+
+    @staticmethod
+    def _replace_handler(handler: logging.Handler) -> None:
+        """Swap the shared handler on every configured logger."""
+        for logger in Logger._loggers.values():
+            if Logger._handler is not None:
+                logger.removeHandler(Logger._handler)
+            logger.addHandler(handler)
+        Logger._handler = handler
+
+    @staticmethod
+    def use_queue(*handlers: logging.Handler) -> logging.handlers.QueueListener:
+        """
+        Route the records of every configured logger through a queue.
+
+        Args:
+            handlers: Handlers the listener thread passes records to; a
+                stream handler with Config.LOGGING_FORMAT by default.
+
+        Returns:
+            logging.handlers.QueueListener: The started listener.
+        """
+        Logger.stop_queue()
+        records = queue.SimpleQueue()
+        Logger._listener = logging.handlers.QueueListener(
+            records, *(handlers or (Logger._stream_handler(),)), respect_handler_level=True)
+        Logger._replace_handler(logging.handlers.QueueHandler(records))
+        Logger._listener.start()
+        global _stop_registered
+        if not _stop_registered:
+            atexit.register(Logger.stop_queue)
+            _stop_registered = True
+        return Logger._listener
+
+    @staticmethod
+    def stop_queue() -> None:
+        """Flush the queue and log synchronously again."""
+        listener = Logger._listener
+        if listener is None:
+            return
+        Logger._listener = None
+        listener.stop()
+        Logger._replace_handler(Logger._stream_handler())
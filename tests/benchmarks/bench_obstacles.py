@@ -0,0 +1,97 @@
+"""
+Obstacle storage backends compared.
+
+For each backend (bit grid and sparse set) and obstacle density, measures
+the memory of the store, the time to load the obstacles, scalar
+Field.can_enter lookups (the python engine's hot path), vectorised
+blocked() checks (the numpy engines') and a numpy engine run, and checks
+that both backends end the run in the same state:
+
+    PYTHONPATH=src python tests/benchmarks/bench_obstacles.py --size 4000 --densities 0.0001 0.01 0.2
+"""
+import argparse
+import random
+import sys
+import time
+
+import numpy as np
+
+from car_simulation.simulation.field import Field
+from car_simulation.simulation.simulation import Simulation
+
+LOOKUPS = 10 ** 6
+
+
+def store_bytes(obstacles) -> int:
+    if obstacles.kind == 'bits':
+        return sys.getsizeof(obstacles.bits)
+    return sys.getsizeof(obstacles.cellset) + len(obstacles.cellset) * 32
+
+
+def bench(storage, size, cells, rows, probes):
+    started = time.perf_counter()
+    field = Field(size, size, cells, storage)
+    load = time.perf_counter() - started
+
+    can_enter = field.can_enter
+    points = probes.tolist()
+    started = time.perf_counter()
+    for x, y in points:
+        can_enter(x, y)
+    scalar = time.perf_counter() - started
+
+    keys = probes[:, 0] * size + probes[:, 1]
+    started = time.perf_counter()
+    field.obstacles.blocked(keys)
+    vector = time.perf_counter() - started
+
+    simulation = Simulation(field, engine='numpy', verbose=False)
+    simulation.add_cars(rows)
+    started = time.perf_counter()
+    simulation.run_simulation()
+    run = time.perf_counter() - started
+    state = [(car.x, car.y, car.direction, car.active) for car in simulation.cars]
+    return store_bytes(field.obstacles), load, scalar, vector, run, state
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--size', type=int, default=2000)
+    parser.add_argument('--densities', type=float, nargs='+', default=[0.0001, 0.01, 0.2])
+    parser.add_argument('--cars', type=int, default=20000)
+    parser.add_argument('--commands', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    probes = rng.integers(0, args.size, size=(LOOKUPS, 2))
+    print(f"{args.size}x{args.size} field, {args.cars} cars, {args.commands} commands, "
+          f"{LOOKUPS} lookups")
+    print(f"{'backend':8} {'density':>8} {'obstacles':>10} {'memory MB':>10} {'load s':>8} "
+          f"{'scalar ns':>10} {'vector ns':>10} {'run s':>8}")
+    for density in args.densities:
+        count = int(args.size * args.size * density)
+        cells = np.unique(rng.integers(0, args.size * args.size, size=count))
+        cells = np.stack((cells // args.size, cells % args.size), axis=1)
+        blocked = set((cells[:, 0] * args.size + cells[:, 1]).tolist())
+        pick = random.Random(args.seed)
+        programs = [''.join(pick.choice("FFFFLR") for _ in range(args.commands)) for _ in range(64)]
+        starts = set()
+        while len(starts) < args.cars:
+            cell = pick.randrange(args.size * args.size)
+            if cell not in blocked:
+                starts.add(cell)
+        rows = [(f"Car{i}", cell // args.size, cell % args.size, pick.choice("NESW"), pick.choice(programs))
+                for i, cell in enumerate(sorted(starts))]
+        states = []
+        for storage in ('bits', 'sparse'):
+            memory, load, scalar, vector, run, state = bench(storage, args.size, cells, rows, probes)
+            states.append(state)
+            print(f"{storage:8} {density:8.4f} {len(cells):10d} {memory / 2 ** 20:10.2f} {load:8.3f} "
+                  f"{scalar / LOOKUPS * 1e9:10.1f} {vector / LOOKUPS * 1e9:10.1f} {run:8.2f}")
+        if states[0] != states[1]:
+            print("MISMATCH between backends")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""
+Incremental re-simulation against running the scenario again.
+
+Runs a seeded fleet with Simulation(history=...), then edits the commands
+of --edits random cars that did not collide from --at (a fraction of the
+run) on, with --add also adds a car, and times Simulation.rerun against a
+new run of the whole scenario, checking that both give the same results:
+
+    PYTHONPATH=src python tests/benchmarks/bench_rerun.py --cars 5000 --size 300 --commands 1000 --at 0.9
+"""
+import argparse
+import random
+import time
+
+from car_simulation.simulation.car import Car
+from car_simulation.simulation.field import Field
+from car_simulation.simulation.simulation import Simulation
+
+
+def fleet(seed: int, cars: int, size: int, commands: int) -> list:
+    rng = random.Random(seed)
+    programs = [''.join(rng.choice("FFFFLLRR") for _ in range(commands)) for _ in range(64)]
+    cells = rng.sample(range(size * size), cars + 1)
+    return [(f"Car{i}", cell // size, cell % size, rng.choice("NESW"), rng.choice(programs))
+            for i, cell in enumerate(cells)]
+
+
+def build(engine: str, rows: list, size: int, history=None) -> Simulation:
+    simulation = Simulation(Field(size, size), engine=engine, verbose=False, history=history)
+    simulation.add_cars(rows)
+    return simulation
+
+
+def results(simulation: Simulation):
+    return ([(car.x, car.y, car.direction, car.active) for car in simulation.cars], list(simulation.collisions))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--cars', type=int, default=2000)
+    parser.add_argument('--size', type=int, default=200)
+    parser.add_argument('--commands', type=int, default=500)
+    parser.add_argument('--edits', type=int, default=1)
+    parser.add_argument('--at', type=float, default=0.9, help="first edited command, as a fraction of the run")
+    parser.add_argument('--interval', type=int, default=64, help="steps between snapshots")
+    parser.add_argument('--add', action='store_true', help="also add a car after the run")
+    parser.add_argument('--engine', default='python')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rows = fleet(args.seed, args.cars, args.size, args.commands)
+    late = rows.pop()
+    rng = random.Random(args.seed)
+    simulation = build(args.engine, rows, args.size, args.interval)
+    started = time.perf_counter()
+    simulation.run_simulation()
+    recorded = time.perf_counter() - started
+
+    keep = int(args.at * args.commands)
+    # Edits of cars that collided before the edited commands change nothing
+    survivors = [car_id for car_id, car in enumerate(simulation.cars) if car.active]
+    for car_id in rng.sample(survivors, args.edits):
+        name, x, y, direction, commands = rows[car_id]
+        rows[car_id] = (name, x, y, direction, commands[:keep] + ''.join(rng.choice("FLR") for _ in range(20)))
+        simulation.cars[car_id].set_commands(rows[car_id][4])
+    if args.add:
+        late = late[:4] + (late[4][:args.commands // 10],)
+        rows.append(late)
+        simulation.add_car(Car(*late))
+    started = time.perf_counter()
+    report = simulation.rerun()
+    incremental = time.perf_counter() - started
+
+    fresh = build(args.engine, rows, args.size)
+    started = time.perf_counter()
+    fresh.run_simulation()
+    full = time.perf_counter() - started
+    if results(simulation) != results(fresh):
+        raise SystemExit("rerun and a full run disagree")
+    print(f"{args.cars} cars x {args.commands} commands on {args.engine}, "
+          f"{args.edits} edits from command {keep}{' and one new car' if args.add else ''}")
+    print(f"run with history {recorded:8.3f}s")
+    print(f"full run         {full:8.3f}s")
+    print(f"rerun            {incremental:8.3f}s  ({incremental / full:.1%} of a full run: "
+          f"from step {report.start}, {report.cars} cars re-simulated, {report.reused} kept)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+"""
+Loopback load test of the simulation service.
+
+Starts a SimulationService on 127.0.0.1 (or a Unix socket), opens --clients
+connections that each keep --depth jobs in flight until --requests jobs
+have completed, and reports the requests per second and the latency
+percentiles from submission to result. With --spawn N it also runs N of
+the same jobs the old way, one fresh `run-simulation --scenario -` process
+each, for comparison:
+
+    PYTHONPATH=src python tests/benchmarks/bench_service.py --clients 32 --requests 2000 --workers 4 --spawn 20
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+
+from car_simulation.simulation.scenario import Scenario
+from car_simulation.simulation.service import ServiceClient, SimulationService
+
+
+def fleet(seed: int, cars: int, size: int, commands: int) -> Scenario:
+    rng = random.Random(seed)
+    cells = rng.sample(range(size * size), cars)
+    return Scenario(size, size, [(f"Car{i}", cell // size, cell % size, rng.choice("NESW"),
+                                  ''.join(rng.choice("FFFLR") for _ in range(commands)))
+                                 for i, cell in enumerate(cells)])
+
+
+def percentile(values: list, fraction: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+async def client_load(client: ServiceClient, texts: list, depth: int, next_job, latencies: list, args):
+    async def one():
+        while True:
+            index = next_job()
+            if index is None:
+                return
+            started = time.perf_counter()
+            message = await client.run(texts[index % len(texts)], args.engine, args.progress)
+            if message['event'] != 'result':
+                raise RuntimeError(f"Job failed: {message}")
+            latencies.append(time.perf_counter() - started)
+    await asyncio.gather(*(one() for _ in range(depth)))
+
+
+async def load(args, texts: list):
+    service = SimulationService(args.workers, args.max_jobs, args.engine)
+    started = time.perf_counter()
+    await service.start(path=args.socket)
+    warmup = time.perf_counter() - started
+    connect = ({'path': args.socket} if args.socket else dict(zip(('host', 'port'), service.address)))
+    clients = [await ServiceClient.connect(**connect) for _ in range(args.clients)]
+    submitted = iter(range(args.requests))
+    latencies = []
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(*(client_load(client, texts, args.depth, lambda: next(submitted, None),
+                                           latencies, args) for client in clients))
+    finally:
+        elapsed = time.perf_counter() - started
+        for client in clients:
+            await client.close()
+        await service.close()
+    return warmup, elapsed, latencies
+
+
+def spawn(texts: list, count: int, engine: str) -> list:
+    latencies = []
+    for index in range(count):
+        started = time.perf_counter()
+        subprocess.run([sys.executable, '-m', 'car_simulation.main', '--scenario', '-', '--engine', engine],
+                       input=texts[index % len(texts)], capture_output=True, text=True, check=True,
+                       env=dict(os.environ))
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+def report(name: str, latencies: list, elapsed: float):
+    print(f"{name:8} {len(latencies):8d} {len(latencies) / elapsed:10.1f} "
+          f"{statistics.median(latencies) * 1000:9.2f} {percentile(latencies, 0.99) * 1000:9.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--depth', type=int, default=2, help="jobs each client keeps in flight")
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--max-jobs', type=int, default=None)
+    parser.add_argument('--engine', default='python')
+    parser.add_argument('--progress', type=int, default=0)
+    parser.add_argument('--cars', type=int, default=20)
+    parser.add_argument('--size', type=int, default=30)
+    parser.add_argument('--commands', type=int, default=50)
+    parser.add_argument('--socket', help="serve on this Unix socket instead of TCP")
+    parser.add_argument('--spawn', type=int, default=0, help="jobs to run as one process each")
+    args = parser.parse_args()
+
+    texts = ['\n'.join(fleet(seed, args.cars, args.size, args.commands).lines()) for seed in range(16)]
+    warmup, elapsed, latencies = asyncio.run(load(args, texts))
+    print(f"{args.clients} clients x {args.depth} in flight, {args.cars} cars x {args.commands} commands; "
+          f"service started in {warmup:.2f}s")
+    print(f"{'mode':8} {'jobs':>8} {'jobs/s':>10} {'p50 ms':>9} {'p99 ms':>9}")
+    report('service', latencies, elapsed)
+    if args.spawn:
+        started = time.perf_counter()
+        spawned = spawn(texts, args.spawn, args.engine)
+        report('spawn', spawned, time.perf_counter() - started)
+
+
+if __name__ == '__main__':
+    main()
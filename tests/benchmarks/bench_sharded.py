@@ -0,0 +1,60 @@
+"""
+Speedup of the sharded engine against the worker count.
+
+Runs one large random fleet with the numpy engine and with the sharded
+engine for each worker count, checks that every run ends in the same state
+and prints the timings:
+
+    PYTHONPATH=src python tests/benchmarks/bench_sharded.py --cars 1000000 --size 4000
+"""
+import argparse
+import os
+import random
+import time
+
+from car_simulation.simulation.car import Car
+from car_simulation.simulation.field import Field
+from car_simulation.simulation.simulation import Simulation
+
+
+def random_rows(seed, count, size, commands):
+    rng = random.Random(seed)
+    # A few shared command strings keep setup time and memory down
+    programs = [''.join(rng.choice("LRFFFF") for _ in range(commands)) for _ in range(64)]
+    return [(f"Car{i}", rng.randrange(size), rng.randrange(size), rng.choice("NESW"), rng.choice(programs))
+            for i in range(count)]
+
+
+def run(engine, rows, size, workers=None):
+    simulation = Simulation(Field(size, size), engine=engine, verbose=False, workers=workers)
+    simulation.cars = [Car(*row) for row in rows]
+    started = time.perf_counter()
+    simulation.run_simulation()
+    elapsed = time.perf_counter() - started
+    state = [(car.x, car.y, car.direction, car.active) for car in simulation.cars]
+    return elapsed, state, simulation.collisions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--cars', type=int, default=200000)
+    parser.add_argument('--size', type=int, default=2000)
+    parser.add_argument('--commands', type=int, default=200)
+    parser.add_argument('--workers', type=int, nargs='+',
+                        default=[w for w in (1, 2, 4, 8, 16) if w <= (os.cpu_count() or 1)])
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rows = random_rows(args.seed, args.cars, args.size, args.commands)
+    baseline, state, collisions = run('numpy', rows, args.size)
+    print(f"{args.cars} cars, {args.size}x{args.size} field, {args.commands} commands")
+    print(f"numpy        {baseline:8.2f}s")
+    for workers in args.workers:
+        elapsed, sharded_state, sharded_collisions = run('sharded', rows, args.size, workers)
+        identical = sharded_state == state and sharded_collisions == collisions
+        print(f"sharded x{workers:<3} {elapsed:8.2f}s  speedup {baseline / elapsed:5.2f}"
+              f"  {'identical' if identical else 'MISMATCH'}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+"""
+Overhead of swept collision detection.
+
+Runs the same seeded fleet with and without Simulation(swept=True) on each
+engine and reports the run times, the overhead of hashing the movers'
+edges every step, and the collisions found (swaps are only caught when
+swept):
+
+    PYTHONPATH=src python tests/benchmarks/bench_swept.py --cars 20000 --size 400 --commands 200
+"""
+import argparse
+import random
+import time
+
+from car_simulation.simulation.field import Field
+from car_simulation.simulation.simulation import Simulation
+
+
+def fleet(seed: int, cars: int, size: int, commands: int) -> list:
+    rng = random.Random(seed)
+    programs = [''.join(rng.choice("FFFFLR") for _ in range(commands)) for _ in range(64)]
+    cells = rng.sample(range(size * size), cars)
+    return [(f"Car{i}", cell // size, cell % size, rng.choice("NESW"), rng.choice(programs))
+            for i, cell in enumerate(cells)]
+
+
+def run(engine: str, rows: list, size: int, swept: bool):
+    simulation = Simulation(Field(size, size), engine=engine, verbose=False, swept=swept)
+    simulation.add_cars(rows)
+    started = time.perf_counter()
+    simulation.run_simulation()
+    return time.perf_counter() - started, len(simulation.collision_log)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--cars', type=int, default=20000)
+    parser.add_argument('--size', type=int, default=400)
+    parser.add_argument('--commands', type=int, default=200)
+    parser.add_argument('--engines', nargs='+', default=['python', 'numpy', 'event'])
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rows = fleet(args.seed, args.cars, args.size, args.commands)
+    print(f"{args.cars} cars on {args.size}x{args.size}, {args.commands} commands")
+    print(f"{'engine':8} {'plain s':>8} {'swept s':>8} {'overhead':>9} {'records':>8} {'swept':>8}")
+    for engine in args.engines:
+        plain, plain_records = run(engine, rows, args.size, False)
+        swept, swept_records = run(engine, rows, args.size, True)
+        print(f"{engine:8} {plain:8.2f} {swept:8.2f} {(swept / plain - 1) * 100:8.1f}% "
+              f"{plain_records:8d} {swept_records:8d}")
+
+
+if __name__ == '__main__':
+    main()
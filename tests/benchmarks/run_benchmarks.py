@@ -0,0 +1,224 @@
+"""
+Benchmark suite for the simulation engines.
+
+Runs every workload of a suite (see workloads.py) with every engine, each in
+a fresh process so peak memory is measured per case, keeps the best of
+--repeat runs and writes a JSON report with startup time, run time, steps/s,
+car-steps/s and peak RSS. With the python engine it also times Car.execute_command and the full
+Simulation.check_collision scan on their own.
+
+    PYTHONPATH=src python tests/benchmarks/run_benchmarks.py --suite quick --output bench.json
+    PYTHONPATH=src python tests/benchmarks/run_benchmarks.py --compare bench.json
+
+--compare reruns the suite and exits with status 1 if a case got slower
+(throughput or startup) or bigger (peak memory) than the baseline by more
+than --threshold. Timings under NOISE_FLOOR_S are not compared.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+from workloads import Workload, suite
+
+# Largest number of car-steps run per engine, to keep the python engine
+# away from million-car fleets
+BUDGET = {'python': 2 * 10 ** 7, 'numpy': 10 ** 9, 'event': 10 ** 9, 'sharded': 10 ** 9}
+KINDS = ('run', 'execute_command', 'check_collision')
+# Timings shorter than this are too noisy to flag as regressions
+NOISE_FLOOR_S = 0.05
+
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def measure_once(workload: Workload, engine: str, kind: str):
+    """Build and run one case, returning startup and run times, steps and collisions."""
+    from car_simulation.simulation.car import Car
+    from car_simulation.simulation.field import Field
+    from car_simulation.simulation.simulation import Simulation
+
+    started = time.perf_counter()
+    simulation = Simulation(Field(*workload.field_size()), engine=engine, verbose=False)
+    for row in workload.rows():
+        simulation.add_car(Car(*row))
+    startup = time.perf_counter() - started
+
+    started = time.perf_counter()
+    if kind == 'run':
+        # Runs may end before max_steps(); measure() counts the steps run
+        steps = None
+        simulation.run_simulation()
+    elif kind == 'execute_command':
+        field = simulation.field
+        steps = workload.commands
+        for _ in range(steps):
+            for car in simulation.cars:
+                car.execute_command(field)
+    else:
+        steps = 10
+        for step in range(steps):
+            simulation.check_collision(step)
+    elapsed = max(time.perf_counter() - started, 1e-9)
+    return startup, elapsed, steps, len(simulation.collisions) // 2
+
+
+def executed_steps(workload: Workload) -> int:
+    """Count the steps a run of the workload executes, in an untimed run."""
+    from car_simulation.simulation.car import Car
+    from car_simulation.simulation.field import Field
+    from car_simulation.simulation.simulation import Simulation
+
+    # Every engine runs the same steps, so use the fastest one available
+    try:
+        import numpy  # noqa: F401
+        engine = 'numpy'
+    except ImportError:
+        engine = 'python'
+    simulation = Simulation(Field(*workload.field_size()), engine=engine, verbose=False)
+    for row in workload.rows():
+        simulation.add_car(Car(*row))
+    return sum(1 for _ in simulation.iter_steps())
+
+
+def measure(workload: Workload, engine: str, kind: str, repeat: int = 1) -> dict:
+    """Run one case repeat times in this process and return its best metrics."""
+    runs = [measure_once(workload, engine, kind) for _ in range(repeat)]
+    startup = min(run[0] for run in runs)
+    elapsed = min(run[1] for run in runs)
+    _, _, steps, collisions = runs[0]
+    peak_rss = peak_rss_mb()
+    if steps is None:
+        steps = executed_steps(workload)
+    return {
+        'case': f"{workload.name}/{engine}/{kind}",
+        'workload': workload._asdict(),
+        'engine': engine,
+        'kind': kind,
+        'startup_s': startup,
+        'run_s': elapsed,
+        'steps': steps,
+        'steps_per_s': steps / elapsed,
+        'car_steps_per_s': steps * workload.cars / elapsed,
+        'peak_rss_mb': peak_rss,
+        'collisions': collisions,
+        'repeat': repeat,
+    }
+
+
+def run_case(workload: Workload, engine: str, kind: str, repeat: int, timeout: float) -> dict:
+    """Run one case in a child process."""
+    spec = json.dumps({'workload': workload._asdict(), 'engine': engine, 'kind': kind, 'repeat': repeat})
+    try:
+        result = subprocess.run([sys.executable, __file__, '--case', spec], capture_output=True,
+                                text=True, timeout=timeout, env=os.environ)
+    except subprocess.TimeoutExpired:
+        return {'case': f"{workload.name}/{engine}/{kind}", 'error': f"timed out after {timeout}s"}
+    if result.returncode != 0:
+        return {'case': f"{workload.name}/{engine}/{kind}", 'error': result.stderr.strip()[-2000:]}
+    return json.loads(result.stdout)
+
+
+def cases(workloads, engines):
+    for workload in workloads:
+        for engine in engines:
+            if workload.car_steps > BUDGET.get(engine, BUDGET['numpy']):
+                continue
+            for kind in KINDS:
+                if kind != 'run' and engine != 'python':
+                    continue
+                yield workload, engine, kind
+
+
+def compare(results: list, baseline: dict, threshold: float) -> list:
+    """Return a message for every case that regressed against the baseline."""
+    previous = {result['case']: result for result in baseline['results'] if 'error' not in result}
+    regressions = []
+    for result in results:
+        old = previous.get(result['case'])
+        if old is None or 'error' in result:
+            continue
+        checks = ()
+        if max(old['run_s'], result['run_s']) >= NOISE_FLOOR_S:
+            checks += (('car_steps_per_s', old['car_steps_per_s'] / result['car_steps_per_s'] - 1, 'slower'),)
+        if max(old['startup_s'], result['startup_s']) >= NOISE_FLOOR_S:
+            checks += (('startup_s', result['startup_s'] / old['startup_s'] - 1, 'slower startup'),)
+        if result['peak_rss_mb'] and old['peak_rss_mb']:
+            checks += (('peak_rss_mb', result['peak_rss_mb'] / old['peak_rss_mb'] - 1, 'more memory'),)
+        for metric, change, label in checks:
+            if change > threshold:
+                regressions.append(f"{result['case']}: {change:.0%} {label} "
+                                   f"({old[metric]:.4g} -> {result[metric]:.4g} {metric})")
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the simulation engines.")
+    parser.add_argument('--suite', choices=('quick', 'full'), default='quick')
+    parser.add_argument('--engines', nargs='+', default=['python', 'numpy', 'event'])
+    parser.add_argument('--filter', default='', help="only run cases whose name contains this")
+    parser.add_argument('--output', help="write the JSON report to this file")
+    parser.add_argument('--compare', metavar='BASELINE', help="flag regressions against a report")
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help="relative change counted as a regression (default 0.2)")
+    parser.add_argument('--repeat', type=int, default=3, help="runs per case; the best is kept")
+    parser.add_argument('--timeout', type=float, default=1800, help="seconds allowed per case")
+    parser.add_argument('--case', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.case:
+        spec = json.loads(args.case)
+        json.dump(measure(Workload(**spec['workload']), spec['engine'], spec['kind'], spec['repeat']),
+                  sys.stdout)
+        return 0
+
+    results = []
+    for workload, engine, kind in cases(suite(args.suite), args.engines):
+        name = f"{workload.name}/{engine}/{kind}"
+        if args.filter not in name:
+            continue
+        result = run_case(workload, engine, kind, args.repeat, args.timeout)
+        results.append(result)
+        if 'error' in result:
+            print(f"{name:50} ERROR {result['error'].splitlines()[-1] if result['error'] else ''}")
+        else:
+            print(f"{name:50} {result['car_steps_per_s']:12.4g} car-steps/s  "
+                  f"startup {result['startup_s']:7.3f}s  peak {result['peak_rss_mb'] or 0:8.1f} MB")
+
+    try:
+        import numpy
+        numpy_version = numpy.__version__
+    except ImportError:
+        numpy_version = None
+    report = {
+        'meta': {'suite': args.suite, 'python': platform.python_version(), 'numpy': numpy_version,
+                 'platform': platform.platform(), 'cpus': os.cpu_count(), 'time': time.time()},
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=1)
+
+    if args.compare:
+        with open(args.compare) as file:
+            regressions = compare(results, json.load(file), args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            return 1
+        print("No regressions.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,85 @@
+"""
+Seeded synthetic fleets for the benchmark suite (see run_benchmarks.py).
+
+A workload is described by its fleet size, command length, density and
+pattern, and always generates the same cars for the same seed:
+    density  'sparse' fields have about 100 cells per car, 'dense' about 2.
+    pattern  'free' fleets never collide: one car per column, heading north
+             or south, with commands that only move forward or turn around.
+             'heavy' fleets start at random cells with random headings and
+             mostly move forward, so they collide early and often.
+Cars draw their commands from a small pool of programs so that fleets of a
+million cars do not need a million distinct command strings.
+"""
+import math
+import random
+from typing import Iterator, NamedTuple, Tuple
+
+PROGRAMS = 64
+CELLS_PER_CAR = {'sparse': 100, 'dense': 2}
+
+
+class Workload(NamedTuple):
+    cars: int
+    commands: int
+    density: str
+    pattern: str
+    seed: int = 0
+
+    @property
+    def name(self) -> str:
+        return f"{self.pattern}-{self.density}-{self.cars}x{self.commands}"
+
+    @property
+    def car_steps(self) -> int:
+        return self.cars * self.commands
+
+    def field_size(self) -> Tuple[int, int]:
+        area = self.cars * CELLS_PER_CAR[self.density]
+        if self.pattern == 'free':
+            return self.cars, max(2, area // self.cars)
+        side = max(2, math.isqrt(area))
+        return side, side
+
+    def programs(self, rng: random.Random) -> list:
+        if self.pattern == 'free':
+            tokens = ('F', 'F', 'F', 'RR')
+        else:
+            tokens = ('F', 'F', 'F', 'F', 'L', 'R')
+        programs = []
+        for _ in range(PROGRAMS):
+            parts = []
+            length = 0
+            while length < self.commands:
+                token = rng.choice(tokens)
+                parts.append(token)
+                length += len(token)
+            programs.append(''.join(parts)[:self.commands])
+        return programs
+
+    def rows(self) -> Iterator[Tuple[str, int, int, str, str]]:
+        """Yield (name, x, y, direction, commands) for every car."""
+        rng = random.Random(self.seed)
+        width, height = self.field_size()
+        programs = self.programs(rng)
+        for i in range(self.cars):
+            if self.pattern == 'free':
+                yield f"Car{i}", i, rng.randrange(height), rng.choice('NS'), rng.choice(programs)
+            else:
+                yield (f"Car{i}", rng.randrange(width), rng.randrange(height), rng.choice('NESW'),
+                       rng.choice(programs))
+
+
+def suite(name: str) -> list:
+    """Return the workloads of the 'quick' or 'full' suite."""
+    if name == 'quick':
+        sizes = [(10, 1000), (1000, 100), (1000, 1000)]
+    elif name == 'full':
+        sizes = [(10, 10), (10, 100000), (1000, 1000), (100000, 10), (100000, 1000),
+                 (1000000, 10), (1000000, 100)]
+    else:
+        raise ValueError(f"Unknown suite: {name}")
+    return [Workload(cars, commands, density, pattern)
+            for cars, commands in sizes
+            for density in ('sparse', 'dense')
+            for pattern in ('free', 'heavy')]
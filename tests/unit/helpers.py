@@ -0,0 +1,45 @@
+"""Fleets and simulations shared by the engine, recorder, checkpoint and history tests."""
+import random
+from src.car_simulation.simulation.car import Car
+from src.car_simulation.simulation.field import Field
+from src.car_simulation.simulation.simulation import Simulation
+
+
+def random_commands(rng, count, moves="LRFFF"):
+    return ''.join(rng.choice(moves) for _ in range(count))
+
+
+def random_rows(seed, count, width, height=None, max_commands=30, moves="LRFFF", distinct=False):
+    """Rows of count cars on a width x height field (square if height is None), each with
+    up to max_commands commands drawn from moves; distinct gives every car its own cell."""
+    height = width if height is None else height
+    rng = random.Random(seed)
+    cells = iter([divmod(cell, height) for cell in rng.sample(range(width * height), count)]) if distinct else None
+    rows = []
+    for i in range(count):
+        x, y = next(cells) if distinct else (rng.randrange(width), rng.randrange(height))
+        direction = rng.choice("NESW")
+        rows.append((f"Car{i}", x, y, direction, random_commands(rng, rng.randrange(max_commands + 1), moves)))
+    return rows
+
+
+def build_simulation(rows, engine="python", width=12, height=None, **options):
+    """A quiet simulation of rows on a width x height field (square if height is None)."""
+    options.setdefault('verbose', False)
+    simulation = Simulation(Field(width, width if height is None else height), engine=engine, **options)
+    for row in rows:
+        simulation.add_car(Car(*row))
+    return simulation
+
+
+def run_both(rows, engine, width=12, height=None, reference="numpy", **options):
+    """Run rows with the reference engine and with engine, returning both simulations."""
+    expected = build_simulation(rows, reference, width, height, **options)
+    expected.run_simulation()
+    actual = build_simulation(rows, engine, width, height, **options)
+    actual.run_simulation()
+    return expected, actual
+
+
+def final_state(simulation):
+    return [(car.name, car.x, car.y, car.direction, car.command_index, car.active) for car in simulation.cars]
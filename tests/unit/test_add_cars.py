@@ -0,0 +1,127 @@
+import pytest
+from src.car_simulation.simulation.car import Car
+from src.car_simulation.simulation.events import BufferedSink
+from src.car_simulation.simulation.field import Field
+from src.car_simulation.simulation.simulation import Simulation, InvalidCarsError
+
+ROWS = [("A", 1, 2, 'N', "FFRFFFFRRL"), ("B", 7, 8, 'W', "FFLFFFFFFF"), ("C", 0, 0, 'E', "FFFFLFF")]
+
+
+def state(simulation):
+    return [(car.name, car.x, car.y, car.direction, car.commands, car.command_index, car.active)
+            for car in simulation.cars]
+
+
+def test_add_cars_matches_add_car():
+    expected = Simulation(Field(10, 10), verbose=False)
+    for row in ROWS:
+        expected.add_car(Car(*row))
+    actual = Simulation(Field(10, 10), verbose=False)
+    assert actual.add_cars(iter(ROWS)) == 3
+    assert state(actual) == state(expected)
+    expected.run_simulation()
+    actual.run_simulation()
+    assert state(actual) == state(expected)
+    assert actual.collisions == expected.collisions
+
+
+def test_add_cars_from_columns():
+    simulation = Simulation(Field(10, 10), verbose=False)
+    columns = {'name': ["A", "B"], 'x': [1, 7], 'y': [2, 8], 'direction': ['N', 'W'], 'commands': ["F", "L"]}
+    simulation.add_cars(columns)
+    assert [(car.name, car.x, car.y) for car in simulation.cars] == [("A", 1, 2), ("B", 7, 8)]
+
+
+def test_add_cars_from_numpy_columns():
+    np = pytest.importorskip("numpy")
+    simulation = Simulation(Field(10, 10), verbose=False)
+    columns = {'name': np.array(["A", "B"]), 'x': np.array([1, 7]), 'y': np.array([2, 8]),
+               'direction': np.array(['N', 'W']), 'commands': np.array(["F", "L"])}
+    simulation.add_cars(columns)
+    assert [(car.name, car.x, car.y, car.direction) for car in simulation.cars] == [("A", 1, 2, 'N'), ("B", 7, 8, 'W')]
+    assert type(simulation.cars[0].x) is int
+
+    columns['name'] = np.array(["C", "D"])
+    columns['x'] = np.array([1, 10])
+    with pytest.raises(InvalidCarsError) as error:
+        simulation.add_cars(columns)
+    assert error.value.errors == [(1, "Car position is out of bounds")]
+
+
+def test_add_cars_reports_every_invalid_row():
+    simulation = Simulation(Field(10, 10), verbose=False)
+    rows = [("A", 1, 2, 'N', "FF"), ("B!", 1, 3, 'N', "FF"), ("C", 10, 0, 'N', "FF"),
+            ("D", 1, 4, 'X', "FF"), ("E", 1, 5, 'N', "FXF"), ("", 1, 6, 'N', "F")]
+    with pytest.raises(InvalidCarsError) as error:
+        simulation.add_cars(rows)
+    assert [row for row, _ in error.value.errors] == [1, 2, 3, 4, 5]
+    assert isinstance(error.value, ValueError)
+    assert "5 invalid cars" in str(error.value)
+    assert simulation.cars == []
+
+
+def test_add_cars_accepts_command_lists():
+    rows = [("A", 1, 2, 'N', list("FFRF")), ("B", 7, 8, 'W', "FFLF")]
+    expected = Simulation(Field(10, 10), verbose=False)
+    for row in rows:
+        expected.add_car(Car(*row))
+    actual = Simulation(Field(10, 10), verbose=False)
+    actual.add_cars(rows)
+    assert state(actual) == state(expected)
+    expected.run_simulation()
+    actual.run_simulation()
+    assert state(actual) == state(expected)
+    with pytest.raises(InvalidCarsError) as error:
+        actual.add_cars([("C", 0, 0, 'N', ["F", "X"]), ("D", 0, 1, 'N', 3)])
+    assert [row for row, _ in error.value.errors] == [0, 1]
+
+
+def test_add_cars_rejects_malformed_rows():
+    simulation = Simulation(Field(10, 10), verbose=False)
+    with pytest.raises(InvalidCarsError) as error:
+        simulation.add_cars([("A", 1, 2, 'N', "FF"), ("B", 1, 2, 'N')])
+    assert error.value.errors == [(1, "expected 5 values, got 4")]
+    with pytest.raises(ValueError):
+        simulation.add_cars({'name': ["A"], 'x': [1, 2], 'y': [1], 'direction': ['N'], 'commands': ["F"]})
+
+
+def test_add_cars_rejects_duplicate_names():
+    simulation = Simulation(Field(10, 10), verbose=False)
+    simulation.add_car(Car("A", 0, 0, 'N', "F"))
+    with pytest.raises(InvalidCarsError) as error:
+        simulation.add_cars([("B", 1, 1, 'N', "F"), ("A", 2, 2, 'N', "F"), ("B", 3, 3, 'N', "F")])
+    assert [row for row, _ in error.value.errors] == [1, 2]
+    assert len(simulation.cars) == 1
+    simulation.add_cars([("B", 1, 1, 'N', "F"), ("C", 2, 2, 'N', "F")])
+    assert simulation.get_car("C") is simulation.cars[2]
+    assert simulation.car_ids == {"A": 0, "B": 1, "C": 2}
+
+
+def test_add_car_rejects_duplicate_name():
+    simulation = Simulation(Field(10, 10), verbose=False)
+    simulation.add_car(Car("A", 0, 0, 'N', ""))
+    with pytest.raises(ValueError):
+        simulation.add_car(Car("A", 1, 1, 'N', ""))
+    assert len(simulation.cars) == 1
+
+
+def test_get_car():
+    simulation = Simulation(Field(10, 10), verbose=False)
+    first, second = Car("A", 1, 1, 'N', ""), Car("B", 2, 2, 'N', "")
+    simulation.add_car(first)
+    simulation.add_car(second)
+    assert simulation.get_car("B") is second
+    assert simulation.car_ids == {"A": 0, "B": 1}
+    with pytest.raises(KeyError):
+        simulation.get_car("C")
+    simulation.reset()
+    with pytest.raises(KeyError):
+        simulation.get_car("A")
+
+
+def test_add_cars_sets_event_sink():
+    events = BufferedSink()
+    simulation = Simulation(Field(10, 10), events=events)
+    simulation.add_cars(ROWS)
+    assert all(car.events is events for car in simulation.cars)
+    assert len(events.events) == 3
@@ -0,0 +1,154 @@
+import os
+import pytest
+from src.car_simulation.simulation.car import Car
+from src.car_simulation.simulation.checkpoint import RECORD
+from src.car_simulation.simulation.field import Field
+from src.car_simulation.simulation.simulation import Simulation
+from helpers import build_simulation, final_state, random_rows
+
+
+def advance(simulation, steps):
+    iterator = simulation.iter_steps()
+    for _ in zip(range(steps), iterator):
+        pass
+    iterator.close()
+
+
+def test_restored_run_matches_uninterrupted_run(tmp_path):
+    rows = random_rows(3, 40, 12, max_commands=29)
+    expected = build_simulation(rows)
+    expected.run_simulation()
+
+    path = str(tmp_path / "sim.ckpt")
+    simulation = build_simulation(rows)
+    advance(simulation, 7)
+    simulation.checkpoint(path)
+    restored = Simulation.restore(path, verbose=False)
+    assert restored.step == 7
+    assert final_state(restored) == final_state(simulation)
+    assert restored.collisions == simulation.collisions
+    restored.run_simulation()
+    assert final_state(restored) == final_state(expected)
+    assert restored.collisions == expected.collisions
+
+
+def test_repeated_checkpoints_are_incremental(tmp_path):
+    rows = random_rows(4, 40, 12, max_commands=29)
+    expected = build_simulation(rows)
+    expected.run_simulation()
+
+    path = str(tmp_path / "sim.ckpt")
+    simulation = build_simulation(rows)
+    simulation.checkpoint(path)
+    size = os.path.getsize(path)
+    for _ in range(5):
+        advance(simulation, 3)
+        simulation.checkpoint(path)
+        restored = Simulation.restore(path, verbose=False)
+        assert final_state(restored) == final_state(simulation)
+        assert restored.collisions == simulation.collisions
+    # Only collisions are ever appended
+    collision_bytes = sum(RECORD.size + 8 * len(record.car_ids) for record in simulation.collision_log)
+    assert os.path.getsize(path) == size + collision_bytes
+
+    # A restored simulation keeps checkpointing incrementally to the same file
+    restored.run_simulation()
+    restored.checkpoint(path)
+    again = Simulation.restore(path, verbose=False)
+    assert final_state(again) == final_state(expected)
+    assert again.collisions == expected.collisions
+
+
+def test_adding_a_car_rewrites_the_file(tmp_path):
+    path = str(tmp_path / "sim.ckpt")
+    simulation = build_simulation([("A", 1, 2, 'N', "FFRFFFFRRL")])
+    simulation.checkpoint(path)
+    simulation.add_car(Car("B", 7, 8, 'W', "FFLFFFFFFF"))
+    simulation.checkpoint(path)
+    restored = Simulation.restore(path, verbose=False)
+    assert [car.name for car in restored.cars] == ["A", "B"]
+    assert restored.cars[1].commands == "FFLFFFFFFF"
+
+
+def test_restore_rejects_other_files(tmp_path):
+    path = tmp_path / "other.bin"
+    path.write_bytes(b"\0" * 200)
+    with pytest.raises(ValueError):
+        Simulation.restore(str(path))
+
+
+@pytest.mark.parametrize("storage", ["bits", "sparse"])
+def test_checkpoint_keeps_the_obstacles(tmp_path, storage):
+    rows = random_rows(5, 30, 12, max_commands=29)
+    walls = [(x, 6) for x in range(2, 10)]
+    occupied = {(x, y) for _, x, y, _, _ in rows}
+    rows = [row for row in rows if (row[1], row[2]) not in walls]
+
+    def build_walled():
+        simulation = Simulation(Field(12, 12, walls, storage), verbose=False)
+        simulation.add_cars(rows)
+        return simulation
+
+    expected = build_walled()
+    expected.run_simulation()
+    path = str(tmp_path / "sim.ckpt")
+    simulation = build_walled()
+    advance(simulation, 5)
+    simulation.checkpoint(path)
+    restored = Simulation.restore(path, verbose=False)
+    assert restored.field.obstacles.kind == storage
+    assert all(restored.field.is_blocked(x, y) for x, y in walls)
+    restored.run_simulation()
+    assert final_state(restored) == final_state(expected)
+    assert restored.collisions == expected.collisions
+
+    # Blocking more cells rewrites the file
+    free = next((x, 0) for x in range(12) if (x, 0) not in occupied)
+    restored.field.add_obstacles([free])
+    restored.checkpoint(path)
+    assert Simulation.restore(path, verbose=False).field.is_blocked(*free)
+    assert Simulation.restore(path, verbose=False, obstacles=walls + [free]).field.is_blocked(*free)
+    with pytest.raises(ValueError):
+        Simulation.restore(path, verbose=False, obstacles=walls)
+
+
+def test_checkpoint_without_obstacles(tmp_path):
+    path = str(tmp_path / "sim.ckpt")
+    build_simulation([("A", 1, 2, 'N', "FF")]).checkpoint(path)
+    assert Simulation.restore(path, verbose=False).field.obstacles is None
+    with pytest.raises(ValueError):
+        Simulation.restore(path, verbose=False, obstacles=[(0, 0)])
+
+
+def test_checkpoint_after_reset_rewrites_the_collisions(tmp_path):
+    path = str(tmp_path / "sim.ckpt")
+    simulation = build_simulation([("A", 0, 0, 'E', "FF"), ("B", 2, 0, 'W', "FF")])
+    simulation.run_simulation()
+    simulation.checkpoint(path)
+    simulation.reset()
+    for row in [("A", 0, 1, 'E', "FF"), ("B", 4, 1, 'W', "FF")]:
+        simulation.add_car(Car(*row))
+    simulation.run_simulation()
+    simulation.checkpoint(path)
+    restored = Simulation.restore(path, verbose=False)
+    assert restored.collisions == ["B collides with A at (2,1) at step 1", "A collides with B at (2,1) at step 1"]
+
+    # A log cleared and refilled behind the checkpoint's back is written again too
+    restored.collision_log.clear()
+    restored.collision_log.add(1, 3, 1, (1, 0))
+    restored.checkpoint(path)
+    assert list(Simulation.restore(path, verbose=False).collision_log) == list(restored.collision_log)
+
+
+def test_checkpoint_keeps_swaps(tmp_path):
+    # A and B swap cells while D runs into C: the swap is listed after the pileup
+    path = str(tmp_path / "sim.ckpt")
+    simulation = Simulation(Field(5, 5), verbose=False, swept=True)
+    simulation.add_cars([("A", 0, 0, 'E', "F"), ("B", 1, 0, 'W', "F"), ("C", 3, 3, 'N', "L"),
+                         ("D", 3, 2, 'N', "F")])
+    simulation.run_simulation()
+    assert simulation.collisions[0] == "D collides with C at (3,3) at step 0"
+    simulation.checkpoint(path)
+    restored = Simulation.restore(path, verbose=False, swept=True)
+    assert list(restored.collision_log.swaps) == list(simulation.collision_log.swaps) == [0, 1]
+    assert restored.collisions == simulation.collisions
@@ -0,0 +1,148 @@
+import pytest
+from src.car_simulation.simulation.car import Car
+from src.car_simulation.simulation.collisions import Collision, CollisionLog, CollisionMessages
+from src.car_simulation.simulation.field import Field
+from src.car_simulation.simulation.simulation import Simulation
+
+ENGINES = ["python"]
+try:
+    import numpy  # noqa: F401
+    ENGINES += ["numpy", "event", "sharded"]
+except ImportError:
+    pass
+
+
+def pileup(engine):
+    simulation = Simulation(Field(5, 5), engine=engine, verbose=False)
+    simulation.add_cars([("A", 0, 0, 'E', "F"), ("B", 2, 0, 'W', "F"), ("C", 1, 1, 'S', "F"),
+                         ("D", 4, 4, 'N', "L")])
+    simulation.run_simulation()
+    return simulation
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_pileup_is_one_record(engine):
+    simulation = pileup(engine)
+    assert list(simulation.collision_log) == [Collision(0, 1, 0, (0, 1, 2))]
+    assert [car.active for car in simulation.cars] == [False, False, False, True]
+    assert simulation.collisions == [
+        "B collides with A at (1,0) at step 0",
+        "A collides with B at (1,0) at step 0",
+        "C collides with A at (1,0) at step 0",
+        "A collides with C at (1,0) at step 0",
+    ]
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_messages_follow_newcomers_across_cells(engine):
+    # Two pileups in one step: C and E run into A, D into B
+    simulation = Simulation(Field(5, 5), engine=engine, verbose=False)
+    simulation.add_cars([("A", 1, 1, 'N', "L"), ("B", 3, 3, 'N', "L"), ("C", 1, 0, 'N', "F"),
+                         ("D", 3, 2, 'N', "F"), ("E", 1, 2, 'S', "F")])
+    expected = ["C collides with A at (1,1) at step 0", "A collides with C at (1,1) at step 0",
+                "D collides with B at (3,3) at step 0", "B collides with D at (3,3) at step 0",
+                "E collides with A at (1,1) at step 0", "A collides with E at (1,1) at step 0"]
+    snapshots = list(simulation.iter_steps())
+    assert list(simulation.collision_log) == [Collision(0, 1, 1, (0, 2, 4)), Collision(0, 3, 3, (1, 3))]
+    assert simulation.collisions == expected
+    assert snapshots[0].collisions == expected
+    assert simulation.collisions[2:5] == expected[2:5]
+    assert simulation.collisions[-2] == expected[-2]
+
+
+def test_log_records():
+    log = CollisionLog()
+    log.add(3, 1, 2, [4, 7])
+    log.add(5, 0, 0, [1, 2, 9])
+    assert len(log) == 2
+    assert log.pairs == 3
+    assert log[1] == Collision(5, 0, 0, (1, 2, 9))
+    assert log[-2] == Collision(3, 1, 2, (4, 7))
+    assert list(log.records(1)) == [log[1]]
+    log.clear()
+    assert len(log) == 0 and log.pairs == 0
+
+
+def test_messages_are_rendered_on_access():
+    class Named:
+        def __init__(self, name):
+            self.name = name
+
+    cars = [Named(name) for name in "ABCD"]
+    log = CollisionLog()
+    messages = CollisionMessages(log, cars)
+    assert messages == [] and len(messages) == 0
+    log.add(0, 1, 1, [0, 2, 3])
+    log.add(4, 2, 2, [1, 2])
+    assert len(messages) == 6
+    everything = list(messages)
+    assert everything[4] == "C collides with B at (2,2) at step 4"
+    assert messages[4] == everything[4]
+    assert messages[-1] == "B collides with C at (2,2) at step 4"
+    assert messages[1:5] == everything[1:5]
+    assert messages[3:] == everything[3:]
+    assert "D collides with A at (1,1) at step 0" in messages
+    with pytest.raises(IndexError):
+        messages[6]
+
+
+def test_iter_steps_reports_new_messages():
+    simulation = Simulation(Field(5, 5), verbose=False)
+    simulation.add_cars([("A", 0, 0, 'E', "FF"), ("B", 2, 0, 'W', "FF")])
+    snapshots = list(simulation.iter_steps())
+    assert snapshots[0].collisions == ["B collides with A at (1,0) at step 0",
+                                       "A collides with B at (1,0) at step 0"]
+    # No car is left to step
+    assert len(snapshots) == 1
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_swaps_are_only_caught_when_swept(engine):
+    rows = [("A", 0, 0, 'E', "FL"), ("B", 1, 0, 'W', "FR"), ("C", 3, 3, 'N', "F")]
+    plain = Simulation(Field(5, 5), engine=engine, verbose=False)
+    plain.add_cars(rows)
+    plain.run_simulation()
+    assert plain.collisions == []
+    assert [(car.x, car.y) for car in plain.cars] == [(1, 0), (0, 0), (3, 4)]
+
+    swept = Simulation(Field(5, 5), engine=engine, verbose=False, swept=True)
+    swept.add_cars(rows)
+    swept.run_simulation()
+    assert list(swept.collision_log) == [Collision(0, 1, 0, (0, 1))]
+    assert swept.collisions == ["B collides with A at (1,0) at step 0",
+                                "A collides with B at (1,0) at step 0"]
+    assert [car.active for car in swept.cars] == [False, False, True]
+    # Deactivated cars stop executing commands
+    assert [car.direction for car in swept.cars] == ['E', 'W', 'N']
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_cars_moving_together_do_not_swap(engine):
+    # Two cars sharing a cell cross the same edge the same way: a pileup, not a swap
+    simulation = Simulation(Field(5, 5), engine=engine, verbose=False, swept=True)
+    simulation.add_cars([("A", 1, 1, 'N', "FF"), ("B", 1, 1, 'N', "FF"), ("C", 3, 1, 'N', "FF")])
+    simulation.run_simulation()
+    assert list(simulation.collision_log) == [Collision(0, 1, 2, (0, 1))]
+    assert list(simulation.collision_log.swaps) == [0]
+    assert simulation.collisions == ["B collides with A at (1,2) at step 0",
+                                     "A collides with B at (1,2) at step 0"]
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_swaps_across_the_field(engine):
+    # Pairs swapping along the diagonal, crossing the borders of the sharded tiles
+    rows = []
+    for x in range(39):
+        rows += [(f"A{x}", x, x, 'E', "FF"), (f"B{x}", x + 1, x, 'W', "FF")]
+    rows += [("C", 5, 30, 'S', "FF"), ("D", 5, 28, 'N', "FF")]
+    results = []
+    for name in ("python", engine):
+        simulation = Simulation(Field(40, 40), engine=name, verbose=False, swept=True, workers=4)
+        simulation.add_cars(rows)
+        simulation.run_simulation()
+        results.append((list(simulation.collision_log), [car.active for car in simulation.cars]))
+    assert results[0] == results[1]
+    log = results[0][0]
+    # 39 swaps, and C and D meeting head-on on (5,29) as a pileup, listed first
+    assert len(log) == 40
+    assert log[0] == Collision(0, 5, 29, (78, 79))
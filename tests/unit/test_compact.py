@@ -0,0 +1,122 @@
+import random
+import sys
+import tracemalloc
+import pytest
+from src.car_simulation.simulation.car import Car
+from src.car_simulation.simulation.compact import BYTES_PER_CAR, CompactCar, Fleet
+from src.car_simulation.simulation.events import BufferedSink
+from src.car_simulation.simulation.field import Field
+from src.car_simulation.simulation.simulation import Simulation
+
+ENGINES = ["python"]
+try:
+    import numpy  # noqa: F401
+    ENGINES += ["numpy", "event", "sharded"]
+except ImportError:
+    pass
+
+
+def test_compact_car_has_no_dict():
+    car = CompactCar("A", 1, 2, 'N', "FFR")
+    assert not hasattr(car, '__dict__')
+    with pytest.raises(AttributeError):
+        car.colour = "red"
+
+
+@pytest.mark.parametrize("start, turn, expected", [
+    ('N', 'L', 'W'), ('W', 'L', 'S'), ('N', 'R', 'E'), ('W', 'R', 'N'),
+])
+def test_turns(start, turn, expected):
+    car = CompactCar("A", 0, 0, start, turn)
+    car.execute_command(Field(5, 5))
+    assert car.direction == expected
+    reference = Car("A", 0, 0, start, turn)
+    reference.execute_command(Field(5, 5))
+    assert reference.direction == expected
+
+
+def test_compact_car_matches_car():
+    field = Field(6, 4)
+    rng = random.Random(7)
+    for _ in range(50):
+        commands = ''.join(rng.choice("LRF") for _ in range(30))
+        x, y, direction = rng.randrange(6), rng.randrange(4), rng.choice("NESW")
+        car = Car("A", x, y, direction, commands)
+        compact = CompactCar("A", x, y, direction, commands)
+        for _ in commands:
+            car.execute_command(field)
+            compact.execute_command(field)
+        assert (compact.x, compact.y, compact.direction) == (car.x, car.y, car.direction)
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_simulation_runs_compact_cars(engine):
+    rng = random.Random(3)
+    cells = rng.sample(range(100), 30)
+    rows = [(f"Car{i}", cell // 10, cell % 10, rng.choice("NESW"),
+             ''.join(rng.choice("FFLR") for _ in range(rng.randrange(40)))) for i, cell in enumerate(cells)]
+    results = []
+    for make in (Car, CompactCar):
+        simulation = Simulation(Field(10, 10, [(5, 5)]), engine=engine, verbose=False)
+        for row in rows:
+            simulation.add_car(make(*row))
+        simulation.run_simulation()
+        results.append(([(car.x, car.y, car.direction, car.active) for car in simulation.cars],
+                        list(simulation.collisions)))
+    assert results[0] == results[1]
+    assert all(isinstance(car, CompactCar) for car in simulation.cars)
+
+
+def test_compact_car_events():
+    events = BufferedSink()
+    simulation = Simulation(Field(3, 3), events=events)
+    simulation.add_car(CompactCar("A", 0, 2, 'N', "FF"))
+    simulation.run_simulation()
+    assert [event.kind for event in events.events] == ["car_added", "blocked_move", "blocked_move"]
+
+
+def test_fleet_round_trip():
+    field = Field(10, 10)
+    fleet = Fleet()
+    fleet.append("A", 1, 2, 'N', "FFRFFFFRRL")
+    fleet.append("B", 7, 8, 'W', "FFLFFFFFFF")
+    for _ in range(10):
+        for car_id in range(len(fleet)):
+            fleet.execute_command(car_id, field)
+    car = fleet.car(0)
+    assert (car.x, car.y, car.direction, car.command_index) == (5, 4, 'S', 10)
+    car.turn_right()
+    fleet.store(0, car)
+    assert fleet.car(0).direction == 'W'
+    assert Fleet.from_cars([car]).car(0).direction == 'W'
+
+
+def test_fleet_shares_equal_commands():
+    fleet = Fleet()
+    fleet.append("A", 0, 0, 'N', ''.join(["FFR"] * 100))
+    fleet.append("B", 0, 0, 'N', ''.join(["FFR"] * 100))
+    assert fleet.commands[0] is fleet.commands[1]
+
+
+def test_fleet_memory_per_car():
+    names = [f"Car{i}" for i in range(20000)]
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    fleet = Fleet()
+    for name in names:
+        fleet.append(name, 1, 2, 'E', "FFRFF")
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    # Buffers grow geometrically, so allow for their slack
+    assert used / len(fleet) < 2 * BYTES_PER_CAR
+    assert used / len(fleet) < sys.getsizeof(Car("A", 0, 0, 'N', "F").__dict__)
+
+
+def test_fleet_numpy_views():
+    np = pytest.importorskip("numpy")
+    fleet = Fleet()
+    fleet.append("A", 3, 4, 'S', "F")
+    columns = fleet.as_arrays()
+    columns['x'][0] = 9
+    assert fleet.x[0] == 9
+    assert columns['heading'].dtype == np.int8
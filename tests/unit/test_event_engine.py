@@ -0,0 +1,67 @@
+import random
+import pytest
+from helpers import final_state, random_rows, run_both
+
+np = pytest.importorskip("numpy")
+
+
+def test_head_on_collision_after_long_approach():
+    rows = [("A", 0, 50, 'E', "F" * 200), ("B", 199, 50, 'W', "F" * 200)]
+    expected, actual = run_both(rows, "event", 200, 100, reference="python")
+    assert actual.collisions == expected.collisions
+    assert final_state(actual) == final_state(expected)
+
+
+def test_car_driving_into_the_boundary():
+    rows = [("A", 2, 2, 'N', "F" * 500 + "R" + "F" * 300), ("B", 400, 400, 'S', "FFL" * 100)]
+    expected, actual = run_both(rows, "event", 500, reference="python")
+    assert final_state(actual) == final_state(expected)
+    assert (actual.cars[0].x, actual.cars[0].y) == (302, 499)
+
+
+def test_cars_on_adjacent_lanes_are_not_stepped():
+    # Cars one cell apart that never meet sweep disjoint boxes; only A and B can meet
+    rows = [(f"Car{i}", i, i % 7, 'N', "F" * 400) for i in range(300)]
+    rows += [("A", 0, 450, 'E', "F" * 100), ("B", 150, 450, 'W', "F" * 100)]
+    expected, actual = run_both(rows, "event", 300, 500)
+    assert final_state(actual) == final_state(expected)
+    assert actual.collisions == expected.collisions == [
+        "B collides with A at (75,450) at step 74",
+        "A collides with B at (75,450) at step 74",
+    ]
+
+
+def test_finished_cars_block_later_arrivals():
+    rows = [("A", 10, 10, 'N', ""), ("B", 10, 0, 'N', "F" * 30)]
+    expected, actual = run_both(rows, "event", 20, 40, reference="python")
+    assert actual.collisions == expected.collisions == [
+        "B collides with A at (10,10) at step 9",
+        "A collides with B at (10,10) at step 9",
+    ]
+    assert final_state(actual) == final_state(expected)
+
+
+@pytest.mark.parametrize("seed, count, size, max_commands", [
+    (1, 40, 2000, 3000),   # Sparse: long analytic windows
+    (2, 300, 200, 400),    # Mixed: crowded pockets stepped among isolated cars
+    (3, 100, 12, 100),     # Dense: falls back to plain steps
+])
+def test_random_fleets_match_numpy_engine(seed, count, size, max_commands):
+    rows = random_rows(seed, count, size, max_commands=max_commands, moves="LRFFFFFF")
+    expected, actual = run_both(rows, "event", size)
+    assert final_state(actual) == final_state(expected)
+    assert actual.collisions == expected.collisions
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_periodic_programs(seed):
+    rng = random.Random(seed)
+    rows = []
+    for i in range(30):
+        pattern = ''.join(rng.choice("LRFFF") for _ in range(rng.randrange(1, 10)))
+        commands = pattern * rng.randrange(10, 100) + pattern[:rng.randrange(len(pattern))]
+        rows.append((f"Car{i}", rng.randrange(300), rng.randrange(300), rng.choice("NESW"), commands))
+    rows = list({(x, y): row for row in rows for x, y in [row[1:3]]}.values())
+    expected, actual = run_both(rows, "event", 300, reference="python")
+    assert final_state(actual) == final_state(expected)
+    assert actual.collisions == expected.collisions
@@ -0,0 +1,60 @@
+from src.car_simulation.simulation.car import Car
+from src.car_simulation.simulation.field import Field
+from src.car_simulation.simulation.simulation import Simulation
+from src.car_simulation.simulation.events import (
+    BatchedFileSink, BufferedSink, Event, NullSink, read_events,
+    BLOCKED_MOVE, CAR_ADDED, COLLISION, INACTIVE_CAR,
+)
+
+
+def run(events, verbose=True):
+    simulation = Simulation(Field(5, 5), verbose=verbose, events=events)
+    simulation.add_car(Car("A", 0, 0, 'S', "FFR"))
+    simulation.add_car(Car("B", 1, 3, 'S', "FFF"))
+    simulation.add_car(Car("C", 1, 1, 'N', "FFF"))
+    simulation.run_simulation()
+    return simulation
+
+
+def test_buffered_sink_receives_structured_events():
+    sink = BufferedSink()
+    run(sink)
+    kinds = [event.kind for event in sink.events]
+    assert kinds[:3] == [CAR_ADDED] * 3
+    assert Event(BLOCKED_MOVE, "A", 0, 0, 0) in sink.events
+    assert Event(COLLISION, "C", 1, 2, 0, "B") in sink.events
+    # Collided cars are dropped from the run instead of being sent commands
+    assert INACTIVE_CAR not in kinds
+    assert "C collides with B at (1,2) at step 0" in list(sink.render())
+
+
+def test_inactive_car_reports_commands():
+    sink = BufferedSink()
+    car = Car("A", 0, 0, 'N', "FF")
+    car.events = sink
+    car.active = False
+    car.execute_command(Field(5, 5))
+    assert sink.events == [Event(INACTIVE_CAR, "A", 0, 0, 0)]
+
+
+def test_quiet_simulation_prints_nothing(capsys):
+    simulation = run(None, verbose=False)
+    assert isinstance(simulation.events, NullSink)
+    assert capsys.readouterr().out == ""
+    assert simulation.collisions[0] == "C collides with B at (1,2) at step 0"
+
+
+def test_verbose_simulation_prints_messages(capsys):
+    run(None)
+    out = capsys.readouterr().out
+    assert "A added to the simulation." in out
+    assert "Move out of bounds; position not updated." in out
+
+
+def test_batched_file_sink_round_trip(tmp_path):
+    path = tmp_path / "events.jsonl"
+    with BatchedFileSink(str(path), batch_size=2) as sink:
+        reference = BufferedSink()
+        run(sink, verbose=False)
+        run(reference, verbose=False)
+    assert list(read_events(str(path))) == reference.events
@@ -0,0 +1,120 @@
+import random
+import pytest
+from src.car_simulation.simulation.car import Car
+from src.car_simulation.simulation.field import Field
+from src.car_simulation.simulation.grammar import Program, parse_program, read_commands
+from src.car_simulation.simulation.scenario import Scenario
+from src.car_simulation.simulation.simulation import Simulation
+
+ENGINES = ["python"]
+try:
+    import numpy  # noqa: F401
+    ENGINES += ["numpy", "event", "sharded"]
+except ImportError:
+    pass
+
+
+@pytest.mark.parametrize("text, expanded", [
+    ("F1000", "F" * 1000),
+    ("(FFR)x500", "FFR" * 500),
+    ("(FFR)500", "FFR" * 500),
+    ("((FL)2 R)x3", "FLFLR" * 3),
+    ("FFRFFL", "FFRFFL"),
+    ("RF3L", "RFFFL"),
+    ("F0 (LR)x0 L", "L"),
+    ("F 3", "FFF"),
+    ("RF 2L", "RFFL"),
+    ("(FL) x 2\nR", "FLFLR"),
+    ("", ""),
+])
+def test_parse_program(text, expanded):
+    program = parse_program(text)
+    assert len(program) == len(expanded)
+    assert ''.join(program) == expanded
+    assert [program[i] for i in range(len(expanded))] == list(expanded)
+    assert program.expand() == expanded
+    assert parse_program(str(program)) == program
+
+
+def test_program_is_not_expanded():
+    program = parse_program("(F1000000 (RF)x1000000)x1000000")
+    assert len(program) == 3 * 10 ** 12
+    assert program[0] == 'F'
+    assert program[10 ** 6] == 'R'
+    assert program[-1] == 'F'
+    with pytest.raises(IndexError):
+        program[len(program)]
+
+
+def test_nested_repeats_collapse():
+    assert str(parse_program("((F)x2)x3")) == "F6"
+    assert str(parse_program("((FFR)x2)x3")) == "(FFR)x6"
+    assert parse_program("(FFR)x2") != parse_program("(FFR)x3")
+    assert hash(parse_program("(FFR)x2")) == hash(parse_program("( FFR )x2"))
+
+
+@pytest.mark.parametrize("text", ["(F", "F)", "Fx", "FA", "(FF)x", "F x", "F 1 2"])
+def test_parse_errors(text):
+    with pytest.raises(ValueError):
+        parse_program(text)
+
+
+def test_read_commands():
+    assert read_commands("FFRL") == "FFRL"
+    assert read_commands("FFA") == "FFA"        # left for Car to reject
+    assert read_commands(["F", "L"]) == ["F", "L"]
+    assert read_commands("F3") == parse_program("F3")
+    assert read_commands("F3").expand() == "FFF"
+
+
+def test_car_runs_program():
+    field = Field(10, 10)
+    car = Car("A", 0, 0, 'N', parse_program("F3 R F2"))
+    assert car.active
+    for _ in range(len(car.commands)):
+        car.execute_command(field)
+    assert (car.x, car.y, car.direction) == (2, 3, 'E')
+    assert car.next_command() is None
+
+
+def random_program(rng, depth=0):
+    parts = []
+    for _ in range(rng.randrange(1, 4)):
+        choice = rng.random()
+        if choice < 0.4:
+            parts.append(''.join(rng.choice("FFFLR") for _ in range(rng.randrange(1, 6))))
+        elif choice < 0.7:
+            parts.append(rng.choice("FLR") + str(rng.randrange(60)))
+        elif depth < 2:
+            parts.append(f"({random_program(rng, depth + 1)})x{rng.randrange(1, 30)}")
+    return ' '.join(parts) or 'F'
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize("seed", range(4))
+def test_engines_match_expanded_commands(engine, seed):
+    rng = random.Random(seed)
+    programs = [parse_program(random_program(rng)) for _ in range(4)]
+    cells = rng.sample(range(60 * 60), 30)
+    rows = [(f"Car{i}", cell // 60, cell % 60, rng.choice("NESW"), rng.choice(programs))
+            for i, cell in enumerate(cells)]
+    results = []
+    for commands in (rows, [row[:4] + (row[4].expand(),) for row in rows]):
+        simulation = Simulation(Field(60, 60), engine=engine if commands is rows else 'python', verbose=False)
+        simulation.add_cars(commands)
+        assert simulation.max_steps() == max(len(row[4]) for row in rows)
+        simulation.run_simulation()
+        results.append(([(car.x, car.y, car.direction, car.active, car.command_index)
+                         for car in simulation.cars], simulation.collisions))
+    assert results[0] == results[1]
+
+
+def test_scenario_and_checkpoint(tmp_path):
+    scenario = Scenario.parse(["10 10", "A 0 0 N (ffr)x3", "B 9 9 S F20"])
+    assert scenario.cars[0][4] == parse_program("(FFR)x3")
+    simulation = scenario.build()
+    path = str(tmp_path / "sim.ckpt")
+    simulation.checkpoint(path)
+    restored = Simulation.restore(path, verbose=False)
+    assert isinstance(restored.cars[1].commands, Program)
+    assert [car.commands for car in restored.cars] == [car.commands for car in simulation.cars]
@@ -0,0 +1,108 @@
+import random
+import pytest
+from src.car_simulation.simulation.car import Car
+from src.car_simulation.simulation.history import History
+from helpers import build_simulation, random_commands, random_rows
+
+ENGINES = ["python"]
+try:
+    import numpy  # noqa: F401
+    ENGINES += ["numpy", "event", "sharded"]
+except ImportError:
+    pass
+
+
+def results(simulation):
+    return ([(car.name, car.x, car.y, car.direction, car.active) for car in simulation.cars],
+            list(simulation.collisions))
+
+
+def full_run(rows, width=20, **options):
+    simulation = build_simulation(rows, width=width, **options)
+    simulation.run_simulation()
+    return results(simulation)
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize("swept", [False, True])
+def test_rerun_matches_a_full_run(engine, swept):
+    for seed in range(6):
+        rng = random.Random(seed)
+        rows = random_rows(seed, 30, 20, max_commands=99, moves="FFFLR", distinct=True)
+        simulation = build_simulation(rows, engine, 20, swept=swept, history=8)
+        simulation.run_simulation()
+        for edit in range(4):
+            car_id = rng.randrange(len(rows))
+            old = rows[car_id][4]
+            new = old[:rng.randrange(len(old) + 1)] + random_commands(rng, 20, "FFFLR")
+            rows[car_id] = rows[car_id][:4] + (new,)
+            simulation.cars[car_id].set_commands(new)
+            simulation.rerun()
+            assert results(simulation) == full_run(rows, engine=engine, swept=swept)
+
+
+def test_late_edit_only_recomputes_the_end():
+    # Two groups of cars far apart; the edit is near the end of the run
+    rows = [(f"A{i}", i, 0, 'N', "F" * 90) for i in range(5)] + [(f"B{i}", 90 + i, 0, 'N', "F" * 90)
+                                                                 for i in range(5)]
+    simulation = build_simulation(rows, width=100, history=10)
+    simulation.run_simulation()
+    simulation.get_car("A0").set_commands("F" * 80 + "RF")
+    report = simulation.rerun()
+    assert report.start == 80
+    assert report.cars < len(rows) and report.cars + report.reused == len(rows)
+    rows[0] = ("A0", 0, 0, 'N', "F" * 80 + "RF")
+    assert results(simulation) == full_run(rows, width=100)
+
+
+def test_car_added_after_a_run():
+    rows = random_rows(3, 20, 20, max_commands=59, moves="FFFLR", distinct=True)
+    simulation = build_simulation(rows, width=20, history=16)
+    simulation.run_simulation()
+    # Drives alone for a while before it can meet another car
+    for row in [("Late", 0, 0, 'N', "FFFFRFFFFFFFF"), ("Later", 19, 19, 'S', "F" * 40)]:
+        if row[1:3] not in {(x, y) for _, x, y, _, _ in rows}:
+            simulation.add_car(Car(*row))
+            rows.append(row)
+    simulation.rerun()
+    assert results(simulation) == full_run(rows)
+    # Reruns can follow each other
+    simulation.get_car(rows[0][0]).set_commands("LFF")
+    rows[0] = rows[0][:4] + ("LFF",)
+    simulation.rerun()
+    assert results(simulation) == full_run(rows)
+
+
+def test_rerun_without_changes_keeps_the_results():
+    rows = random_rows(5, 15, 15, max_commands=39, moves="FFFLR", distinct=True)
+    simulation = build_simulation(rows, width=20, history=True)
+    simulation.run_simulation()
+    expected = results(simulation)
+    assert simulation.rerun().cars == 0
+    assert results(simulation) == expected
+
+
+def test_edit_after_the_car_collided_changes_nothing():
+    rows = [("A", 0, 0, 'N', "FFFFFF"), ("B", 0, 2, 'S', "FFFFFF")]
+    simulation = build_simulation(rows, width=20, history=2)
+    simulation.run_simulation()
+    assert not simulation.get_car("A").active
+    simulation.get_car("A").set_commands("FFLLLL")
+    assert simulation.rerun().cars == 0
+    assert results(simulation) == full_run([("A", 0, 0, 'N', "FFLLLL"), rows[1]])
+
+
+def test_history_snapshots():
+    simulation = build_simulation([("A", 0, 0, 'N', "F" * 10)], width=20, history=4)
+    simulation.run_simulation()
+    assert [snapshot.step for snapshot in simulation.history.snapshots] == [0, 4, 8, 10]
+    assert simulation.history.snapshots[2].car(0) == (0, 8, 0, 8, 1)
+
+
+def test_rerun_needs_a_history():
+    simulation = build_simulation([("A", 0, 0, 'N', "FF")], width=20)
+    simulation.run_simulation()
+    with pytest.raises(ValueError):
+        simulation.rerun()
+    with pytest.raises(ValueError):
+        History(0)
@@ -0,0 +1,116 @@
+import itertools
+import pytest
+from src.car_simulation.simulation.car import Car
+from src.car_simulation.simulation.field import Field
+from src.car_simulation.simulation.simulation import Simulation
+
+ENGINES = ["python"]
+try:
+    import numpy  # noqa: F401
+    ENGINES += ["numpy", "event"]
+except ImportError:
+    pass
+
+ROWS = [("A", 1, 2, 'N', "FFRFFFFRRL"), ("B", 7, 8, 'W', "FFLFFFFFFF"), ("C", 0, 0, 'E', "FFFFLFF")]
+
+
+def build(engine):
+    simulation = Simulation(Field(10, 10), engine=engine, verbose=False)
+    for row in ROWS:
+        simulation.add_car(Car(*row))
+    return simulation
+
+
+def final_state(simulation):
+    return [(car.x, car.y, car.direction, car.command_index, car.active) for car in simulation.cars]
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_iter_steps_matches_run_simulation(engine):
+    expected = build(engine)
+    expected.run_simulation()
+    actual = build(engine)
+    snapshots = list(actual.iter_steps())
+    # A and B collide at step 6, when C runs its last command: nothing can change after it
+    assert [snapshot.step for snapshot in snapshots] == list(range(7))
+    assert final_state(actual) == final_state(expected)
+    assert [c for snapshot in snapshots for c in snapshot.collisions] == expected.collisions
+    assert snapshots[-1].active_count == 1
+    assert actual.step == 0
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_snapshot_reports_moves(engine):
+    first = next(iter(build(engine).iter_steps()))
+    assert first.step == 0
+    assert sorted(first.moved) == [(0, 1, 3), (1, 6, 8), (2, 1, 0)]
+    assert first.collisions == []
+    assert first.active_count == 3
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_stop_on_first_collision_and_resume(engine):
+    expected = build(engine)
+    expected.run_simulation()
+    simulation = build(engine)
+    steps = simulation.iter_steps()
+    hit = next(snapshot for snapshot in steps if snapshot.collisions)
+    steps.close()
+    assert hit.step == 6
+    assert simulation.step == 7
+    assert not simulation.cars[0].active and simulation.cars[0].command_index == 7
+    simulation.run_simulation()
+    assert final_state(simulation) == final_state(expected)
+    assert simulation.collisions == expected.collisions
+
+
+def test_islice_leaves_partial_state():
+    simulation = build("python")
+    list(itertools.islice(simulation.iter_steps(), 3))
+    assert simulation.cars[2].x == 3
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_run_ends_when_no_car_can_change_state(engine):
+    # A and B collide at step 0 with many commands left, C runs out after step 1
+    rows = [("A", 0, 0, 'E', "F" + "L" * 50), ("B", 2, 0, 'W', "F" * 50), ("C", 5, 5, 'N', "FF")]
+    simulation = Simulation(Field(10, 10), engine=engine, verbose=False, stats=True)
+    simulation.add_cars(rows)
+    simulation.run_simulation()
+    assert simulation.stats.counters['steps'] == 2
+    assert simulation.stats.counters['commands'] == 4
+    assert [car.command_index for car in simulation.cars] == [1, 1, 2]
+
+    stepped = Simulation(Field(10, 10), engine=engine, verbose=False)
+    stepped.add_cars(rows)
+    assert [snapshot.step for snapshot in stepped.iter_steps()] == [0, 1]
+    assert final_state(stepped) == final_state(simulation)
+
+
+@pytest.mark.parametrize("swept", [False, True])
+def test_active_count_follows_collisions(swept):
+    # A pileup and a swap (swept only) at step 0 and an inactive car from the start
+    rows = [("A", 0, 0, 'E', "F"), ("B", 2, 0, 'W', "F"), ("C", 5, 5, 'E', "FF"), ("D", 6, 5, 'W', "FF"),
+            ("E", 9, 9, 'N', "LLL")]
+    simulation = Simulation(Field(10, 10), verbose=False, swept=swept)
+    simulation.add_cars(rows)
+    simulation.add_car(Car("F?", 3, 3, 'N', "FF"))
+    for snapshot in simulation.iter_steps():
+        assert snapshot.active_count == sum(car.active for car in simulation.cars)
+    assert snapshot.active_count == (1 if swept else 3)
+
+
+@pytest.mark.parametrize("engine", ENGINES + ["sharded"] * ("numpy" in ENGINES))
+def test_cars_without_commands_collide_at_step_0(engine):
+    # The only car with commands is inactive, yet step 0 still checks A and B
+    for stepped in (False, True):
+        simulation = Simulation(Field(10, 10), engine=engine, verbose=False)
+        simulation.add_cars([("A", 1, 1, 'N', ""), ("B", 1, 1, 'E', ""), ("C", 4, 4, 'N', "")])
+        simulation.add_car(Car("D?", 5, 5, 'N', "FF"))
+        if stepped:
+            assert [snapshot.step for snapshot in simulation.iter_steps()] == [0]
+        else:
+            simulation.run_simulation()
+        assert simulation.collisions == ["B collides with A at (1,1) at step 0",
+                                         "A collides with B at (1,1) at step 0"]
+        assert [car.active for car in simulation.cars] == [False, False, True, False]
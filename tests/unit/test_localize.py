@@ -0,0 +1,49 @@
+import json
+import os
+import subprocess
+import sys
+from src.car_simulation.localize import localize
+
+
+def test_importing_car_does_not_parse_yaml():
+    code = "import sys, car_simulation.simulation.car; print('yaml' in sys.modules)"
+    env = dict(os.environ, PYTHONPATH=os.path.abspath('src'))
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, env=env)
+    assert result.stdout.strip() == 'False'
+
+
+def test_translations_cached_per_language(tmp_path, monkeypatch):
+    monkeypatch.setattr(localize, 'CACHE_DIR', str(tmp_path))
+    localize._load.cache_clear()
+    try:
+        first = localize.load_translations('en')
+        assert localize.load_translations('en') is first
+        assert localize.localizations is first
+        assert localize._load.cache_info().misses == 1
+    finally:
+        localize._load.cache_clear()
+
+
+def test_json_cache_keyed_by_mtime(tmp_path, monkeypatch):
+    monkeypatch.setattr(localize, 'CACHE_DIR', str(tmp_path))
+    localize._load.cache_clear()
+    try:
+        expected = localize.load_translations('en')
+        cache = tmp_path / 'en.yaml.json'
+        with open(cache) as file:
+            cached = json.load(file)
+        assert cached['strings'] == expected
+
+        # A matching key is served from the cache without parsing the YAML
+        cached['strings'] = {'start_message': 'cached'}
+        cache.write_text(json.dumps(cached))
+        localize._load.cache_clear()
+        assert localize.load_translations('en') == {'start_message': 'cached'}
+
+        # A stale key is ignored and the cache rewritten
+        cached['key'] = [0, 0]
+        cache.write_text(json.dumps(cached))
+        localize._load.cache_clear()
+        assert localize.load_translations('en') == expected
+    finally:
+        localize._load.cache_clear()
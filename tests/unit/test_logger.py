@@ -0,0 +1,40 @@
+import logging
+from src.car_simulation.simulation.car import Car
+from src.car_simulation.utils.logger import Logger
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+def test_setup_logger_is_cached():
+    first = Logger.setup_logger('TEST_CACHE')
+    second = Logger.setup_logger('TEST_CACHE')
+    assert first is second
+    assert len(first.handlers) == 1
+    assert isinstance(first.handlers[0].formatter, logging.Formatter)
+
+
+def test_cars_share_one_handler():
+    cars = [Car(f"Car{i}", 0, 0, 'N', "F") for i in range(50)]
+    assert cars[0].logger is cars[-1].logger
+    assert len(logging.getLogger('CAR').handlers) == 1
+
+
+def test_queue_routes_records_to_listener_handlers():
+    logger = Logger.setup_logger('TEST_QUEUE')
+    target = ListHandler()
+    Logger.use_queue(target)
+    try:
+        assert isinstance(logger.handlers[0], logging.handlers.QueueHandler)
+        logger.warning("queued %d", 1)
+    finally:
+        Logger.stop_queue()
+    assert target.messages == ["queued 1"]
+    assert len(logger.handlers) == 1
+    assert isinstance(logger.handlers[0], logging.StreamHandler)
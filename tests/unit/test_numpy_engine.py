@@ -0,0 +1,52 @@
+import pytest
+from src.car_simulation.simulation.field import Field
+from src.car_simulation.simulation.simulation import Simulation
+from helpers import build_simulation, final_state, random_rows, run_both
+
+np = pytest.importorskip("numpy")
+
+
+def test_single_car_route():
+    simulation = build_simulation([("A", 1, 2, 'N', "FFRFFFFRRL")], "numpy", 10)
+    simulation.run_simulation()
+    car = simulation.cars[0]
+    assert (car.x, car.y, car.direction) == (5, 4, 'S')
+
+
+def test_blocked_move_keeps_position():
+    simulation = build_simulation([("A", 0, 0, 'W', "FFRF")], "numpy", 5)
+    simulation.run_simulation()
+    car = simulation.cars[0]
+    assert (car.x, car.y, car.direction) == (0, 1, 'N')
+
+
+def test_collision_messages_match_reference():
+    rows = [("A", 1, 2, 'N', "FFRFFFFRRL"), ("B", 7, 8, 'W', "FFLFFFFFFF")]
+    reference, vectorised = run_both(rows, "numpy", 10, reference="python")
+    assert vectorised.collisions == reference.collisions
+    assert "B collides with A at (5,4) at step 6" in vectorised.collisions
+    assert final_state(vectorised) == final_state(reference)
+
+
+def test_pileup_pairs_newcomers_with_first_occupant():
+    rows = [("A", 1, 0, 'N', "F"), ("B", 0, 1, 'E', "F"), ("C", 2, 1, 'W', "F")]
+    reference, vectorised = run_both(rows, "numpy", 3, reference="python")
+    assert vectorised.collisions == reference.collisions
+    assert "C collides with A at (1,1) at step 0" in vectorised.collisions
+
+
+@pytest.mark.parametrize("seed, count, width, height", [
+    (1, 20, 5, 5),      # Dense field, many collisions
+    (2, 50, 30, 30),
+    (3, 200, 8, 40),
+])
+def test_random_fleets_match_reference(seed, count, width, height):
+    rows = random_rows(seed, count, width, height, 40, moves="LRFF")
+    reference, vectorised = run_both(rows, "numpy", width, height, reference="python")
+    assert final_state(vectorised) == final_state(reference)
+    assert vectorised.collisions == reference.collisions
+
+
+def test_unknown_engine():
+    with pytest.raises(ValueError):
+        Simulation(Field(5, 5), engine="fortran")
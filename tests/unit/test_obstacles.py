@@ -0,0 +1,125 @@
+import pytest
+from src.car_simulation.simulation.car import Car
+from src.car_simulation.simulation.field import Field
+from src.car_simulation.simulation.obstacles import BitGrid, SparseCells, make_obstacles, parse_obstacles
+from src.car_simulation.simulation.simulation import Simulation
+
+ENGINES = ["python"]
+try:
+    import numpy  # noqa: F401
+    ENGINES += ["numpy", "event", "sharded"]
+except ImportError:
+    pass
+
+STORAGES = ["bits", "sparse"]
+# A wall across x = 3 with a gap at y = 4
+WALL = [(3, y) for y in range(10) if y != 4]
+
+
+@pytest.mark.parametrize("storage", STORAGES)
+def test_field_obstacles(storage):
+    field = Field(10, 10, WALL, storage)
+    assert field.obstacles.kind == storage
+    assert len(field.obstacles) == 9
+    assert field.is_blocked(3, 0)
+    assert not field.is_blocked(3, 4)
+    assert not field.is_blocked(-1, 0)
+    assert not field.can_enter(3, 0)
+    assert field.can_enter(3, 4)
+    assert not field.can_enter(10, 0)
+
+
+def test_field_without_obstacles():
+    field = Field(10, 10)
+    assert field.obstacles is None
+    assert not field.is_blocked(3, 0)
+    assert field.can_enter(3, 0)
+
+
+def test_obstacles_out_of_bounds():
+    with pytest.raises(ValueError):
+        Field(10, 10, [(10, 0)])
+
+
+def test_make_obstacles_picks_storage():
+    assert isinstance(make_obstacles(1000, 1000), BitGrid)
+    assert isinstance(make_obstacles(10 ** 6, 10 ** 6, count=100), SparseCells)
+    assert isinstance(make_obstacles(10 ** 4, 10 ** 4, 'bits'), BitGrid)
+    assert isinstance(make_obstacles(10 ** 4, 10 ** 4, 'sparse'), SparseCells)
+    with pytest.raises(ValueError):
+        make_obstacles(10, 10, 'tree')
+
+
+@pytest.mark.parametrize("storage", STORAGES)
+def test_vectorised_checks(storage):
+    np = pytest.importorskip("numpy")
+    field = Field(10, 10, WALL, storage)
+    cells = np.arange(100)
+    expected = [field.is_blocked(cell // 10, cell % 10) for cell in range(100)]
+    assert field.obstacles.blocked(cells).tolist() == expected
+    assert field.obstacles.cells().tolist() == [x * 10 + y for x, y in sorted(WALL)]
+
+
+def test_parse_obstacles():
+    lines = ["# walls", "1 2", "", "5 5 3 4  # a block", "0 0 0 0"]
+    assert parse_obstacles(lines) == [(1, 2, 1, 2), (3, 4, 5, 5), (0, 0, 0, 0)]
+    with pytest.raises(ValueError):
+        parse_obstacles(["1 2 3"])
+    with pytest.raises(ValueError):
+        parse_obstacles(["1 x"])
+
+
+@pytest.mark.parametrize("storage", STORAGES)
+def test_load_obstacles(tmp_path, storage):
+    path = tmp_path / "map.txt"
+    path.write_text("3 0 3 3\n3 5 3 9\n")
+    field = Field(10, 10)
+    field.load_obstacles(str(path), storage)
+    assert sorted((x, y) for x in range(10) for y in range(10) if field.is_blocked(x, y)) == WALL
+
+
+def test_load_obstacles_npy(tmp_path):
+    np = pytest.importorskip("numpy")
+    path = str(tmp_path / "map.npy")
+    np.save(path, np.array(WALL))
+    field = Field(10, 10)
+    field.load_obstacles(path)
+    assert len(field.obstacles) == 9 and field.is_blocked(3, 9)
+
+
+def test_cars_cannot_start_on_obstacles():
+    simulation = Simulation(Field(10, 10, WALL), verbose=False)
+    with pytest.raises(ValueError):
+        simulation.add_car(Car("A", 3, 0, 'N', "F"))
+    with pytest.raises(ValueError):
+        simulation.add_cars([("B", 3, 1, 'N', "F")])
+    assert simulation.cars == []
+
+
+@pytest.mark.parametrize("storage", STORAGES)
+@pytest.mark.parametrize("engine", ENGINES)
+def test_obstacles_block_moves(engine, storage):
+    simulation = Simulation(Field(10, 10, WALL, storage), engine=engine, verbose=False)
+    # A drives into the wall; B drives through the gap
+    simulation.add_car(Car("A", 0, 0, 'E', "FFFFF"))
+    simulation.add_car(Car("B", 0, 4, 'E', "FFFFF"))
+    simulation.run_simulation()
+    assert [(car.x, car.y) for car in simulation.cars] == [(2, 0), (5, 4)]
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_obstacles_engines_agree(engine):
+    import random
+    rng = random.Random(3)
+    obstacles = {(rng.randrange(60), rng.randrange(60)) for _ in range(300)}
+    free = sorted({(rng.randrange(60), rng.randrange(60)) for _ in range(80)} - obstacles)
+    rows = [(f"Car{i}", x, y, rng.choice("NESW"), ''.join(rng.choice("FFFFLR") for _ in range(200)))
+            for i, (x, y) in enumerate(free)]
+    results = []
+    for name in ("python", engine):
+        simulation = Simulation(Field(60, 60, sorted(obstacles)), engine=name, verbose=False)
+        simulation.add_cars(rows)
+        simulation.run_simulation()
+        results.append(([(car.x, car.y, car.direction, car.active) for car in simulation.cars],
+                         simulation.collisions))
+    assert results[0] == results[1]
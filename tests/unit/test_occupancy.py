@@ -0,0 +1,89 @@
+import random
+import pytest
+from src.car_simulation.simulation.car import Car
+from src.car_simulation.simulation.field import Field
+from src.car_simulation.simulation.occupancy import OccupancyIndex
+from src.car_simulation.simulation.simulation import Simulation
+
+
+def random_simulation(seed, count, width, height, engine="python"):
+    rng = random.Random(seed)
+    simulation = Simulation(Field(width, height), engine=engine)
+    for i in range(count):
+        commands = ''.join(rng.choice("LRFFF") for _ in range(rng.randrange(30)))
+        simulation.add_car(Car(f"Car{i}", rng.randrange(width), rng.randrange(height),
+                               rng.choice("NESW"), commands))
+    return simulation
+
+
+def full_rebuild_run(simulation):
+    """Step the simulation checking every car against a fresh dict each step."""
+    max_steps = max(len(car.commands) for car in simulation.cars)
+    for step in range(max_steps):
+        for car in simulation.cars:
+            car.execute_command(simulation.field)
+        simulation.check_collision(step)
+
+
+def final_state(simulation):
+    return [(car.x, car.y, car.direction, car.active) for car in simulation.cars]
+
+
+def test_move_reports_contested_cells():
+    index = OccupancyIndex()
+    index.place((0, 0), 0)
+    index.place((2, 0), 1)
+    index.place((5, 5), 2)
+    contested = index.move([(0, (0, 0), (1, 0)), (1, (2, 0), (1, 0))])
+    assert contested == {(1, 0): [0, 1]}
+    assert (0, 0) not in index and (1, 0) not in index
+    assert index.get((5, 5)) == 2
+
+
+def test_move_into_stationary_car():
+    index = OccupancyIndex()
+    index.place((0, 0), 3)
+    index.place((0, 1), 1)
+    contested = index.move([(1, (0, 1), (0, 0))])
+    assert contested == {(0, 0): [3, 1]}
+    assert len(index) == 0
+
+
+def test_cars_swapping_along_a_chain_do_not_collide():
+    index = OccupancyIndex()
+    index.place((0, 0), 0)
+    index.place((1, 0), 1)
+    assert index.move([(0, (0, 0), (1, 0)), (1, (1, 0), (2, 0))]) == {}
+    assert index.get((1, 0)) == 0 and index.get((2, 0)) == 1
+
+
+def test_stacked_start_is_detected_on_first_step():
+    simulation = Simulation(Field(5, 5))
+    simulation.add_car(Car("A", 2, 2, 'N', "L"))
+    simulation.add_car(Car("B", 2, 2, 'E', "R"))
+    simulation.run_simulation()
+    assert simulation.collisions == ["B collides with A at (2,2) at step 0",
+                                     "A collides with B at (2,2) at step 0"]
+    assert len(simulation.occupancy) == 0
+
+
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_incremental_index_matches_full_rebuild(seed):
+    reference = random_simulation(seed, 60, 12, 12)
+    full_rebuild_run(reference)
+    incremental = random_simulation(seed, 60, 12, 12)
+    incremental.run_simulation()
+    assert final_state(incremental) == final_state(reference)
+    assert incremental.collisions == reference.collisions
+
+
+@pytest.mark.parametrize("limit", [1 << 24, 0])
+def test_numpy_occupancy_matches_full_rebuild(monkeypatch, limit):
+    numpy_engine = pytest.importorskip("src.car_simulation.simulation.numpy_engine")
+    monkeypatch.setattr(numpy_engine, "DENSE_GRID_LIMIT", limit)
+    reference = random_simulation(4, 80, 10, 15)
+    full_rebuild_run(reference)
+    vectorised = random_simulation(4, 80, 10, 15, engine="numpy")
+    vectorised.run_simulation()
+    assert final_state(vectorised) == final_state(reference)
+    assert vectorised.collisions == reference.collisions
@@ -0,0 +1,59 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+from src.car_simulation.simulation.grammar import parse_program  # noqa: E402
+from src.car_simulation.simulation.programs import command_period, compile_programs, MIN_PERIODIC_LENGTH  # noqa: E402
+
+
+@pytest.mark.parametrize("commands, period", [
+    ("FFRFFL" * 5000, 6),
+    ("FFRFFL" * 5000 + "FFR", 6),
+    ("F" * 100, 1),
+    ("FFR" * 10, 30),                       # too short to bother
+    ("FLR" * 40 + "L", 121),                # breaks the pattern
+    ("", 0),
+])
+def test_command_period(commands, period):
+    assert command_period(commands) == period
+
+
+def test_command_period_is_a_period():
+    commands = ("FRFFL" * 30)[:-2]
+    period = command_period(commands)
+    assert len(commands) >= MIN_PERIODIC_LENGTH
+    assert period == 5
+    assert all(commands[i] == commands[i - period] for i in range(period, len(commands)))
+
+
+def test_compile_programs_shares_patterns():
+    long = "FFRFFL" * 5000
+    programs = compile_programs([long, "LRF", long, "", "LRF"])
+    assert programs.length.tolist() == [30000, 3, 30000, 0, 3]
+    block = programs.block
+    assert programs.period[block].tolist() == [6, 3, 6, 1, 3]
+    assert block[0] == block[2]
+    assert block[1] == block[4]
+    assert len(programs.key) == 0           # one block per program
+    assert len(programs.program) < 20
+    program = programs.program.tobytes().decode('ascii')
+    for commands, offset, period in zip([long, "LRF"], programs.offset[block], programs.period[block]):
+        assert all(program[offset + c % period] == commands[c] for c in range(len(commands)))
+
+
+def test_compile_programs_blocks_of_a_program():
+    compact = parse_program("F1000 R (FFR)x500 L")
+    programs = compile_programs(["LRF", compact, compact])
+    assert programs.length.tolist() == [3, 2502, 2502]
+    assert programs.block[1] == programs.block[2]
+    first = programs.block[1]
+    assert programs.start[first:first + 4].tolist() == [0, 1000, 1001, 2501]
+    assert programs.period[first:first + 4].tolist() == [1, 1, 3, 1]
+    # Keys grow through each program, with a gap between programs
+    assert programs.key.tolist() == [0, 4, 1004, 1005, 2505]
+    assert len(programs.program) < 20
+    program = programs.program.tobytes().decode('ascii')
+    expanded = compact.expand()
+    for c in range(len(expanded)):
+        block = first + np.searchsorted(programs.start[first:first + 4], c, side='right') - 1
+        position = c - programs.start[block]
+        assert program[programs.offset[block] + position % programs.period[block]] == expanded[c]
@@ -0,0 +1,71 @@
+import pytest
+from helpers import build_simulation, random_rows
+
+np = pytest.importorskip("numpy")
+from src.car_simulation.simulation.recorder import Recorder, Replay  # noqa: E402
+from src.car_simulation.simulation.headings import HEADING_INDEX  # noqa: E402
+
+
+def capture(simulation):
+    cars = simulation.cars
+    return ([car.x for car in cars], [car.y for car in cars],
+            [HEADING_INDEX[car.direction] for car in cars], [car.active for car in cars])
+
+
+def reference_frames(rows):
+    simulation = build_simulation(rows)
+    frames = [capture(simulation)]
+    for _ in simulation.iter_steps():
+        frames.append(capture(simulation))
+    return frames
+
+
+def as_lists(frame):
+    return (frame.x.tolist(), frame.y.tolist(), frame.heading.tolist(), frame.active.tolist())
+
+
+@pytest.mark.parametrize("engine", ["python", "numpy"])
+def test_replay_matches_every_step(tmp_path, engine):
+    rows = random_rows(1, 30, 12, max_commands=24)
+    path = str(tmp_path / "run.traj")
+    with Recorder(path, keyframe_interval=4) as recorder:
+        build_simulation(rows, engine, recorder=recorder).run_simulation()
+    expected = reference_frames(rows)
+    replay = Replay(path)
+    assert len(replay) == len(expected)
+    assert replay.names == [row[0] for row in rows]
+    for frame in reversed(range(len(replay))):
+        assert as_lists(replay.frame(frame)) == tuple(expected[frame])
+    assert [as_lists(frame) for frame in replay] == [tuple(state) for state in expected]
+    assert [as_lists(frame) for frame in replay.frames(5, 9)] == [tuple(state) for state in expected[5:9]]
+
+
+def test_deltas_only_hold_changed_cars(tmp_path):
+    rows = [("A", 0, 0, 'N', "FFFF"), ("B", 5, 5, 'E', "")]
+    path = str(tmp_path / "run.traj")
+    with Recorder(path, keyframe_interval=100) as recorder:
+        build_simulation(rows, recorder=recorder).run_simulation()
+    replay = Replay(path)
+    assert replay.index[:, 1].tolist() == [2, 1, 1, 1, 1]
+    assert replay.frame(-1).y.tolist() == [4, 5]
+
+
+def test_resumed_run_keeps_recording(tmp_path):
+    rows = random_rows(2, 20, 12, max_commands=19)
+    path = str(tmp_path / "run.traj")
+    with Recorder(path, keyframe_interval=3) as recorder:
+        simulation = build_simulation(rows, recorder=recorder)
+        steps = simulation.iter_steps()
+        for _ in range(5):
+            next(steps)
+        steps.close()
+        simulation.run_simulation()
+    expected = reference_frames(rows)
+    assert [as_lists(frame) for frame in Replay(path)] == [tuple(state) for state in expected]
+
+
+def test_rejects_other_files(tmp_path):
+    path = tmp_path / "other.bin"
+    path.write_bytes(b"not a recording")
+    with pytest.raises(ValueError):
+        Replay(str(path))
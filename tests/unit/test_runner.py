@@ -0,0 +1,45 @@
+import pytest
+from src.car_simulation.simulation.runner import make_chunks, run_many, iter_many
+from src.car_simulation.simulation.scenario import Scenario, run_scenario
+from src.car_simulation.simulation.simulation import Simulation
+
+
+def sweep(count):
+    """The same field with a different fleet per scenario."""
+    scenarios = []
+    for i in range(count):
+        scenarios.append(Scenario(10, 10, [
+            ("A", 1, 2, 'N', "FFRFFFFRRL"),
+            ("B", i % 10, 8, 'W', "FFLFFFFFFF"[: 1 + i % 10]),
+        ]))
+    return scenarios
+
+
+def test_make_chunks_keeps_every_scenario_once():
+    scenarios = sweep(23)
+    chunks = make_chunks(scenarios, 5)
+    indexes = [index for chunk in chunks for index, _ in chunk]
+    assert indexes == list(range(23))
+    assert 4 <= len(chunks) <= 6
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_run_many_matches_serial_runs(workers):
+    scenarios = sweep(12)
+    report = run_many(scenarios, workers=workers)
+    expected = [run_scenario(scenario) for scenario in scenarios]
+    assert [result['index'] for result in report.results] == list(range(12))
+    for result, reference in zip(report.results, expected):
+        assert result['cars'] == reference['cars']
+        assert result['collisions'] == reference['collisions']
+    assert report.throughput > 0
+    assert report.workers == workers
+
+
+def test_unordered_results_cover_all_scenarios():
+    report = Simulation.run_many(sweep(9), workers=2, ordered=False)
+    assert sorted(result['index'] for result in report.results) == list(range(9))
+
+
+def test_iter_many_empty():
+    assert list(iter_many([], workers=2)) == []
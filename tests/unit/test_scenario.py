@@ -0,0 +1,97 @@
+import io
+import json
+import pytest
+from unittest.mock import patch
+from src.car_simulation.main import main
+from src.car_simulation.simulation.scenario import Scenario, run_scenario
+
+SCENARIO = """\
+# Two cars meeting at (5,4)
+10 10
+A 1 2 N FFRFFFFRRL
+B 7 8 w ffLFFFFFFF
+
+C 0 0 E
+"""
+
+
+def test_parse():
+    scenario = Scenario.parse(SCENARIO.splitlines())
+    assert (scenario.width, scenario.height) == (10, 10)
+    assert scenario.cars == [
+        ("A", 1, 2, 'N', "FFRFFFFRRL"),
+        ("B", 7, 8, 'W', "FFLFFFFFFF"),
+        ("C", 0, 0, 'E', ""),
+    ]
+
+
+@pytest.mark.parametrize("text, line", [
+    ("10\n", 1),
+    ("10 10\nA 1 2 Q FF\n", 2),
+    ("10 10\nA 1 N FF\n", 2),
+    ("10 10\nA one 2 N FF\n", 2),
+])
+def test_parse_errors_name_the_line(text, line):
+    with pytest.raises(ValueError, match=f"Line {line}"):
+        Scenario.parse(text.splitlines())
+
+
+def test_build_reports_every_invalid_car():
+    scenario = Scenario.parse(["10 10", "A 1 2 N FF", "", "A_1 1 2 N FF", "B 10 0 N F", "A 3 3 N F"])
+    with pytest.raises(ValueError) as error:
+        scenario.build()
+    assert [line.split(':')[0] for line in str(error.value).splitlines()] == ["Line 4", "Line 5", "Line 6"]
+
+
+def test_parse_empty():
+    with pytest.raises(ValueError):
+        Scenario.parse(["# nothing here"])
+
+
+def test_run_scenario_is_silent(capsys):
+    result = run_scenario(Scenario.parse(SCENARIO.splitlines()))
+    assert capsys.readouterr().out.count("added to the simulation") == 0
+    assert result["cars"][0] == {"name": "A", "x": 5, "y": 4, "direction": 'E', "active": False}
+    assert result["cars"][2] == {"name": "C", "x": 0, "y": 0, "direction": 'E', "active": True}
+    assert "B collides with A at (5,4) at step 6" in result["collisions"]
+
+
+def test_main_batch_writes_json_to_stdout(tmp_path, capsys):
+    path = tmp_path / "scenario.txt"
+    path.write_text(SCENARIO)
+    assert main(["--scenario", str(path), "--engine", "python"]) == 0
+    result = json.loads(capsys.readouterr().out)
+    assert result["field"] == {"width": 10, "height": 10}
+    assert [car["name"] for car in result["cars"]] == ["A", "B", "C"]
+
+
+def test_main_batch_reads_stdin_and_writes_file(tmp_path):
+    output = tmp_path / "result.json"
+    with patch("sys.stdin", io.StringIO(SCENARIO)):
+        assert main(["--scenario", "-", "--output", str(output), "--engine", "python"]) == 0
+    assert len(json.loads(output.read_text())["collisions"]) == 2
+
+
+def test_main_batch_reports_bad_scenario(tmp_path, capsys):
+    path = tmp_path / "scenario.txt"
+    path.write_text("5 5\nA 9 9 N F\n")
+    assert main(["--scenario", str(path)]) == 2
+    assert "out of bounds" in capsys.readouterr().err
+
+
+def test_main_batch_rejects_invalid_cars(tmp_path, capsys):
+    path = tmp_path / "scenario.txt"
+    path.write_text("5 5\nA 1 1 N F\nA_1 1 2 N FF\n")
+    assert main(["--scenario", str(path), "--engine", "python"]) == 2
+    captured = capsys.readouterr()
+    assert captured.out == "" and "Line 3: Car name must only contain alphanumeric" in captured.err
+
+
+def test_main_batch_fails_when_the_run_fails(tmp_path, capsys):
+    path = tmp_path / "scenario.txt"
+    path.write_text(SCENARIO)
+    # main imports the package as car_simulation, from src on sys.path
+    with patch("car_simulation.simulation.simulation.Simulation._run", side_effect=RuntimeError("worker died")):
+        assert main(["--scenario", str(path), "--engine", "python"]) == 2
+    captured = capsys.readouterr()
+    assert captured.out == "" and "worker died" in captured.err
@@ -0,0 +1,121 @@
+import asyncio
+import pytest
+from src.car_simulation.simulation.scenario import Scenario, run_scenario
+from src.car_simulation.simulation.service import ServiceClient, SimulationService, parse_address
+
+# Runs until cancelled: 40 million commands
+ENDLESS = Scenario(1000, 1000, [("A", 0, 0, 'N', "(RRFF)x10000000")])
+
+
+def sweep(count):
+    return [Scenario(10, 10, [("A", 1, 2, 'N', "FFRFFFFRRL"), ("B", i % 10, 8, 'W', "FFLFFFFFFF"[: 1 + i % 10])])
+            for i in range(count)]
+
+
+def serve(test, workers=2, max_jobs=None, path=None):
+    """Run test(service, client) against a fresh service."""
+    async def main():
+        service = SimulationService(workers=workers, max_jobs=max_jobs)
+        await service.start(path=path)
+        address = service.address
+        client = await (ServiceClient.connect(path=path) if path else ServiceClient.connect(*address))
+        try:
+            return await asyncio.wait_for(test(service, client), 30)
+        finally:
+            await client.close()
+            await service.close()
+    return asyncio.run(main())
+
+
+def test_results_match_run_scenario():
+    scenarios = sweep(12)
+
+    async def test(service, client):
+        others = [await ServiceClient.connect(*service.address) for _ in range(3)]
+        clients = [client] + others
+        finals = await asyncio.gather(*(clients[i % 4].run(scenario) for i, scenario in enumerate(scenarios)))
+        for other in others:
+            await other.close()
+        return finals
+
+    finals = serve(test)
+    assert [final['event'] for final in finals] == ['result'] * 12
+    assert [final['result'] for final in finals] == [run_scenario(scenario) for scenario in scenarios]
+
+
+def test_progress_comes_before_the_result():
+    scenario = Scenario(50, 50, [("A", 0, 0, 'N', "F40"), ("B", 10, 0, 'N', "F25")])
+
+    async def test(service, client):
+        job = await client.submit(scenario, progress=1)
+        return [message async for message in client.messages(job)]
+
+    messages = serve(test)
+    assert [message['step'] for message in messages[:-1]] == list(range(40))
+    assert messages[-1]['event'] == 'result'
+    assert messages[-1]['result']['cars'][0]['y'] == 40
+
+
+def test_cancel_running_and_waiting_jobs(tmp_path):
+    async def test(service, client):
+        running = await client.submit(ENDLESS)
+        waiting = await client.submit(ENDLESS)
+        await asyncio.sleep(0.2)
+        await client.cancel(waiting)
+        await client.cancel(running)
+        return [[message async for message in client.messages(job)] for job in (running, waiting)]
+
+    running, waiting = serve(test, workers=1, path=str(tmp_path / "service.sock"))
+    assert running[-1]['event'] == 'cancelled' and running[-1]['step'] > 0
+    assert waiting == [{'id': 1, 'event': 'cancelled'}]
+
+
+def test_bad_requests_are_reported():
+    async def test(service, client):
+        failed = await client.run("10 10\nA 1 2 Q F")
+        rejected = await client.run("10 10\nA 1 2 N F\nA_1 1 2 N FF")
+        client.writer.write(b'{"scenario": "10 10"\n')
+        client.jobs[None] = asyncio.Queue()
+        invalid = await client.jobs[None].get()
+        await client.send({'id': 'x', 'scenario': 42})
+        client.jobs['x'] = asyncio.Queue()
+        typed = await client.jobs['x'].get()
+        # The connection is still usable
+        done = await client.run(sweep(1)[0])
+        return failed, rejected, invalid, typed, done
+
+    failed, rejected, invalid, typed, done = serve(test)
+    assert failed['event'] == 'error' and failed['error'].startswith("Line 2")
+    assert rejected['event'] == 'error' and rejected['error'].startswith("Line 3")
+    assert invalid['event'] == 'error' and invalid['id'] is None
+    assert typed['event'] == 'error' and typed['id'] == 'x'
+    assert done['event'] == 'result'
+
+
+def test_disconnect_cancels_jobs():
+    async def test(service, client):
+        other = await ServiceClient.connect(*service.address)
+        await other.submit(ENDLESS)
+        await asyncio.sleep(0.2)
+        assert len(service.jobs) == 1
+        await other.close()
+        while service.jobs:
+            await asyncio.sleep(0.05)
+        # The slot is free again
+        return await client.run(sweep(1)[0])
+
+    assert serve(test, max_jobs=1)['event'] == 'result'
+
+
+def test_parse_address():
+    assert parse_address("8765") == ('127.0.0.1', 8765, None)
+    assert parse_address("0.0.0.0:80") == ('0.0.0.0', 80, None)
+    assert parse_address("/tmp/sim.sock") == (None, None, "/tmp/sim.sock")
+    with pytest.raises(ValueError):
+        parse_address("localhost")
+
+
+def test_scenario_lines_round_trip():
+    scenario = Scenario.parse(["10 10", "A 1 2 N (FFR)x3", "B 7 8 W"])
+    assert scenario.lines() == ["10 10", "A 1 2 N (FFR)x3", "B 7 8 W"]
+    assert Scenario.parse(scenario.lines()).cars == scenario.cars
@@ -0,0 +1,47 @@
+import random
+import pytest
+from helpers import final_state, random_rows, run_both
+
+np = pytest.importorskip("numpy")
+from src.car_simulation.simulation.sharded_engine import tile_grid, tile_bounds, tile_neighbours  # noqa: E402
+
+
+def test_tile_grid_prefers_square_tiles():
+    assert tile_grid(100, 100, 4) == (2, 2)
+    assert tile_grid(400, 100, 4) == (4, 1)
+    assert tile_grid(3, 1, 8) == (3, 1)
+
+
+def test_tiles_cover_the_field():
+    bounds = tile_bounds(10, 7, 3, 2)
+    cells = {(x, y) for x0, x1, y0, y1 in bounds for x in range(x0, x1) for y in range(y0, y1)}
+    assert len(cells) == 70 and sum((x1 - x0) * (y1 - y0) for x0, x1, y0, y1 in bounds) == 70
+    assert tile_neighbours(2, 2) == [[2, 1], [3, 0], [0, 3], [1, 2]]
+
+
+def test_collision_across_a_tile_border():
+    # The field splits into two columns at x = 5; the cars meet at (5,3)
+    rows = [("A", 4, 3, 'E', "FF"), ("B", 6, 3, 'W', "FF"), ("C", 0, 0, 'N', "FFF")]
+    expected, actual = run_both(rows, "sharded", 10, 6, workers=2)
+    assert actual.collisions == expected.collisions == [
+        "B collides with A at (5,3) at step 0",
+        "A collides with B at (5,3) at step 0",
+    ]
+    assert final_state(actual) == final_state(expected)
+
+
+def test_cars_handed_over_between_tiles():
+    rows = [("A", 0, 0, 'E', "F" * 9 + "L" + "F" * 9), ("B", 9, 9, 'S', "F" * 9 + "R" + "F" * 9)]
+    expected, actual = run_both(rows, "sharded", 10, workers=4)
+    assert final_state(actual) == final_state(expected)
+    assert actual.collisions == expected.collisions
+
+
+@pytest.mark.parametrize("seed", range(6))
+def test_matches_numpy_engine(seed):
+    rng = random.Random(seed)
+    width, height = rng.randrange(4, 25), rng.randrange(4, 25)
+    rows = random_rows(seed, 40, width, height, 39)
+    expected, actual = run_both(rows, "sharded", width, height, workers=rng.randrange(2, 7))
+    assert final_state(actual) == final_state(expected)
+    assert actual.collisions == expected.collisions
@@ -0,0 +1,82 @@
+import pstats
+import tracemalloc
+import pytest
+from src.car_simulation.simulation.car import Car
+from src.car_simulation.simulation.field import Field
+from src.car_simulation.simulation.simulation import Simulation
+from src.car_simulation.simulation.stats import Stats
+
+ENGINES = ["python"]
+try:
+    import numpy  # noqa: F401
+    ENGINES += ["numpy", "event"]
+except ImportError:
+    pass
+
+# A is blocked by the boundary twice, B and C collide at step 1
+ROWS = [("A", 0, 0, 'S', "FFL"), ("B", 3, 5, 'E', "FFF"), ("C", 7, 5, 'W', "FF")]
+
+
+def build(engine, stats=True):
+    simulation = Simulation(Field(10, 10), engine=engine, verbose=False, stats=stats)
+    for row in ROWS:
+        simulation.add_car(Car(*row))
+    return simulation
+
+
+def test_stats_disabled_by_default():
+    simulation = Simulation(Field(10, 10), verbose=False)
+    assert simulation.stats is None
+    simulation.add_car(Car("A", 0, 0, 'N', "FF"))
+    simulation.run_simulation()
+    assert (simulation.cars[0].x, simulation.cars[0].y) == (0, 2)
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_counters(engine):
+    simulation = build(engine)
+    simulation.run_simulation()
+    counters = simulation.stats.counters
+    assert counters['steps'] == 3
+    assert counters['commands'] == 7
+    assert counters['blocked_moves'] == 2
+    assert counters['collisions'] == 1
+    assert list(simulation.stats.active_cars)[-1] == 1
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_phase_timers(engine):
+    simulation = build(engine)
+    simulation.run_simulation()
+    timers = simulation.stats.timers
+    for phase in ('setup', 'run', 'finish'):
+        assert timers[phase] >= 0
+    assert timers['execute'] + timers['collisions'] <= timers['run']
+
+
+def test_active_cars_sampled_per_step():
+    simulation = build("python")
+    simulation.run_simulation()
+    assert list(simulation.stats.active_steps) == [0, 1, 2]
+    assert list(simulation.stats.active_cars) == [3, 1, 1]
+
+
+def test_stats_accumulate_over_iter_steps():
+    simulation = build("python")
+    for snapshot in simulation.iter_steps():
+        break
+    simulation.run_simulation()
+    assert simulation.stats.counters['steps'] == 3
+    simulation.stats.reset()
+    assert simulation.stats.as_dict()['counters'] == {}
+
+
+def test_profile_and_memory_capture(tmp_path):
+    stats = Stats(profile=str(tmp_path / "run.prof"), memory=str(tmp_path / "run.mem"))
+    simulation = build("python", stats)
+    simulation.run_simulation()
+    assert simulation.stats is stats
+    assert pstats.Stats(stats.profile).total_calls > 0
+    assert tracemalloc.Snapshot.load(stats.memory) is not None
+    assert stats.peak_memory > 0
+    assert not tracemalloc.is_tracing()
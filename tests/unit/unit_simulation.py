@@ -78,7 +78,7 @@ def test_reset_functionality(simulation):
     """Test that reset clears cars and collisions."""
     car = Car(name="TestCar", x=0, y=0, direction="N", commands=[])
     simulation.add_car(car)
-    simulation.collisions.append("Collision occurred")
+    simulation.collision_log.add(0, 0, 0, [0, 0])
 
     simulation.reset()
 